@@ -7,8 +7,9 @@ import json
 import os.path as osp
 from os import environ, listdir
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from time import sleep, perf_counter
+from time import perf_counter
 from typing import Union, Optional
 
 from _ctypes import COMError
@@ -51,10 +52,11 @@ from src.gui.settings import SettingsPopup
 from src.update import download_s3_file
 from src.constants import con
 from src.core import (
-	retrieve_card_info, TemplateDetails, get_templates, card_types, get_template_class, get_my_templates
+	retrieve_card_info, CardDetails, TemplateDetails, get_templates, card_types, get_template_class, get_my_templates
 )
 from src.settings import cfg
 from src.layouts import CardLayout, layout_map
+from src.jobs import job
 from src.utils.strings import msg_success, msg_error, msg_warn, ps_version_check
 
 # App configuration
@@ -247,7 +249,6 @@ class ProxyshopApp(App):
 		temps = get_my_templates(self.templates_selected)
 
 		# Key datas
-		layout_threads: list[Thread] = []
 		files = self.get_art_files()
 
 		# Is the list empty?
@@ -256,17 +257,48 @@ class ProxyshopApp(App):
 			self.enable_buttons()
 			return
 
+		# Resume an unfinished batch, skipping cards already rendered
+		if job.open({
+			'lang': cfg.lang,
+			'scry_ascending': cfg.scry_ascending,
+			'fix_names': cfg.fix_names,
+			'templates': self.templates_selected
+		}):
+			skipped = [f for f in files if job.is_done(f)]
+			files = [f for f in files if f not in skipped]
+			console.update(
+				f"Resuming unfinished batch, {len(skipped)} of {len(files) + len(skipped)} cards already rendered."
+			)
+			if len(files) == 0:
+				job.finish()
+				self.enable_buttons()
+				return
+
+		# Resolve as many cards as possible from the snapshot, then in batched requests
+		cache.reset_stats()
+		snapshot = [job.get_card(f) for f in files]
+		details = [s[0] if s else resolve_card_name(retrieve_card_info(f)) for f, s in zip(files, snapshot)]
+		resolved = {i: s[1] for i, s in enumerate(snapshot) if s}
+		pending = [i for i in range(len(files)) if i not in resolved]
+		batch = card_info_batch([details[i] for i in pending])
+		resolved.update({pending[n]: card for n, card in batch.items()})
+
 		# Run through each file, assigning layout
 		for i, f in enumerate(files, start=0):
-			layout_threads.append(Thread(target=self.assign_layout, args=(f,)))
-			layout_threads[i].start()
-			# Scryfall rate limit
-			# https://scryfall.com/docs/api
-			sleep(.05)
-
-		# Complete each thread
-		for i, thread in enumerate(layout_threads):
-			thread.join()
+			if i in resolved:
+				self.snapshot_layout(self.assign_layout(f, resolved[i], details[i]), temps)
+
+		# Search for cards the batch couldn't resolve, the client enforces Scryfall's rate limit
+		with ThreadPoolExecutor(max_workers=client.max_concurrent) as pool:
+			tasks = [pool.submit(self.assign_layout, f, None, details[i]) for i, f in enumerate(files) if i not in resolved]
+		for task in tasks:
+			if task.exception():
+				console.log_exception(task.exception())
+			else:
+				self.snapshot_layout(task.result(), temps)
+		console.update(f"[i]Scryfall cache: {cache.stats}[/i]")
+		if cfg.dev_mode:
+			console.update(f"[i]{transport.stats}[/i]")
 
 		# Did any cards fail to find?
 		if self.assigned_layouts.get('failed'):
@@ -278,10 +310,21 @@ class ProxyshopApp(App):
 			)
 			# Cancel the operation
 			if not proceed:
+				job.close()
 				self.enable_buttons()
 				return
 		console.update()
 
+		# Look up set data and download scans needed by the queued cards in the background
+		prefetch_mtg_sets([
+			layout.set for card_type, cards in self.assigned_layouts.items()
+			if card_type not in ('failed', con.basic_class) for layout in cards
+		])
+		images.prefetch([
+			layout.scryfall_scan for card_type, cards in self.assigned_layouts.items()
+			if card_type in con.scan_classes for layout in cards
+		])
+
 		# Render each card type as a different batch
 		for card_type, cards in self.assigned_layouts.items():
 			# Skip failed
@@ -295,6 +338,8 @@ class ProxyshopApp(App):
 				# Start render thread
 				thr = Thread(target=self.render, args=(template, card), daemon=True)
 				if not self.start_thread(thr):
+					# Keep the snapshot to resume from
+					job.close()
 					self.reset(close_document=True, enable_buttons=True)
 					return
 				# Card complete
@@ -302,6 +347,7 @@ class ProxyshopApp(App):
 			# Render group complete
 			self.reset(close_document=True)
 		# All renders complete
+		job.finish()
 		self.enable_buttons()
 
 	def render_custom(self, template: TemplateDetails, scryfall) -> None:
@@ -425,24 +471,31 @@ class ProxyshopApp(App):
 		# All tests finished
 		self.reset(close_document=True, enable_buttons=True)
 
-	def assign_layout(self, filename: Union[Path, str]) -> Union[str, CardLayout]:
+	def assign_layout(
+		self, filename: Union[Path, str], scryfall: Optional[dict] = None, card: Optional[CardDetails] = None
+	) -> Union[str, CardLayout]:
 		"""
 		Assign layout object to a card.
 		@param filename: String including card name, plus optionally:
 			- (artist name)
 			- [set code]
 			- {collector number}
+		@param scryfall: Scryfall data if already resolved, otherwise it will be searched.
+		@param card: Card details if already parsed, otherwise they're read from the filename.
 		@return: Layout object for this card
 		"""
 		# Get basic card information
-		card = retrieve_card_info(filename)
+		if not card:
+			card = resolve_card_name(retrieve_card_info(filename))
 
 		# Get scryfall info for any other type
-		scryfall = card_info(card['name'], card['set'])
+		if not scryfall:
+			scryfall = card_info(card['name'], card['set'])
 		if isinstance(scryfall, Exception) or not scryfall:
 			# Scryfall data invalid
 			console.log_exception(scryfall)
-			failure = f"Scryfall search failed: {msg_error(card['name'])}"
+			reason = f" ({scryfall.kind.value})" if isinstance(scryfall, CardLookupError) else ""
+			failure = f"Scryfall search failed{reason}: {msg_error(card['name'])}"
 			self.assigned_layouts['failed'].append(failure)
 			return failure
 
@@ -461,6 +514,16 @@ class ProxyshopApp(App):
 			console.update(f"{msg_success('SUCCESS:')} {str(layout)}")
 		return layout
 
+	@staticmethod
+	def snapshot_layout(layout: Union[str, CardLayout], temps: dict[str, TemplateDetails]) -> None:
+		"""
+		Record an assigned layout in the job snapshot, along with the template chosen for its card class.
+		@param layout: Layout object, or failure message.
+		@param temps: Templates chosen for each card class.
+		"""
+		if isinstance(layout, CardLayout) and layout.card_class in temps:
+			job.add_card(layout.file, layout.scryfall, temps[layout.card_class])
+
 	def render(
 		self, template: TemplateDetails, card: CardLayout
 	) -> None:
@@ -477,6 +540,8 @@ class ProxyshopApp(App):
 			proxy = template['loaded_class'](card)
 			self.docref = proxy.docref
 			self.result = proxy.execute()
+			if self.result and proxy.output_file:
+				job.add_done(card.filename, proxy.output_file)
 			del proxy
 		except Exception as e:
 			console.error(
@@ -759,14 +824,16 @@ if __name__ == '__main__':
 	Path(osp.join(con.cwd, "out")).mkdir(mode=511, parents=True, exist_ok=True)
 	Path(osp.join(con.cwd, "logs")).mkdir(mode=511, parents=True, exist_ok=True)
 	Path(osp.join(con.cwd, "templates")).mkdir(mode=511, parents=True, exist_ok=True)
-	Path(osp.join(con.cwd, "src/data/sets")).mkdir(mode=511, parents=True, exist_ok=True)
 
 	# Launch the app
 	Factory.register('HoverBehavior', HoverBehavior)
 	Builder.load_file(osp.join(con.cwd, "src/kv/proxyshop.kv"))
 
 	# Imports that load console must be imported here
-	from src.scryfall import card_info
+	from src.scryfall import card_info, card_info_batch, resolve_card_name, prefetch_mtg_sets, CardLookupError
+	from src.utils.cache import cache, images
+	from src.client import client
+	from src.utils.http import transport
 	from src.__console__ import console
 
 	# Start app
@@ -0,0 +1,295 @@
+"""
+SCRYFALL BULK DATA INDEX
+"""
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, Iterator, Callable
+
+from src.client import client
+from src.constants import con
+from src.utils.http import transport
+from src.utils.strings import normalize_str
+
+# Bytes read from a bulk data file at a time
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Rows inserted per transaction while building the index
+BATCH_SIZE = 5000
+
+# Language codes used in settings which Scryfall stores differently
+lang_codes = {
+    'jp': 'ja',
+    'kr': 'ko',
+    'cs': 'zhs',
+    'ct': 'zht'
+}
+
+
+"""
+INDEX
+"""
+
+
+class BulkIndex:
+    """
+    Local SQLite index of a Scryfall bulk data dump, keyed by normalized name, set and language.
+    @param path: Path to the index database file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = sqlite3.connect(self.path)
+        return self._local.connection
+
+    @property
+    def updated(self) -> Optional[float]:
+        """
+        Time the bulk data this index was built from was last updated, None if unknown.
+        """
+        if not self.exists:
+            return
+        try:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'updated'").fetchone()
+            return float(row[0]) if row else None
+        except sqlite3.Error:
+            # Built before staleness was tracked, or unreadable
+            return
+
+    def is_stale(self, updated: float) -> bool:
+        """
+        Check if the index should be rebuilt from bulk data updated at a given time.
+        @param updated: Time the available bulk data was last updated, as a UNIX timestamp.
+        @return: True if the index is missing or was built from older bulk data.
+        """
+        current = self.updated
+        return current is None or current < updated
+
+    def close(self) -> None:
+        """
+        Close the connection held by this thread.
+        """
+        if hasattr(self._local, 'connection'):
+            self._local.connection.close()
+            del self._local.connection
+
+    def build(self, source: str, callback: Optional[Callable] = None, updated: Optional[float] = None) -> int:
+        """
+        Rebuild the index from a Scryfall bulk data file, e.g. default_cards or all_cards.
+        @param source: Path to the bulk data JSON file.
+        @param callback: Called with the running total of indexed cards after each batch.
+        @param updated: Time the bulk data was last updated, the modification time of the file if not provided.
+        @return: Number of cards indexed.
+        """
+        # Build into a temporary file, replace the live index once complete
+        Path(os.path.dirname(self.path)).mkdir(mode=511, parents=True, exist_ok=True)
+        temp = f"{self.path}.tmp"
+        if os.path.exists(temp):
+            os.remove(temp)
+        db = sqlite3.connect(temp)
+        db.execute(
+            "CREATE TABLE cards (id TEXT PRIMARY KEY, set_code TEXT, lang TEXT, released TEXT, data TEXT)"
+        )
+        db.execute("CREATE TABLE names (name TEXT, id TEXT)")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('updated', str(updated if updated is not None else os.path.getmtime(source))),
+            ('source', os.path.basename(source))
+        ])
+
+        # Insert cards in batches
+        count = 0
+        cards, names = [], []
+        for card in iter_bulk_cards(source):
+            cards.append((
+                card['id'],
+                card.get('set', '').lower(),
+                card.get('lang', 'en'),
+                card.get('released_at', ''),
+                json.dumps(card, ensure_ascii=False, separators=(',', ':'))
+            ))
+            names.extend([(key, card['id']) for key in get_name_keys(card)])
+            count += 1
+            if len(cards) >= BATCH_SIZE:
+                self._insert(db, cards, names)
+                cards, names = [], []
+                if callback:
+                    callback(count)
+        self._insert(db, cards, names)
+        if callback:
+            callback(count)
+
+        # Index lookups after the bulk insert
+        db.execute("CREATE INDEX idx_names ON names (name)")
+        db.commit()
+        db.close()
+        self.close()
+        os.replace(temp, self.path)
+        return count
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, cards: list[tuple], names: list[tuple]) -> None:
+        db.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?)", cards)
+        db.executemany("INSERT INTO names VALUES (?, ?)", names)
+        db.commit()
+
+    def get(self, card_id: str) -> Optional[dict]:
+        """
+        Find a card by its Scryfall id.
+        @param card_id: Scryfall id of the card.
+        @return: Scryfall card dict, None if not indexed.
+        """
+        if not self.exists:
+            return
+        try:
+            row = self.connection.execute("SELECT data FROM cards WHERE id = ?", (card_id,)).fetchone()
+            return json.loads(row[0]) if row else None
+        except sqlite3.Error as e:
+            # Index is missing or corrupt, fall back to the network
+            print(e, "\nOffline card index couldn't be read!")
+            return
+
+    def search(
+        self,
+        name: str,
+        set_code: Optional[str] = None,
+        language: Optional[str] = None,
+        ascending: bool = False
+    ) -> list[dict]:
+        """
+        Find every printing of a card matching an exact name, mirroring a unique=prints Scryfall search.
+        @param name: Name of the card, ex: Damnation
+        @param set_code: Set code to look for, ex: MH2
+        @param language: Lang code to look for, ex: en, or any for every language
+        @param ascending: Order from oldest to newest printing, otherwise newest to oldest.
+        @return: List of Scryfall card dicts.
+        """
+        if not self.exists:
+            return []
+        language = language or 'en'
+        query = "SELECT DISTINCT c.data, c.released, c.rowid FROM names n JOIN cards c ON c.id = n.id " \
+                "WHERE n.name = ?"
+        params = [normalize_str(name, True)]
+        if language != 'any':
+            query += " AND c.lang = ?"
+            params.append(lang_codes.get(language, language))
+        if set_code:
+            query += " AND c.set_code = ?"
+            params.append(set_code.lower())
+        query += f" ORDER BY c.released {'ASC' if ascending else 'DESC'}, c.rowid"
+        try:
+            return [json.loads(row[0]) for row in self.connection.execute(query, params)]
+        except sqlite3.Error as e:
+            # Index is missing or corrupt, fall back to the network
+            print(e, "\nOffline card index couldn't be read!")
+            return []
+
+
+"""
+UTILITIES
+"""
+
+
+def get_name_keys(card: dict) -> set[str]:
+    """
+    Get every normalized name an exact name search should match this card with.
+    @param card: Scryfall card dict.
+    @return: Set of normalized names.
+    """
+    names = [card.get('name', ''), card.get('printed_name', '')]
+    for face in card.get('card_faces', []):
+        names.extend([face.get('name', ''), face.get('printed_name', '')])
+    # Names in non-Latin scripts normalize to nothing, these are only found by their English name
+    return {key for n in names if n and (key := normalize_str(n, True))}
+
+
+def iter_bulk_cards(path: str) -> Iterator[dict]:
+    """
+    Yield each card object from a bulk data JSON array without loading the whole file.
+    @param path: Path to the bulk data JSON file.
+    @return: Iterator of Scryfall card dicts.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buffer, pos, eof = '', 0, False
+        while True:
+            # Skip array punctuation between objects
+            while pos < len(buffer) and buffer[pos] in '[], \t\r\n':
+                pos += 1
+            if pos >= len(buffer) and eof:
+                return
+            try:
+                card, end = decoder.raw_decode(buffer, pos)
+                pos = end
+                yield card
+            except json.JSONDecodeError:
+                # Object continues past the end of the buffer
+                if eof:
+                    raise
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+
+
+def get_bulk_data_info(kind: str = 'default_cards') -> Optional[dict]:
+    """
+    Get the details of the latest Scryfall bulk data file of a given type.
+    @param kind: Bulk data type, ex: default_cards, all_cards
+    @return: Scryfall bulk data object, None if unsuccessful.
+    """
+    try:
+        res = client.get(f"{con.scryfall_api}/bulk-data/{kind}", headers=con.http_header)
+        res.raise_for_status()
+        return res.json()
+    except Exception as e:
+        # HTTP request failed
+        print(e, "\nCouldn't retrieve Scryfall bulk data details!")
+        return
+
+
+def get_bulk_data_updated(info: dict) -> float:
+    """
+    Get the time a Scryfall bulk data file was last updated.
+    @param info: Scryfall bulk data object.
+    @return: UNIX timestamp.
+    """
+    return datetime.strptime(info['updated_at'], "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+
+
+def download_bulk_data(kind: str = 'default_cards', info: Optional[dict] = None) -> Optional[str]:
+    """
+    Download the latest Scryfall bulk data file of a given type.
+    @param kind: Bulk data type, ex: default_cards, all_cards
+    @param info: Scryfall bulk data object, retrieved if not provided.
+    @return: Path to the downloaded file, None if unsuccessful.
+    """
+    path = os.path.join(con.path_data, f"{kind}.json")
+    if not (info := info or get_bulk_data_info(kind)):
+        return
+    try:
+        res = transport.get(info['download_uri'], headers=con.http_header, stream=True)
+        res.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+        return path
+    except Exception as e:
+        # HTTP request failed
+        print(e, "\nCouldn't download Scryfall bulk data!")
+        return
+
+
+# Global index
+index = BulkIndex(con.path_bulk_index)
@@ -0,0 +1,116 @@
+"""
+COMPACT CARD RECORDS
+"""
+import json
+from typing import Optional, Any, Iterator
+
+# Fields read by layouts and templates
+FACE_FIELDS = (
+    'object', 'name', 'printed_name', 'mana_cost', 'type_line', 'printed_type_line', 'oracle_text',
+    'printed_text', 'flavor_text', 'power', 'toughness', 'loyalty', 'colors', 'color_identity',
+    'color_indicator', 'artist', 'watermark', 'frame_effects', 'image_uris', 'component'
+)
+CARD_FIELDS = (
+    'id', 'layout', 'lang', 'set', 'rarity', 'collector_number', 'keywords', 'card_faces', 'faces', 'creator'
+)
+
+# Image sizes worth keeping
+IMAGE_SIZES = ('large',)
+
+
+class CardRecord:
+    """
+    Slotted record holding only the Scryfall fields layouts read, used in place of the full card JSON.
+    Supports the dict style access layouts already use, ex: card['name'], 'power' in card, card.get('watermark')
+    Fields missing from the Scryfall data are left unset, so they behave like missing keys.
+    """
+    __slots__ = FACE_FIELDS + CARD_FIELDS + ('front',)
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __repr__(self):
+        return f"CardRecord({getattr(self, 'name', '')!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self) -> list[str]:
+        return list(self)
+
+    @classmethod
+    def from_scryfall(cls, data: dict) -> 'CardRecord':
+        """
+        Build a record from Scryfall card or card face data, dropping every field layouts don't use.
+        @param data: Scryfall card dict.
+        @return: Card record.
+        """
+        record = cls()
+        for key in cls.__slots__:
+            if key not in data:
+                continue
+            value = data[key]
+            if key in ('card_faces', 'faces'):
+                value = [cls.from_scryfall(face) for face in value]
+            elif key == 'image_uris':
+                value = {size: value[size] for size in IMAGE_SIZES if size in value}
+            setattr(record, key, value)
+        return record
+
+    def to_dict(self) -> dict:
+        """
+        Get the fields that are set as a plain dict.
+        @return: Dict of set fields, faces included.
+        """
+        return {
+            key: [face.to_dict() for face in self[key]] if key in ('card_faces', 'faces') else self[key]
+            for key in self
+        }
+
+    def to_json(self) -> str:
+        """
+        Serialize the record compactly.
+        @return: JSON string of the set fields.
+        """
+        return json.dumps(self.to_dict(), separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text: str) -> 'CardRecord':
+        """
+        Rebuild a record serialized with to_json.
+        @param text: JSON string.
+        @return: Card record.
+        """
+        return cls.from_scryfall(json.loads(text))
+
+
+"""
+UTILITIES
+"""
+
+
+def get_record(data: Optional[dict]) -> Optional[CardRecord]:
+    """
+    Get a card record from Scryfall data, records are returned as is.
+    @param data: Scryfall card dict or card record.
+    @return: Card record, or None if no data was given.
+    """
+    if data is None or isinstance(data, CardRecord):
+        return data
+    return CardRecord.from_scryfall(data)
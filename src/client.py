@@ -0,0 +1,115 @@
+"""
+ASYNC SCRYFALL CLIENT
+"""
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+import requests
+
+from src.settings import cfg
+from src.constants import con
+from src.utils.http import transport
+from src.utils.concurrency import TokenBucket, backoff_delay
+
+# Responses worth retrying
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class ScryfallClient:
+    """
+    Shared client for every Scryfall and MTGJSON request. Requests run on a background asyncio loop,
+    share one token bucket and the pooled keep-alive connections of the HTTP transport, and are retried with
+    jittered exponential backoff that honours Retry-After.
+    @param rate: Maximum requests per second.
+    @param max_concurrent: Maximum requests in flight at once.
+    @param retries: Attempts made before giving up on a request.
+    """
+    def __init__(self, rate: float, max_concurrent: int, retries: int = 3):
+        self.rate = rate
+        self.max_concurrent = max_concurrent
+        self.retries = retries
+        self.limiter = TokenBucket(rate)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="scryfall")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        # Start the event loop on first use
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="scryfall-loop", daemon=True).start()
+        return self._loop
+
+    async def fetch(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Make a request once the rate limiter allows it, retrying rate limited and failed requests.
+        @param method: HTTP method, ex: GET
+        @param url: Request URL.
+        @param kwargs: Passed on to requests.
+        @return: Response of the last attempt.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.retries + 1):
+            await self.limiter.acquire()
+            async with self._semaphore:
+                try:
+                    res = await loop.run_in_executor(
+                        self.executor, partial(transport.request, method, url, **kwargs)
+                    )
+                except requests.RequestException:
+                    # Connection failed, try again
+                    if attempt == self.retries:
+                        raise
+                    res = None
+            if res is not None and (res.status_code not in RETRY_STATUS or attempt == self.retries):
+                return res
+            await asyncio.sleep(backoff_delay(
+                attempt, retry_after=res.headers.get('Retry-After') if res is not None else None
+            ))
+
+    async def fetch_all(self, requests_: list[tuple[str, str, dict]]) -> list[Union[requests.Response, Exception]]:
+        """
+        Make several requests concurrently.
+        @param requests_: List of (method, url, kwargs) tuples.
+        @return: List of responses, or the exception raised by each request that failed.
+        """
+        return await asyncio.gather(
+            *[self.fetch(method, url, **kwargs) for method, url, kwargs in requests_],
+            return_exceptions=True
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Make a request from synchronous code, blocking until it completes.
+        @param method: HTTP method, ex: GET
+        @param url: Request URL.
+        @param kwargs: Passed on to requests.
+        @return: Response object.
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch(method, url, **kwargs), self.loop).result()
+
+    def request_all(self, requests_: list[tuple[str, str, dict]]) -> list[Union[requests.Response, Exception]]:
+        """
+        Make several requests concurrently from synchronous code, blocking until they all complete.
+        @param requests_: List of (method, url, kwargs) tuples.
+        @return: List of responses, or the exception raised by each request that failed.
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch_all(requests_), self.loop).result()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+# Global client
+client = ScryfallClient(cfg.scry_rate_limit, con.scryfall_max_concurrent)
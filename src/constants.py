@@ -180,10 +180,16 @@ class Constants:
         self.path_logs = osp.join(self.cwd, 'logs')
         self.path_plugins = osp.join(self.cwd, 'plugins')
         self.path_img = osp.join(self.path_src, 'img')
+        self.path_fonts = osp.join(self.cwd, 'fonts')
         self.path_data = osp.join(self.path_src, 'data')
         self.path_tests = osp.join(self.path_src, 'tests')
         self.path_data_sets = osp.join(self.path_data, 'sets')
-        self.path_scryfall_scan = osp.join(self.path_logs, "card.jpg")
+        self.path_sets_db = osp.join(self.path_data, 'sets.db')
+        self.path_bulk_index = osp.join(self.path_data, 'cards.db')
+        self.path_http_cache = osp.join(self.path_data, 'http_cache.db')
+        self.path_text_cache = osp.join(self.path_data, 'text_cache.db')
+        self.path_job = osp.join(self.path_data, 'job.jsonl')
+        self.path_scans = osp.join(self.path_data, 'scans')
         self.path_version_tracker = osp.join(self.path_data, 'version_tracker.json')
         self.path_config_json = osp.join(self.path_data, 'app_settings.json')
 
@@ -224,6 +230,13 @@ class Constants:
         self.planar_class = "planar"
         self.prototype_class = "prototype"
 
+        # Card classes whose templates paste in the Scryfall scan
+        self.scan_classes = [
+            self.saga_class, self.planeswalker_class, self.planar_class,
+            self.pw_tf_front_class, self.pw_tf_back_class,
+            self.pw_mdfc_front_class, self.pw_mdfc_back_class
+        ]
+
         # Layer names
         self.layers = Layers()
         self.default_layer = "Layer 1"
@@ -446,6 +459,40 @@ class Constants:
                           "Chrome/39.0.2171.95 Safari/537.36"
         }
 
+        # API hosts for card and set data
+        self.scryfall_api = "https://api.scryfall.com"
+        self.mtgjson_api = "https://mtgjson.com/api/v5"
+
+        # Set header fields read from MTGJSON, in the order they appear
+        self.mtgjson_set_fields = ['baseSetSize', 'code', 'keyruneCode', 'name']
+
+        # Seconds API responses stay fresh in the response cache, by URL fragment
+        self.http_cache_ttl = {
+            '/cards/search': 604800,
+            '/cards/collection': 604800,
+            '/cards/': 2592000,
+            '/sets/': 2592000,
+            '/catalog/': 604800
+        }
+
+        # Seconds a card or set that wasn't found is remembered
+        self.http_cache_negative_ttl = 86400
+
+        # Maximum size of the response, scan and formatted text caches
+        self.http_cache_size = 256 * 1024 * 1024  # 256 MB
+        self.scan_cache_size = 512 * 1024 * 1024  # 512 MB
+        self.text_cache_size = 64 * 1024 * 1024  # 64 MB
+
+        # Maximum Scryfall requests in flight at once
+        self.scryfall_max_concurrent = 8
+
+        # Result pages searched for a printing in the chosen language
+        self.scryfall_max_pages = 3
+
+        # Connections kept open per host, (connect, read) timeout in seconds
+        self.http_pool_size = 10
+        self.http_timeout = (10, 60)
+
         # Run headless
         self.headless = False
 
@@ -5,7 +5,6 @@ import os
 import re
 import sys
 import json
-import requests
 import os.path as osp
 from glob import glob
 from pathlib import Path
@@ -14,6 +13,8 @@ from typing_extensions import NotRequired
 from importlib import util, import_module
 from src import update
 from src.constants import con
+from src.symbols import symbol_table
+from src.utils.http import transport
 
 # All Template types
 card_types = {
@@ -229,11 +230,7 @@ def retrieve_card_info(filename: Union[str, Path]) -> CardDetails:
     set_code = set_code[0] if set_code else ''
 
     # Correct strange set codes like promo variants (PMID)
-    if (
-        set_code and
-        set_code.upper() not in con.set_symbols and
-        set_code.upper()[1:] in con.set_symbols
-    ):
+    if set_code and symbol_table.get_code(set_code) == set_code.upper()[1:]:
         set_code = set_code[1:]
 
     return {
@@ -435,7 +432,7 @@ def gdrive_metadata(file_id: str) -> dict:
     """
     source = "https://www.googleapis.com/drive/" \
              f"v3/files/{file_id}?alt=json&fields=description,name,size&key={con.google_api}"
-    return requests.get(source, headers=con.http_header).json()
+    return transport.get(source, headers=con.http_header).json()
 
 
 """
@@ -3,7 +3,7 @@ Utility functions to format text
 """
 import math
 import re
-from typing import Optional, Union
+from typing import Optional, Union, Callable
 
 import photoshop.api as ps
 from photoshop.api._artlayer import ArtLayer
@@ -11,6 +11,9 @@ from photoshop.api._artlayer import ArtLayer
 import src.helpers as psd
 from src.constants import con
 from src.__console__ import console
+from src.mana import tokenizer, ColorSlot
+from src.formatted_text import StyleRun, ParagraphRun, generate_italics, locate_italics
+from src.utils.font_metrics import get_font_metrics
 
 # QOL Definitions
 app = ps.Application()
@@ -19,17 +22,31 @@ cID = app.charIDToTypeID
 NO_DIALOG = ps.DialogModes.DisplayNoDialogs
 
 # Precompiled regex
-reg_symbol = re.compile(r"(\{.*?})")
-reg_mana_normal = re.compile(r"{([WUBRG])}")
-reg_mana_hybrid = re.compile(r"{([2WUBRG])/([WUBRG])}")
-reg_mana_phyrexian = re.compile(r"{([WUBRG])/P}")
-reg_mana_phyrexian_hybrid = re.compile(r"{([WUBRG])/([WUBRG])/P}")
-reg_ability_words = re.compile(r"(?:\A|\r+|• +)([A-Za-z0-9 ]+) — ")
 reg_reminder_text = re.compile(r"\([^()]*\)")
 
+# Text fitting, font size resolution and first bracketing step in points
+FIT_PRECISION = 0.2
+FIT_STEP = 0.4
+
+# Functions called with the name of each text fit and the number of measurements it took
+fit_hooks: list[Callable[[str, int], None]] = []
+
+# Constants the symbol colors are loaded from
+SYMBOL_COLORS = (
+    'clr_c', 'clr_w', 'clr_u', 'clr_b', 'clr_bh', 'clr_r', 'clr_g',
+    'clri_c', 'clri_w', 'clri_u', 'clri_b', 'clri_bh', 'clri_r', 'clri_g',
+    'clr_primary', 'clr_secondary'
+)
+
 
 class SymbolMapper:
+    """
+    Symbol colors shared by every text field, loaded from the constants object. The colors are only
+    built again when the color constants change, ex: after a template or config reload.
+    """
     def __init__(self):
+        self.key = ''
+        self.version = 0
         self.load_values()
 
     def load_values(self):
@@ -84,11 +101,24 @@ class SymbolMapper:
         self.hybrid_color_map_inner = self.color_map_inner.copy()
         self.hybrid_color_map_inner['B'] = self.clri_bh
 
+        # Remember which colors were loaded
+        self.key = self.get_key()
+        self.version += 1
+
     def reload(self):
         """
-        Reload default values.
+        Reload default values, if the color constants changed since they were loaded.
         """
-        self.load_values()
+        if self.get_key() != self.key:
+            self.load_values()
+
+    @staticmethod
+    def get_key() -> str:
+        """
+        Get a key representing the current value of every symbol color constant.
+        @return: Key string.
+        """
+        return repr([getattr(con, name) for name in SYMBOL_COLORS])
 
 
 def locate_symbols(input_string: str) -> dict[str: Union[str, dict]]:
@@ -99,153 +129,97 @@ def locate_symbols(input_string: str) -> dict[str: Union[str, dict]]:
     """
     # Ensure symbol mappings are up-to-date
     sym.reload()
-    symbol = ""
-    symbol_indices = []
-    try:
-        while True:
-            match = reg_symbol.search(input_string)
-            if match:
-                symbol = match[1]
-                symbol_index = match.span()[0]
-                symbol_char = con.symbols[symbol]
-                input_string = input_string.replace(symbol, symbol_char, 1)
-                symbol_indices.extend([{
-                    'index': symbol_index,
-                    'colors': determine_symbol_colors(symbol, len(symbol_char))
-                }])
-            else:
-                break
-    except Exception as e:
-        console.update(
-            f"Encountered a symbol I don't recognize: {symbol}", e
-        )
+    input_string, spans, unknown = tokenizer.tokenize(input_string)
+    symbol_indices = [{
+        'index': start,
+        'colors': get_symbol_colors(symbol, slots)
+    } for start, _, symbol, slots in spans]
+    if unknown:
+        console.update(f"Encountered a symbol I don't recognize: {unknown}")
     return {
         'input_string': input_string,
         'symbol_indices': symbol_indices
     }
 
 
-def locate_italics(input_string: str, italics_strings: list) -> list[dict[str: int]]:
+def get_symbol_colors(symbol: str, slots: Optional[tuple[ColorSlot, ...]]) -> Optional[list[ps.SolidColor]]:
     """
-    Locate all instances of italic strings in the input string and record their start and end indices.
-    Returns a list of italic string indices (start and end).
+    Fill the color slots of a symbol with the current symbol colors.
+    @param symbol: Scryfall symbol, ex: {W/U}
+    @param slots: Color slot of each character in the symbol.
+    @return: SolidColor of each character, None if the symbol's colors are unknown.
     """
-    italics_indices = []
-    for italics in italics_strings:
+    if slots is None:
+        console.update(f"Encountered a symbol that I don't know how to color: {symbol}")
+        return
+    return [get_slot_color(slot) for slot in slots]
 
-        # replace symbols with their character representations in the italic string
-        if "}" in italics:
-            for key, symbol in con.symbols.items():
-                if key in italics:
-                    italics = italics.replace(key, symbol)
 
-        # Locate Italicized text
-        end_index = 0
-        while True:
-            start_index = input_string.find(italics, end_index)
-            end_index = start_index + len(italics)
-            if start_index < 0:
-                break
-            italics_indices.append({
-                'start_index': start_index,
-                'end_index': end_index,
-            })
-
-    return italics_indices
-
-
-def determine_symbol_colors(
-    symbol: str,
-    symbol_length: int
-) -> Optional[list[ps.SolidColor]]:
-    """
-    Determines the colors of a symbol (represented as Scryfall string) and returns an array of SolidColor objects.
-    """
-    # Special Symbols
-    if symbol in ("{E}", "{CHAOS}"):
-        # Energy or chaos symbols
-        return [sym.clr_primary]
-    elif symbol == "{S}":
-        # Snow symbol
-        return [sym.clr_c, sym.clr_primary, sym.clr_secondary]
-    elif symbol == "{Q}":
-        # Untap symbol
-        return [sym.clr_primary, sym.clr_secondary]
-
-    # Normal mana symbol
-    normal_symbol_match = reg_mana_normal.match(symbol)
-    if normal_symbol_match:
-        return [
-            sym.color_map[normal_symbol_match[1]],
-            sym.color_map_inner[normal_symbol_match[1]]
-        ]
-
-    # Hybrid
-    hybrid_match = reg_mana_hybrid.match(symbol)
-    if hybrid_match:
-        # Use the darker color for black's symbols for 2/B hybrid symbols
-        color_map = sym.hybrid_color_map if hybrid_match[1] == "2" else sym.color_map
-        return [
-            color_map[hybrid_match[2]],
-            color_map[hybrid_match[1]],
-            sym.color_map_inner[hybrid_match[1]],
-            sym.color_map_inner[hybrid_match[2]]
-        ]
-
-    # Phyrexian
-    phyrexian_match = reg_mana_phyrexian.match(symbol)
-    if phyrexian_match:
-        return [
-            sym.hybrid_color_map[phyrexian_match[1]],
-            sym.hybrid_color_map_inner[phyrexian_match[1]]
-        ]
-
-    # Phyrexian hybrid
-    phyrexian_hybrid_match = reg_mana_phyrexian_hybrid.match(symbol)
-    if phyrexian_hybrid_match:
-        return [
-            sym.color_map[phyrexian_hybrid_match[2]],
-            sym.color_map[phyrexian_hybrid_match[1]],
-            sym.color_map_inner[phyrexian_hybrid_match[1]],
-            sym.color_map_inner[phyrexian_hybrid_match[2]]
-        ]
-
-    # Weird situation?
-    if symbol_length == 2:
-        return [sym.clr_c, sym.clr_primary]
-
-    # Nothing matching found!
-    console.update(f"Encountered a symbol that I don't know how to color: {symbol}")
-    return
-
-
-def format_symbol(
-    primary_action_list: ps.ActionList,
-    starting_layer_ref: ps.ActionDescriptor,
-    symbol_index: int,
-    symbol_colors: list[ps.SolidColor],
-    layer_font_size: Union[int, float]
-) -> ps.ActionDescriptor:
-    """
-    Formats an n-character symbol at the specified index (symbol length determined from symbol_colors).
-    """
-    current_ref = starting_layer_ref
-    for i, color in enumerate(symbol_colors):
-        desc1 = ps.ActionDescriptor()
-        desc2 = ps.ActionDescriptor()
-        idTxtS = cID("TxtS")
-        primary_action_list.putObject(cID("Txtt"), current_ref)
-        desc1.putInteger(cID("From"), symbol_index + i)
-        desc1.putInteger(cID("T   "), symbol_index + i + 1)
-        desc2.putString(sID("fontPostScriptName"), con.font_mana)
-        desc2.putString(cID("FntN"), con.font_mana)
-        desc2.putUnitDouble(cID("Sz  "), cID("#Pnt"), layer_font_size)
-        desc2.putBoolean(sID("autoLeading"), False)
-        desc2.putUnitDouble(cID("Ldng"), cID("#Pnt"), layer_font_size)
-        psd.apply_color(desc2, color)
-        desc1.putObject(idTxtS, idTxtS, desc2)
-        current_ref = desc1
-    return current_ref
+def get_slot_color(slot: ColorSlot) -> ps.SolidColor:
+    """
+    Get the current symbol color filling a color slot.
+    @param slot: Name of a symbol color, and the key to look up if it names a color map.
+    @return: SolidColor object.
+    """
+    name, key = slot
+    return getattr(sym, name) if key is None else getattr(sym, name)[key]
+
+
+def get_text_style_range(run: StyleRun, size: Union[int, float], color: ps.SolidColor) -> ps.ActionDescriptor:
+    """
+    Build the text style range action descriptor of a styled run, with equal font and lead sizes.
+    @param run: Styled run of formatted text.
+    @param size: Font size of the text field.
+    @param color: Color of the run.
+    @return: Text style range descriptor.
+    """
+    desc1 = ps.ActionDescriptor()
+    desc2 = ps.ActionDescriptor()
+    idTxtS = sID("textStyle")
+    desc1.putInteger(sID("from"), run['start'])
+    desc1.putInteger(sID("to"), run['end'])
+    desc2.putString(sID("fontPostScriptName"), run['font'])
+    desc2.putString(sID("fontName"), run['font'])
+    desc2.putUnitDouble(sID("size"), sID("pointsUnit"), size)
+    psd.apply_color(desc2, color)
+    desc2.putBoolean(sID("autoLeading"), False)
+    desc2.putUnitDouble(sID("leading"), sID("pointsUnit"), size)
+    desc1.putObject(idTxtS, idTxtS, desc2)
+    return desc1
+
+
+def get_paragraph_style_range(paragraph: ParagraphRun) -> ps.ActionDescriptor:
+    """
+    Build the paragraph style range action descriptor of a paragraph run.
+    @param paragraph: Paragraph run of formatted text.
+    @return: Paragraph style range descriptor.
+    """
+    desc1 = ps.ActionDescriptor()
+    desc2 = ps.ActionDescriptor()
+    idPnt = sID("pointsUnit")
+    idparagraphStyle = sID("paragraphStyle")
+    desc1.putInteger(sID("from"), paragraph['start'])
+    desc1.putInteger(sID("to"), paragraph['end'])
+    for key, value in paragraph['style'].items():
+        if key == 'align':
+            desc2.putEnumerated(cID("Algn"), cID("Alg "), sID(value))
+        elif key == 'leadingType':
+            desc2.putEnumerated(sID(key), sID(key), sID(value))
+        elif key == 'defaultStyle':
+            desc3 = ps.ActionDescriptor()
+            desc3.putString(sID("fontPostScriptName"), value['font'])
+            desc3.putString(sID("fontName"), value['font_name'])
+            desc3.putUnitDouble(sID("size"), idPnt, value['size'])
+            desc3.putBoolean(sID("autoLeading"), False)
+            desc2.putObject(sID(key), sID("textStyle"), desc3)
+        elif isinstance(value, bool):
+            desc2.putBoolean(sID(key), value)
+        elif key == 'dropCapMultiplier':
+            desc2.putInteger(sID(key), value)
+        else:
+            desc2.putUnitDouble(sID(key), idPnt, value)
+    desc1.putObject(idparagraphStyle, idparagraphStyle, desc2)
+    return desc1
 
 
 def format_flavor_text(input_string: str) -> None:
@@ -293,33 +267,6 @@ def format_flavor_text(input_string: str) -> None:
     app.activeDocument.activeLayer.textItem.hyphenation = False
 
 
-def generate_italics(card_text: str) -> list[str]:
-    """
-    Generates italics text array from card text to italicise all text within (parentheses) and all ability words.
-    """
-    italic_text = []
-
-    # Find and add reminder text
-    end_index = 0
-    while True:
-        start_index = card_text.find("(", end_index)
-        if start_index >= 0:
-            end_index = card_text.find(")", start_index + 1)
-            end_index += 1
-            italic_text.extend([card_text[start_index:end_index]])
-        else:
-            break
-
-    # Find and add ability words
-    for match in reg_ability_words.findall(card_text):
-        # Cover boast cards and cards like Mirrodin Besieged
-        if (f"• {match}" in card_text and card_text[0:12] != "Choose one —") or "Boast" in match:
-            continue
-        italic_text.append(match)
-
-    return italic_text
-
-
 def strip_reminder_text(oracle_text: str) -> str:
     """
     Strip out any reminder text that a card's oracle text has (reminder text in parentheses).
@@ -494,14 +441,16 @@ def scale_text_left_overlap(layer: ArtLayer, reference: ArtLayer) -> None:
 def scale_text_to_fit_reference(
     layer: ArtLayer,
     ref: Union[ArtLayer, int, float],
-    spacing: Optional[int] = None
+    spacing: Optional[int] = None,
+    precision: float = FIT_PRECISION
 ) -> None:
     """
-    Resize a given text layer's contents (in 0.25 pt increments) until it fits inside a specified reference layer.
+    Resize a given text layer's contents until it fits inside a specified reference layer.
     The resulting text layer will have equal font and lead sizes.
     @param layer: Text layer to scale.
     @param ref: Reference layer the text should fit inside.
     @param spacing: [Optional] Amount of mandatory spacing at the bottom of text layer.
+    @param precision: [Optional] Font size resolution of the fit, in points.
     """
     # Establish base variables, ensure a level of spacing at the margins
     if not ref:
@@ -518,56 +467,171 @@ def scale_text_to_fit_reference(
         return
     factor = psd.get_text_scale_factor(layer) or 1
     font_size = layer.textItem.size * factor
-    step, half_step = 0.4, 0.2
 
-    # Step down font and lead sizes by the step size, and update those sizes in the layer
-    if ref_height > psd.get_text_layer_dimensions(layer)['height']:
+    # Does the text already fit?
+    height = psd.get_text_layer_dimensions(layer)['height']
+    if ref_height > height:
+        return
+
+    # Start from the size the font metrics predict will fit
+    def set_size(size: float) -> None:
+        layer.textItem.size = size
+        layer.textItem.leading = size
+
+    fit_text_size(
+        set_size, lambda: psd.get_text_layer_dimensions(layer)['height'], ref_height, font_size,
+        height=height, guess=predict_text_size(layer, font_size, height, ref_height),
+        precision=precision, name=layer.name
+    )
+
+
+def predict_text_size(
+    layer: ArtLayer, font_size: float, height: Union[int, float], ref_height: Union[int, float]
+) -> Optional[float]:
+    """
+    Predict the font size at which a paragraph text layer fits a given height, using the metrics of its font.
+    The prediction is calibrated against the height Photoshop measured at the current size, which accounts
+    for the document resolution and for glyphs the metrics can't place, like mana symbols set in another font.
+    @param layer: Paragraph text layer to scale.
+    @param font_size: Current font size, including the document's scale factor.
+    @param height: Height of the text layer measured at the current font size.
+    @param ref_height: Height the text should fit within.
+    @return: Predicted font size, None if the text can't be measured offline.
+    """
+    # Font must be shipped with the app, and the layer must be paragraph text
+    if not (font := get_font_metrics(layer.textItem.font)):
+        return
+    if not (ratio := psd.get_text_box_ratio(layer)):
         return
-    while ref_height < psd.get_text_layer_dimensions(layer)['height']:
-        font_size -= step
-        layer.textItem.size = font_size
-        layer.textItem.leading = font_size
-
-    # Take a half step back up, check if still in bounds and adjust back if needed
-    font_size += half_step
-    layer.textItem.size = font_size
-    layer.textItem.leading = font_size
-    if ref_height < psd.get_text_layer_dimensions(layer)['height']:
-        font_size -= half_step
-        layer.textItem.size = font_size
-        layer.textItem.leading = font_size
 
+    # Calibrate the predicted height to the measured height
+    text, width = layer.textItem.contents, ratio * font_size
+    scale = height / font.get_text_height(text, font_size, width)
+    predicted = font.fit_text_size(text, font_size, width, ref_height / scale)
+    return predicted if predicted and predicted < font_size else None
 
-def scale_text_layers_to_fit(text_layers: list[ArtLayer], ref_height: Union[int, float]) -> None:
-    # Heights
+
+def scale_text_layers_to_fit(
+    text_layers: list[ArtLayer], ref_height: Union[int, float], precision: float = FIT_PRECISION
+) -> None:
+    """
+    Resize several text layers to the same size, until their combined height fits a given height.
+    @param text_layers: Text layers to scale.
+    @param ref_height: Height the layers should fit inside together.
+    @param precision: [Optional] Font size resolution of the fit, in points.
+    """
     font_size = text_layers[0].textItem.size * psd.get_text_scale_factor(text_layers[0])
-    step = 0.40
-    half_step = 0.20
-    total_layer_height = sum([psd.get_text_layer_dimensions(layer)["height"] for layer in text_layers])
-
-    # Compare height of all 3 elements vs total reference height
-    while total_layer_height > ref_height:
-        total_layer_height = 0
-        font_size -= step
-        for i, layer in enumerate(text_layers):
-            layer.textItem.size = font_size
-            layer.textItem.leading = font_size
-            total_layer_height += psd.get_text_layer_dimensions(layer)["height"]
 
-    # Check half_step
-    font_size += half_step
-    total_layer_height = 0
-    for i, layer in enumerate(text_layers):
-        layer.textItem.size = font_size
-        layer.textItem.leading = font_size
-        total_layer_height += psd.get_text_layer_dimensions(layer)["height"]
+    def set_size(size: float) -> None:
+        for layer in text_layers:
+            layer.textItem.size = size
+            layer.textItem.leading = size
+
+    def measure() -> Union[int, float]:
+        return sum([psd.get_text_layer_dimensions(layer)["height"] for layer in text_layers])
+
+    # Layers which already fit are still set a half step larger if that fits too
+    height = measure()
+    if height <= ref_height:
+        set_size(font_size + FIT_STEP / 2)
+        if measure() > ref_height:
+            set_size(font_size)
+        report_text_fit(text_layers[0].name, 2)
+        return
+    fit_text_size(
+        set_size, measure, ref_height, font_size, height=height, precision=precision, name=text_layers[0].name
+    )
+
+
+def fit_text_size(
+    set_size: Callable[[float], None],
+    measure: Callable[[], Union[int, float]],
+    ref_height: Union[int, float],
+    font_size: float,
+    height: Optional[Union[int, float]] = None,
+    guess: Optional[float] = None,
+    precision: float = FIT_PRECISION,
+    name: str = ''
+) -> float:
+    """
+    Find the largest font size at which text fits a given height, by bracketing the size and bisecting
+    the bracket down to the given precision. Every probe costs a Photoshop measurement, so the first probe
+    is a guess: the predicted size if given, otherwise the size at which the text area would shrink to fit.
+    The size is left at the last probe when it fits, otherwise set once more without measuring.
+    @param set_size: Function which applies a font size to the text.
+    @param measure: Function which measures the height of the text.
+    @param ref_height: Height the text should fit inside.
+    @param font_size: Current font size.
+    @param height: [Optional] Height already measured at the current font size.
+    @param guess: [Optional] Font size expected to fit.
+    @param precision: [Optional] Font size resolution of the fit, in points.
+    @param name: [Optional] Name of the text reported to the fit hooks.
+    @return: Font size the text was set to.
+    """
+    measurements = 0
+
+    def probe(size: float) -> bool:
+        nonlocal measurements
+        set_size(size)
+        measurements += 1
+        return measure() <= ref_height
+
+    # Measure the current size if needed
+    if height is None:
+        measurements += 1
+        height = measure()
+    if height <= ref_height:
+        report_text_fit(name, measurements)
+        return font_size
+
+    # A predicted size is trusted to be close, otherwise assume the text area scales with the square of the font size
+    low, high, step = None, font_size, precision
+    if not guess or not precision <= guess < font_size:
+        guess = font_size * math.sqrt(ref_height / height) if height > 0 else font_size / 2
+        step = FIT_STEP
+    last = guess = min(max(guess, precision), font_size - precision)
+
+    # Bracket the fitting size, widening the step away from the guess each time
+    if probe(guess):
+        low = guess
+        while round(high - low, 6) > precision and (upper := min(low + step, high - precision)) > low:
+            last = upper
+            if not probe(upper):
+                high = upper
+                break
+            low, step = upper, step * 2
+    else:
+        high = guess
+        while low is None:
+            last = lower = max(high - step, precision)
+            if probe(lower) or lower == precision:
+                low = lower
+            else:
+                high, step = lower, step * 2
 
-    # Compare height of all 3 elements vs total reference height
-    if total_layer_height > ref_height:
-        font_size -= half_step
-        for i, layer in enumerate(text_layers):
-            layer.textItem.size = font_size
-            layer.textItem.leading = font_size
+    # Bisect the bracket
+    while round(high - low, 6) > precision:
+        last = mid = (low + high) / 2
+        if probe(mid):
+            low = mid
+        else:
+            high = mid
+
+    # Leave the text at the largest size which fit
+    if last != low:
+        set_size(low)
+    report_text_fit(name, measurements)
+    return low
+
+
+def report_text_fit(name: str, measurements: int) -> None:
+    """
+    Pass the number of measurements a text fit took to the fit hooks.
+    @param name: Name of the text which was fit.
+    @param measurements: Number of times the text was measured.
+    """
+    for hook in fit_hooks:
+        hook(name, measurements)
 
 
 def vertically_align_text(layer: ArtLayer, reference_layer: ArtLayer):
@@ -0,0 +1,462 @@
+"""
+FORMATTED TEXT
+Backend neutral representation of formatted rules and flavor text: the final string, the styled runs
+and the paragraph styles applied to it. Text layers translate it into Photoshop action descriptors.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, TypedDict, Union
+
+from src.constants import con
+from src.mana import tokenizer, ColorSlot
+
+# Bump whenever the representation changes, so stored entries are ignored
+FORMAT_VERSION = 1
+
+# Precompiled regex
+reg_ability_words = re.compile(r"(?:\A|\r+|• +)([A-Za-z0-9 ]+) — ")
+
+# Symbol dictionary the current digest was computed from, and the digest
+symbols_digest: tuple[Optional[dict], str] = (None, '')
+
+# Run color: 'text' for the field color, 'flavor' for the flavor color, or a symbol color slot
+ColorRef = Union[str, ColorSlot]
+
+
+class StyleRun(TypedDict):
+    start: int
+    end: int
+    font: str
+    color: ColorRef
+
+
+class ParagraphRun(TypedDict):
+    start: int
+    end: int
+    style: dict
+
+
+class SymbolIndex(TypedDict):
+    index: int
+    symbol: str
+    slots: Optional[list[ColorSlot]]
+
+
+class FormattedText(TypedDict):
+    input_string: str
+    rules_text: str
+    flavor_text: str
+    unknown_symbol: Optional[str]
+    symbol_indices: list[SymbolIndex]
+    italics_indices: list[dict[str, int]]
+    styles: list[StyleRun]
+    paragraphs: list[ParagraphRun]
+
+
+class FormattedTextCache:
+    """
+    Formatted text kept in memory for the most recently used texts, and on disk for texts formatted before,
+    so cards sharing rules text skip parsing entirely, even across sessions. The least recently used texts
+    are dropped from disk once it grows past its size cap.
+    @param path: Path to the cache database file.
+    @param max_size: Maximum total size of texts stored on disk in bytes.
+    @param memory_size: Number of formatted texts kept in memory.
+    """
+    def __init__(self, path: str, max_size: int, memory_size: int = 512):
+        self.path = path
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.entries: OrderedDict[str, FormattedText] = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Counters for the current session
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads
+        if not hasattr(self._local, 'connection'):
+            Path(os.path.dirname(self.path)).mkdir(mode=511, parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS texts (key TEXT PRIMARY KEY, data TEXT, accessed REAL, size INTEGER)"
+            )
+            columns = [c[1] for c in db.execute("PRAGMA table_info(texts)")]
+            if 'size' not in columns:
+                # Added after the first version of the cache
+                db.execute("ALTER TABLE texts ADD COLUMN accessed REAL DEFAULT 0")
+                db.execute("ALTER TABLE texts ADD COLUMN size INTEGER")
+                db.execute("UPDATE texts SET size = LENGTH(CAST(data AS BLOB))")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON texts (accessed)")
+            db.commit()
+            self._create_totals(db)
+            self._local.connection = db
+        return self._local.connection
+
+    @property
+    def size(self) -> int:
+        row = self.connection.execute("SELECT value FROM totals WHERE name = 'size'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+    def get(self, key: str) -> Optional[FormattedText]:
+        """
+        Get formatted text from memory, or from disk if it was formatted in an earlier session.
+        @param key: Cache key.
+        @return: Formatted text, None if it hasn't been formatted before.
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        try:
+            row = self.connection.execute("SELECT data FROM texts WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        if not row:
+            with self._lock:
+                self.misses += 1
+            return
+        text = json.loads(row[0])
+        with self._lock:
+            self.hits += 1
+            self.remember(key, text)
+        self._touch(key)
+        return text
+
+    def put(self, key: str, text: FormattedText) -> None:
+        """
+        Store formatted text in memory and on disk.
+        @param key: Cache key.
+        @param text: Formatted text.
+        """
+        data = json.dumps(text, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            self.remember(key, text)
+            try:
+                # Upsert rather than replace, so the update trigger sees the size being replaced
+                self.connection.execute(
+                    "INSERT INTO texts VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                    "data = excluded.data, accessed = excluded.accessed, size = excluded.size",
+                    (key, data, time.time(), len(data.encode('utf-8')))
+                )
+                self._evict()
+                self.connection.commit()
+            except sqlite3.Error:
+                # The memory cache still works without the disk cache
+                pass
+
+    def remember(self, key: str, text: FormattedText) -> None:
+        """
+        Keep formatted text in memory, dropping the least recently used once full. Lock must be held.
+        @param key: Cache key.
+        @param text: Formatted text.
+        """
+        self.entries[key] = text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.memory_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every formatted text from memory and disk.
+        """
+        with self._lock:
+            self.entries.clear()
+            self.connection.execute("DELETE FROM texts")
+            self.connection.commit()
+
+    @staticmethod
+    def _create_totals(db: sqlite3.Connection) -> None:
+        # Running total of stored bytes, kept by triggers in the same transaction as each change
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER)")
+            db.execute("INSERT OR IGNORE INTO totals SELECT 'size', COALESCE(SUM(size), 0) FROM texts")
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS texts_insert AFTER INSERT ON texts BEGIN "
+                "UPDATE totals SET value = value + new.size WHERE name = 'size'; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS texts_delete AFTER DELETE ON texts BEGIN "
+                "UPDATE totals SET value = value - old.size WHERE name = 'size'; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS texts_update AFTER UPDATE OF size ON texts BEGIN "
+                "UPDATE totals SET value = value - old.size + new.size WHERE name = 'size'; END"
+            )
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+
+    def _touch(self, key: str) -> None:
+        try:
+            with self._lock:
+                self.connection.execute("UPDATE texts SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.connection.commit()
+        except sqlite3.Error:
+            pass
+
+    def _evict(self) -> None:
+        # Drop the least recently used texts until we're under the cap
+        excess = self.size - self.max_size
+        if excess <= 0:
+            return
+        removed, keys = 0, []
+        for key, size in self.connection.execute("SELECT key, size FROM texts ORDER BY accessed"):
+            if removed >= excess:
+                break
+            keys.append((key,))
+            removed += size
+        self.connection.executemany("DELETE FROM texts WHERE key = ?", keys)
+
+
+"""
+FORMATTING
+"""
+
+
+def get_formatted_text(
+    contents: str,
+    flavor_text: str = '',
+    bold_rules_text: bool = False,
+    right_align_quote: bool = False,
+    flavor_color: bool = False,
+    line_break_lead: Union[int, float] = 0,
+    flavor_text_lead: Union[int, float] = 0
+) -> FormattedText:
+    """
+    Get the formatted text for rules and flavor text with the given settings, from the cache if it was
+    formatted before.
+    @param contents: Rules text, line breaks as carriage returns.
+    @param flavor_text: Flavor text, line breaks as carriage returns.
+    @param bold_rules_text: Set the rules text in bold.
+    @param right_align_quote: Align the credit of a flavor text quote to the right.
+    @param flavor_color: Flavor text has a color of its own.
+    @param line_break_lead: Space before each rules text paragraph.
+    @param flavor_text_lead: Space between the rules and flavor text.
+    @return: Formatted text.
+    """
+    settings = [bold_rules_text, right_align_quote, flavor_color, line_break_lead, flavor_text_lead]
+    key = get_cache_key(contents, flavor_text, settings)
+    if text := text_cache.get(key):
+        return text
+    text = format_text(contents, flavor_text, *settings)
+    text_cache.put(key, text)
+    return text
+
+
+def format_text(
+    contents: str,
+    flavor_text: str,
+    bold_rules_text: bool,
+    right_align_quote: bool,
+    flavor_color: bool,
+    line_break_lead: Union[int, float],
+    flavor_text_lead: Union[int, float]
+) -> FormattedText:
+    """
+    Work out the symbols, italics, styled runs and paragraph styles of rules and flavor text.
+    See get_formatted_text for parameters.
+    @return: Formatted text.
+    """
+    # Generate italic text arrays from things in (parentheses), ability words, and the given flavor text
+    italic_text = generate_italics(contents)
+    flavor_index = len(contents) if len(flavor_text) > 0 else -1
+    if flavor_text.count("*") >= 2:
+        # Don't italicize text between asterisk
+        flavor_text_split = flavor_text.split("*")
+        italic_text.extend([v for i, v in enumerate(flavor_text_split) if not i % 2 and not v == ''])
+        flavor_text = ''.join(flavor_text_split)
+    elif flavor_text:
+        # Regular flavor text
+        italic_text.append(flavor_text)
+
+    # Locate symbols and italics
+    rules_text, spans, unknown = tokenizer.tokenize(contents)
+    input_string = f"{rules_text}\r{flavor_text}"
+    italics_indices = locate_italics(input_string, italic_text)
+    quote_index = input_string.find("\r", flavor_index + 3) if flavor_index >= 0 else -1
+
+    # Base style, then bold, italics and every symbol character
+    styles: list[StyleRun] = [get_run(0, len(input_string), con.font_rules_text)]
+    if bold_rules_text and flavor_index != 0:
+        contents_index = len(input_string) - 1 if flavor_index < 0 else flavor_index - 1
+        styles.append(get_run(0, contents_index, con.font_rules_text_bold))
+    for italics in italics_indices:
+        styles.append(get_run(italics['start_index'], italics['end_index'], con.font_rules_text_italic))
+    for start, _, _, slots in spans:
+        for i, slot in enumerate(slots or []):
+            styles.append(get_run(start + i, start + i + 1, con.font_mana, slot))
+
+    # Paragraph styles carry over from one range to the next
+    paragraphs: list[ParagraphRun] = []
+    style = {
+        'firstLineIndent': 0, 'startIndent': 0, 'endIndent': 0, 'spaceBefore': line_break_lead,
+        'spaceAfter': 0, 'dropCapMultiplier': 1, 'leadingType': 'leadingBelow'
+    }
+
+    # Adjust formatting for modal card with bullet points
+    if "•" in input_string:
+        style.update({
+            'firstLineIndent': -con.modal_indent, 'startIndent': con.modal_indent, 'spaceBefore': 1, 'spaceAfter': 0,
+            'defaultStyle': {'font': con.font_mana, 'font_name': con.font_rules_text, 'size': 12}
+        })
+        paragraphs.append({
+            'start': input_string.find("•"), 'end': input_string.rindex("•") + 1, 'style': style.copy()
+        })
+
+    # Add linebreak spacing between rules and flavor text
+    if flavor_index >= 0:
+        style.update({
+            'firstLineIndent': 0, 'impliedFirstLineIndent': 0, 'startIndent': 0, 'impliedStartIndent': 0,
+            'spaceBefore': flavor_text_lead
+        })
+        paragraphs.append({'start': flavor_index + 3, 'end': flavor_index + 4, 'style': style.copy()})
+
+        # Flavor text color replaces every other text style
+        if flavor_color:
+            styles = [get_run(flavor_index, len(input_string), con.font_rules_text_italic, 'flavor')]
+
+    # Adjust line break spacing if there's a line break in the flavor text
+    if quote_index >= 0:
+        style['spaceBefore'] = 0
+        paragraphs.append({'start': quote_index + 3, 'end': len(input_string), 'style': style.copy()})
+
+        # Optional, align quote credit to right
+        if right_align_quote and input_string.find('"\r—') >= 0:
+            paragraphs.append({
+                'start': input_string.find('"\r—') + 2, 'end': len(input_string) - 1,
+                'style': {'styleSheetHasParent': True, 'align': 'right'}
+            })
+
+    return {
+        'input_string': input_string,
+        'rules_text': rules_text,
+        'flavor_text': flavor_text,
+        'unknown_symbol': unknown,
+        'symbol_indices': [
+            {'index': start, 'symbol': symbol, 'slots': [list(s) for s in slots] if slots else None}
+            for start, _, symbol, slots in spans
+        ],
+        'italics_indices': italics_indices,
+        'styles': styles,
+        'paragraphs': paragraphs
+    }
+
+
+"""
+UTILITIES
+"""
+
+
+def get_run(start: int, end: int, font: str, color: ColorRef = 'text') -> StyleRun:
+    """
+    Describe a styled run of text, set at the size of the text field.
+    @param start: Index of the first character.
+    @param end: Index after the last character.
+    @param font: PostScript name of the font.
+    @param color: Color reference.
+    @return: Style run.
+    """
+    return {'start': start, 'end': end, 'font': font, 'color': list(color) if isinstance(color, tuple) else color}
+
+
+def get_cache_key(contents: str, flavor_text: str, settings: list) -> str:
+    """
+    Get the cache key of formatted text, covering the constants it depends on.
+    @param contents: Rules text.
+    @param flavor_text: Flavor text.
+    @param settings: Formatting settings.
+    @return: Key string.
+    """
+    fonts = [con.font_rules_text, con.font_rules_text_bold, con.font_rules_text_italic, con.font_mana]
+    key = [FORMAT_VERSION, contents, flavor_text, settings, fonts, con.modal_indent, get_symbols_digest()]
+    return hashlib.sha1(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def get_symbols_digest() -> str:
+    """
+    Get a digest of the NDPMTG symbol dictionary, computed again only when the constants load a new one.
+    Templates changing the characters of a symbol should replace con.symbols rather than edit it in place.
+    @return: Hex digest.
+    """
+    global symbols_digest
+    symbols, digest = symbols_digest
+    if symbols is not con.symbols:
+        symbols = con.symbols
+        digest = hashlib.sha1(json.dumps(symbols, ensure_ascii=False).encode('utf-8')).hexdigest()
+        symbols_digest = symbols, digest
+    return digest
+
+
+def generate_italics(card_text: str) -> list[str]:
+    """
+    Generates italics text array from card text to italicise all text within (parentheses) and all ability words.
+    """
+    italic_text = []
+
+    # Find and add reminder text
+    end_index = 0
+    while True:
+        start_index = card_text.find("(", end_index)
+        if start_index >= 0:
+            end_index = card_text.find(")", start_index + 1)
+            end_index += 1
+            italic_text.extend([card_text[start_index:end_index]])
+        else:
+            break
+
+    # Find and add ability words
+    for match in reg_ability_words.findall(card_text):
+        # Cover boast cards and cards like Mirrodin Besieged
+        if (f"• {match}" in card_text and card_text[0:12] != "Choose one —") or "Boast" in match:
+            continue
+        italic_text.append(match)
+
+    return italic_text
+
+
+def locate_italics(input_string: str, italics_strings: list) -> list[dict[str: int]]:
+    """
+    Locate all instances of italic strings in the input string and record their start and end indices.
+    Returns a list of italic string indices (start and end).
+    """
+    italics_indices = []
+    for italics in italics_strings:
+
+        # replace symbols with their character representations in the italic string
+        italics = tokenizer.translate(italics)
+
+        # Locate Italicized text
+        end_index = 0
+        while True:
+            start_index = input_string.find(italics, end_index)
+            end_index = start_index + len(italics)
+            if start_index < 0:
+                break
+            italics_indices.append({
+                'start_index': start_index,
+                'end_index': end_index,
+            })
+
+    return italics_indices
+
+
+# Global formatted text cache
+text_cache = FormattedTextCache(con.path_text_cache, con.text_cache_size)
@@ -1,10 +1,40 @@
 """
 Functions handling logic for card frames
 """
-from typing import Union, Optional, TypedDict
+import re
+from functools import lru_cache
+from typing import Union, Optional, TypedDict, Iterable
 
 from src.constants import con
 from src.settings import cfg
+from src.symbols import symbol_table
+
+# Frame classifications kept in memory
+FRAME_CACHE_SIZE = 8192
+
+# Mana colors in WUBRG order
+colors = [
+    con.layers.WHITE,
+    con.layers.BLUE,
+    con.layers.BLACK,
+    con.layers.RED,
+    con.layers.GREEN
+]
+basic_colors = {
+    'Plains': con.layers.WHITE,
+    'Island': con.layers.BLUE,
+    'Swamp': con.layers.BLACK,
+    'Mountain': con.layers.RED,
+    'Forest': con.layers.GREEN
+}
+hybrid_symbols = ['W/U', 'U/B', 'B/R', 'R/G', 'G/W', 'W/B', 'B/G', 'G/U', 'U/R', 'R/W']
+
+# Precompiled matchers
+reg_basic_types = re.compile('|'.join(basic_colors))
+reg_hybrid = re.compile('|'.join(map(re.escape, hybrid_symbols)))
+reg_mana_symbols = re.compile(r'\{([%s])\}' % ''.join(colors))
+reg_any_color = re.compile(r'colors?[ .]|any type')
+reg_not_gold = re.compile('enters the battlefield|Remove a charge counter|Sacrifice|luck counter')
 
 
 class FrameDetails(TypedDict):
@@ -43,6 +73,7 @@ def select_frame_layers(card: dict) -> FrameDetails:
     """
     * Figure out which layers to use for pinlines, background, twins
     * Also define the color identity
+    Cards are classified by the parts of their data the frame depends on, so identical frames are only worked out once.
     """
     # Destructure the attributes we need
     mana_cost, type_line, oracle_text, color_identity_array, color_indicator, mdfc = [
@@ -53,179 +84,156 @@ def select_frame_layers(card: dict) -> FrameDetails:
         card['color_indicator'] if 'color_indicator' in card else [],
         card['object'] == 'card_face'
     ]
-    colors = [
-        con.layers.WHITE,
-        con.layers.BLUE,
-        con.layers.BLACK,
-        con.layers.RED,
-        con.layers.GREEN
-    ]
-    basic_colors = {
-        'Plains': con.layers.WHITE,
-        'Island': con.layers.BLUE,
-        'Swamp': con.layers.BLACK,
-        'Mountain': con.layers.RED,
-        'Forest': con.layers.GREEN
-    }
-    hybrid_symbols = ['W/U', 'U/B', 'B/R', 'R/G', 'G/W', 'W/B', 'B/G', 'G/U', 'U/R', 'R/W']
-    twins = colors_tapped = color_identity = basic_identity = ''
 
+    # Land frames depend on the type line and the rules text lines that mention mana or fetching
+    if 'Land' in type_line:
+        return get_frame_details(get_land_frame(type_line, tuple(
+            line for line in oracle_text.split('\n')
+            if 'Each land is a ' in line or 'add' in line.lower() or 'search your library' in line.lower()
+        )))
+
+    # Nonland frames only use color data when the card has no mana cost
+    no_cost = mana_cost == '' or (mana_cost == '{0}' and con.layers.ARTIFACT not in type_line)
+    return get_frame_details(get_nonland_frame(
+        mana_cost,
+        type_line,
+        oracle_text.find(' is all colors.') > 0,
+        'Devoid' in oracle_text,
+        tuple(color_identity_array) if no_cost else (),
+        tuple(color_indicator) if no_cost else (),
+        mdfc if mana_cost == '' else False
+    ))
+
+
+def select_frame_layers_batch(cards: Iterable[dict]) -> list[FrameDetails]:
     """
-    Handle Land cards
+    Figure out the frame layers for a list of cards at once.
+    @param cards: Scryfall card or card face dicts.
+    @return: Frame details of each card, in the same order.
     """
+    return [select_frame_layers(card) for card in cards]
 
-    if 'Land' in type_line:
-
-        # Check if it has a basic land subtype
-        for key, basic in basic_colors.items():
-            if key in type_line:
-                # The land has this basic type on its type_line
-                basic_identity += basic
-
-        # Land has one basic land type, still need to check pinlines (ex: Murmuring Bosk)
-        if len(basic_identity) == 1:
-            twins = basic_identity
-        elif len(basic_identity) == 2:
-            # Exactly two basic land types. Fix naming convention, return frame elements
-            basic_identity = fix_color_pair(basic_identity)
-            return {
-                'background': con.layers.LAND,
-                'pinlines': basic_identity,
-                'twins': con.layers.LAND,
-                'is_colorless': False
-            }
-
-        # Iterate over rules text lines
-        basic_identity = ''
-        for line in oracle_text.split('\n'):
-            # Identify if the card is a fetch land
-            if 'search your library' in line.lower():
-                if 'cycling' not in line.lower():
-                    # Fetch land of some kind, find basic land types
-                    for key, basic in basic_colors.items():
-                        if key in line:
-                            # The land has this basic type in the line of rules text where it fetches
-                            basic_identity += basic
-
-                # Set the name box & pinlines based on how many basics the ability mentions
-                if len(basic_identity) == 1:
-                    # One basic mentioned - the land should just be this color
-                    return {
-                        'background': con.layers.LAND,
-                        'pinlines': basic_identity,
-                        'twins': basic_identity,
-                        'is_colorless': False,
-                    }
-                elif len(basic_identity) == 2:
-                    # Two basics mentioned - the land should use the land name box and those pinlines
-                    basic_identity = fix_color_pair(basic_identity)
-                    return {
-                        'background': con.layers.LAND,
-                        'pinlines': basic_identity,
-                        'twins': con.layers.LAND,
-                        'is_colorless': False,
-                    }
-                elif len(basic_identity) == 3:
-                    # Three basic mentioned, Panorama case
-                    return {
-                        'background': con.layers.LAND,
-                        'pinlines': con.layers.LAND,
-                        'twins': con.layers.LAND,
-                        'is_colorless': False,
-                    }
-                elif con.layers.LAND.lower() in line:
-                    # Assume we get here when the land fetches for any basic
-                    if ('tapped' not in line or 'untap' in line) and (
-                        # Ash Barrens case
-                        'into your hand' not in line
-                    ):
-                        # Gold fetch land
-                        return {
-                            'background': con.layers.LAND,
-                            'pinlines': con.layers.GOLD,
-                            'twins': con.layers.GOLD,
-                            'is_colorless': False,
-                        }
-                    # Colorless fetch land
-                    return {
-                        'background': con.layers.LAND,
-                        'pinlines': con.layers.LAND,
-                        'twins': con.layers.LAND,
-                        'is_colorless': False,
-                    }
-
-            # Check if the line adds one mana of any color
-            if ('add' in line.lower() and 'mana' in line) and (
-                'color ' in line
-                or 'colors ' in line
-                or 'color.' in line
-                or 'colors.' in line
-                or 'any type' in line
-            ):
-                # Potential Gold Land
-                # If the ability doesn't include "enters the battlefield", "Remove a charge
-                # counter", "luck counter", or "Sacrifice", it's probably a Gold land.
-                phrases = ['enters the battlefield', 'Remove a charge counter', 'Sacrifice', 'luck counter']
-                if not any(x in line for x in phrases):
-                    # This is a gold land - use gold twins and pinlines
-                    return {
-                        'background': con.layers.LAND,
-                        'pinlines': con.layers.GOLD,
-                        'twins': con.layers.GOLD,
-                        'is_colorless': False,
-                    }
-
-            # Check if the line makes all lands X type, ex: Urborg, Tomb of Yawgmoth
-            if 'Each land is a ' in line:
-                for k, v in basic_colors.items():
-                    if k in line:
-                        return {
-                            'background': con.layers.LAND,
-                            'pinlines': v, 'twins': v,
-                            'is_colorless': False,
-                        }
-
-            # Count how many colors of mana the card can explicitly tap to add
-            if line.find('{T}') < line.find(':') and 'add ' in line.lower():
-                # This line taps to add mana of some color
-                # Count how many colors the line can tap for, and add them all to colors_tapped
-                for color in colors:
-                    if '{' + color + '}' in line and color not in colors_tapped:
-                        # Add this color to colors_tapped
-                        colors_tapped += color
-
-        # Evaluate colors_tapped and make decisions from here
-        if len(colors_tapped) == 1:
-            pinlines = colors_tapped
-            twins = colors_tapped if twins == '' else twins
-        elif len(colors_tapped) == 2:
-            pinlines = fix_color_pair(colors_tapped)
-            twins = con.layers.LAND if twins == '' else twins
-        elif len(colors_tapped) > 2:
-            pinlines = con.layers.GOLD
-            twins = con.layers.GOLD if twins == '' else twins
-        else:
-            pinlines = con.layers.LAND
-            twins = con.layers.LAND if twins == '' else twins
-
-        # Final return statement
-        return {
-            'background': con.layers.LAND,
-            'pinlines': pinlines,
-            'twins': twins,
-            'is_colorless': False,
-        }
 
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def get_land_frame(type_line: str, lines: tuple[str, ...]) -> tuple[str, str, str, bool]:
+    """
+    Select the frame layers for a land.
+    @param type_line: Type line of the card.
+    @param lines: Rules text lines which mention adding mana, fetching lands, or land types.
+    @return: Background, pinlines, twins and whether the frame is colorless.
+    """
+    twins = colors_tapped = ''
+
+    # Check if it has a basic land subtype
+    basic_identity = get_basic_identity(type_line)
+
+    # Land has one basic land type, still need to check pinlines (ex: Murmuring Bosk)
+    if len(basic_identity) == 1:
+        twins = basic_identity
+    elif len(basic_identity) == 2:
+        # Exactly two basic land types. Fix naming convention, return frame elements
+        return con.layers.LAND, fix_color_pair(basic_identity), con.layers.LAND, False
+
+    # Iterate over rules text lines
+    basic_identity = ''
+    for line in lines:
+        # Identify if the card is a fetch land
+        if 'search your library' in line.lower():
+            if 'cycling' not in line.lower():
+                # Fetch land of some kind, the basic land types are in the line of rules text where it fetches
+                basic_identity += get_basic_identity(line)
+
+            # Set the name box & pinlines based on how many basics the ability mentions
+            if len(basic_identity) == 1:
+                # One basic mentioned - the land should just be this color
+                return con.layers.LAND, basic_identity, basic_identity, False
+            elif len(basic_identity) == 2:
+                # Two basics mentioned - the land should use the land name box and those pinlines
+                return con.layers.LAND, fix_color_pair(basic_identity), con.layers.LAND, False
+            elif len(basic_identity) == 3:
+                # Three basic mentioned, Panorama case
+                return con.layers.LAND, con.layers.LAND, con.layers.LAND, False
+            elif con.layers.LAND.lower() in line:
+                # Assume we get here when the land fetches for any basic
+                if ('tapped' not in line or 'untap' in line) and (
+                    # Ash Barrens case
+                    'into your hand' not in line
+                ):
+                    # Gold fetch land
+                    return con.layers.LAND, con.layers.GOLD, con.layers.GOLD, False
+                # Colorless fetch land
+                return con.layers.LAND, con.layers.LAND, con.layers.LAND, False
+
+        # Check if the line adds one mana of any color
+        if ('add' in line.lower() and 'mana' in line) and reg_any_color.search(line):
+            # Potential Gold Land
+            # If the ability doesn't include "enters the battlefield", "Remove a charge
+            # counter", "luck counter", or "Sacrifice", it's probably a Gold land.
+            if not reg_not_gold.search(line):
+                # This is a gold land - use gold twins and pinlines
+                return con.layers.LAND, con.layers.GOLD, con.layers.GOLD, False
+
+        # Check if the line makes all lands X type, ex: Urborg, Tomb of Yawgmoth
+        if 'Each land is a ' in line:
+            if basic := get_basic_identity(line):
+                return con.layers.LAND, basic[0], basic[0], False
+
+        # Count how many colors of mana the card can explicitly tap to add
+        if line.find('{T}') < line.find(':') and 'add ' in line.lower():
+            # This line taps to add mana of some color
+            # Count how many colors the line can tap for, and add them all to colors_tapped
+            symbols = set(reg_mana_symbols.findall(line))
+            for color in colors:
+                if color in symbols and color not in colors_tapped:
+                    # Add this color to colors_tapped
+                    colors_tapped += color
+
+    # Evaluate colors_tapped and make decisions from here
+    if len(colors_tapped) == 1:
+        pinlines = colors_tapped
+        twins = colors_tapped if twins == '' else twins
+    elif len(colors_tapped) == 2:
+        pinlines = fix_color_pair(colors_tapped)
+        twins = con.layers.LAND if twins == '' else twins
+    elif len(colors_tapped) > 2:
+        pinlines = con.layers.GOLD
+        twins = con.layers.GOLD if twins == '' else twins
+    else:
+        pinlines = con.layers.LAND
+        twins = con.layers.LAND if twins == '' else twins
+
+    # Final return statement
+    return con.layers.LAND, pinlines, twins, False
+
+
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def get_nonland_frame(
+    mana_cost: str,
+    type_line: str,
+    all_colors: bool,
+    devoid_text: bool,
+    color_identity_array: tuple[str, ...],
+    color_indicator: tuple[str, ...],
+    mdfc: bool
+) -> tuple[str, str, str, bool]:
     """
-    NONLAND CARD - Decide on the color identity of the card, as far as the frame is concerned.
+    Decide on the color identity of a nonland card, as far as the frame is concerned, and select its frame layers.
     e.g. Noble Hierarch's color identity is [W, U, G], but the card is considered green, frame-wise
+    @param mana_cost: Mana cost of the card.
+    @param type_line: Type line of the card.
+    @param all_colors: Rules text states the card is all colors, ex: Transguild Courier
+    @param devoid_text: Rules text mentions Devoid.
+    @param color_identity_array: Color identity of the card.
+    @param color_indicator: Color indicator of the card.
+    @param mdfc: Data is a face of a double faced card.
+    @return: Background, pinlines, twins and whether the frame is colorless.
     """
+    color_identity = ''
 
     # Card with no mana cost
     if mana_cost == '' or (mana_cost == '{0}' and con.layers.ARTIFACT not in type_line):
         # If `color_indicator` is defined for this card, use that as the colour identity
         # Otherwise, use `color_identity` as the color identity
-        color_identity = ''
         if color_indicator:
             color_identity = ''.join(color_indicator)
         elif color_identity_array:
@@ -243,12 +251,12 @@ def select_frame_layers(card: dict) -> FrameDetails:
         color_identity = fix_color_pair(color_identity)
 
     # Handle Transguild Courier case - cards that explicitly state that they're all colors
-    if oracle_text.find(' is all colors.') > 0:
+    if all_colors:
         color_identity = 'WUBRG'
 
     # Identify if the card is a full-art colorless card, e.g. colorless
     # Assume all non-land cards with the word "Devoid" in their rules text use the BFZ colorless frame
-    devoid = bool('Devoid' in oracle_text and len(color_identity) > 0)
+    devoid = bool(devoid_text and len(color_identity) > 0)
     if (
             len(color_identity) <= 0 and type_line.find(con.layers.ARTIFACT) < 0
     ) or devoid or (mana_cost == '' and type_line.find('Eldrazi') >= 0):
@@ -270,21 +278,13 @@ def select_frame_layers(card: dict) -> FrameDetails:
                 background = color_identity
 
         # Return the selected elements
-        return {
-            'background': background,
-            'pinlines': pinlines,
-            'twins': twins,
-            'is_colorless': True,
-        }
+        return background, pinlines, twins, True
 
     # Identify if the card is a two-color hybrid card
     hybrid = False
     if len(color_identity) == 2:
-        for hybrid_symbol in hybrid_symbols:
-            if mana_cost.find(hybrid_symbol) >= 0:
-                # The card is two colors and has a hybrid symbol in its mana cost
-                hybrid = True
-                break
+        # The card is two colors and has a hybrid symbol in its mana cost
+        hybrid = bool(reg_hybrid.search(mana_cost))
         # Hybrid blank mana cost cards like Asmo
         if mana_cost == '' and not mdfc:
             hybrid = True
@@ -312,6 +312,7 @@ def select_frame_layers(card: dict) -> FrameDetails:
         pinlines = con.layers.GOLD
 
     # Select name box
+    twins = ''
     if len(color_identity) <= 0:
         twins = con.layers.ARTIFACT
     elif len(color_identity) == 1:
@@ -322,12 +323,32 @@ def select_frame_layers(card: dict) -> FrameDetails:
         twins = con.layers.GOLD
 
     # Finally, return the selected layers
-    return {
-        'background': background,
-        'pinlines': pinlines,
-        'twins': twins,
-        'is_colorless': False,
-    }
+    return background, pinlines, twins, False
+
+
+"""
+FRAME UTILITIES
+"""
+
+
+def get_basic_identity(text: str) -> str:
+    """
+    Get the colors of every basic land type named in some text.
+    @param text: Type line or rules text line.
+    @return: Colors in WUBRG order, ex: WU
+    """
+    found = set(reg_basic_types.findall(text))
+    return ''.join(color for name, color in basic_colors.items() if name in found)
+
+
+def get_frame_details(frame: tuple[str, str, str, bool]) -> FrameDetails:
+    """
+    Unpack a frame classification into a new details dict, so callers can't alter the memoized result.
+    @param frame: Background, pinlines, twins and whether the frame is colorless.
+    @return: Frame details dict.
+    """
+    background, pinlines, twins, is_colorless = frame
+    return {'background': background, 'pinlines': pinlines, 'twins': twins, 'is_colorless': is_colorless}
 
 
 """
@@ -338,6 +359,17 @@ EXPANSION SYMBOLS
 def format_expansion_symbol_info(symbol: Union[str, list], rarity: str) -> Optional[tuple[str, list]]:
     """
     Takes in set code and returns information needed to build the expansion symbol.
+    Information is only built the first time a symbol is used at each rarity.
+    @param symbol: Symbol chosen by layout object.
+    @param rarity: Rarity of the symbol.
+    @return: List of dicts containing information about this symbol.
+    """
+    return symbol_table.get_formatted(symbol, rarity, cfg.symbol_stroke, build_expansion_symbol_info)
+
+
+def build_expansion_symbol_info(symbol: Union[str, list], rarity: str) -> Optional[tuple[str, list]]:
+    """
+    Builds the information needed to create the expansion symbol using the classic method.
     @param symbol: Symbol chosen by layout object.
     @param rarity: Rarity of the symbol.
     @return: List of dicts containing information about this symbol.
@@ -15,6 +15,7 @@ from photoshop.api._layerSet import LayerSet
 from src.constants import con
 from src.scryfall import card_scan
 from src.settings import cfg
+from src.symbols import symbol_table
 from src.utils.enums_photoshop import Alignment, Stroke
 from src.utils.strings import ps_version_check
 from src.utils.types_photoshop import EffectStroke, EffectDropShadow, EffectGradientOverlay, LayerEffects, \
@@ -377,6 +378,34 @@ def get_text_scale_factor(layer: Optional[ArtLayer] = None, axis: str = "xx") ->
     return factor
 
 
+def get_text_box_ratio(layer: Optional[ArtLayer] = None) -> Optional[float]:
+    """
+    Get the width of a paragraph text layer's box relative to its font size. Both are read in unscaled
+    text units, so the ratio doesn't depend on the document's scale factor or resolution.
+    @param layer: The layer to make active and run the check on.
+    @return: Box width divided by font size, None if the layer isn't paragraph text.
+    """
+    # Change the active layer, if needed
+    if layer:
+        app.activeDocument.activeLayer = layer
+
+    # Read the box bounds and the size of the first text style
+    try:
+        ref = ActionReference()
+        ref.putEnumerated(cID("Lyr "), cID("Ordn"), cID("Trgt"))
+        desc = app.executeActionGet(ref).getObjectValue(sID('textKey'))
+        shape = desc.getList(sID('textShape')).getObjectValue(0)
+        if not shape.hasKey(sID('bounds')):
+            return
+        bounds = shape.getObjectValue(sID('bounds'))
+        width = bounds.getUnitDoubleValue(sID('right')) - bounds.getUnitDoubleValue(sID('left'))
+        style = desc.getList(sID('textStyleRange')).getObjectValue(0).getObjectValue(sID('textStyle'))
+        size = style.getUnitDoubleValue(sID('size'))
+    except (PhotoshopPythonAPIError, AttributeError, TypeError):
+        return
+    return width / size if width > 0 and size > 0 else None
+
+
 def set_text_size(size: int, layer: Optional[ArtLayer] = None) -> None:
     """
     Manually assign font size to a layer using action descriptors.
@@ -1511,6 +1540,17 @@ def fill_expansion_symbol(reference: ArtLayer, color: SolidColor = rgb_black())
 def process_expansion_symbol_info(symbol: Union[str, list], rarity: str) -> Optional[tuple[str, list]]:
     """
     Takes in set code and returns information needed to build the expansion symbol.
+    Effects are only built the first time a symbol is used at each rarity.
+    @param symbol: Symbol chosen by layout object.
+    @param rarity: Rarity of the symbol.
+    @return: List of dicts containing information about this symbol.
+    """
+    return symbol_table.get_formatted(symbol, rarity, cfg.symbol_stroke, build_expansion_symbol_info)
+
+
+def build_expansion_symbol_info(symbol: Union[str, list], rarity: str) -> Optional[tuple[str, list]]:
+    """
+    Builds the information needed to create the expansion symbol.
     @param symbol: Symbol chosen by layout object.
     @param rarity: Rarity of the symbol.
     @return: List of dicts containing information about this symbol.
@@ -1545,7 +1585,7 @@ def process_expansion_symbol_info(symbol: Union[str, list], rarity: str) -> Opti
                 ref = sym['char']
     else:
         # Unsupported data type, return default symbol
-        return process_expansion_symbol_info(con.set_symbols['MTG'], rarity)
+        return process_expansion_symbol_info(symbol_table['MTG'], rarity)
     return ref or symbols[0]['char'], symbols
 
 
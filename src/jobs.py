@@ -0,0 +1,159 @@
+"""
+RESUMABLE RENDER JOBS
+"""
+import os
+import json
+import threading
+from os import path as osp
+from pathlib import Path
+from typing import Optional, TextIO, Union
+
+from src.cards import CardRecord
+from src.constants import con
+from src.core import CardDetails, TemplateDetails
+
+
+class JobSnapshot:
+    """
+    Append-only JSON Lines snapshot of a batch render. Each line records either the card details, card data
+    and template resolved for an art file, or the output saved for a finished render, so a batch which
+    stopped early can be resumed without looking anything up again, skipping cards already rendered.
+    The first line holds the settings the batch was started with, a snapshot made with other settings is discarded.
+    @param path: Path to the snapshot file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.cards: dict[str, dict] = {}
+        self.done: dict[str, str] = {}
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def open(self, settings: dict) -> bool:
+        """
+        Resume the snapshot if it was made with the same settings, otherwise start a new one.
+        @param settings: Settings the layouts and templates depend on.
+        @return: True if the snapshot was resumed, even if it holds no cards yet.
+        """
+        self.close()
+        self.cards, self.done = {}, {}
+        valid = self.load(settings)
+        Path(osp.dirname(self.path)).mkdir(mode=511, parents=True, exist_ok=True)
+        self._file = open(self.path, 'r+' if valid else 'w', encoding='utf-8')
+        if valid:
+            # Drop anything after the last complete line, ex: a write interrupted by a crash
+            self._file.seek(valid)
+            self._file.truncate()
+        else:
+            self.append({'type': 'job', 'settings': settings})
+        return bool(valid)
+
+    def load(self, settings: dict) -> int:
+        """
+        Read the cards and finished renders recorded in the snapshot.
+        @param settings: Settings the snapshot must have been made with.
+        @return: Offset of the end of the last complete line, 0 if the snapshot can't be resumed.
+        """
+        if not osp.exists(self.path):
+            return 0
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for i, line in enumerate(f):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("Incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if i == 0 and (entry.get('type') != 'job' or entry.get('settings') != settings):
+                    return 0
+                if entry['type'] == 'card':
+                    self.cards[entry['file']] = entry
+                elif entry['type'] == 'done':
+                    self.done[entry['file']] = entry['output']
+                offset += len(line)
+        return offset
+
+    def append(self, entry: dict) -> None:
+        """
+        Write an entry to the end of the snapshot.
+        @param entry: JSON serializable dict.
+        """
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file:
+                self._file.write(f"{line}\n")
+                self._file.flush()
+
+    def add_card(self, card: CardDetails, scryfall: CardRecord, template: TemplateDetails) -> None:
+        """
+        Record the card details, card data and template resolved for an art file.
+        @param card: Card details parsed from the art file.
+        @param scryfall: Card record the layout was built from.
+        @param template: Template chosen for the card.
+        """
+        file = str(card['filename'])
+        if not self.active or file in self.cards:
+            return
+        entry = {
+            'type': 'card',
+            'file': file,
+            'details': {**card, 'filename': file},
+            'card': scryfall.to_dict(),
+            'template': {k: v for k, v in template.items() if k != 'loaded_class'}
+        }
+        self.cards[file] = entry
+        self.append(entry)
+
+    def add_done(self, file: Union[str, Path], output: str) -> None:
+        """
+        Record the output saved for an art file.
+        @param file: Art file path.
+        @param output: Path of the saved render.
+        """
+        if not self.active:
+            return
+        self.done[str(file)] = output
+        self.append({'type': 'done', 'file': str(file), 'output': output})
+
+    def get_card(self, file: Union[str, Path]) -> Optional[tuple[CardDetails, CardRecord]]:
+        """
+        Get the card details and card data recorded for an art file.
+        @param file: Art file path.
+        @return: Tuple of card details and card record, None if the file isn't recorded.
+        """
+        if entry := self.cards.get(str(file)):
+            return entry['details'], CardRecord.from_scryfall(entry['card'])
+        return
+
+    def is_done(self, file: Union[str, Path]) -> bool:
+        """
+        Check if an art file was already rendered and its output still exists.
+        @param file: Art file path.
+        @return: True if the render can be skipped.
+        """
+        return str(file) in self.done and osp.exists(self.done[str(file)])
+
+    def close(self) -> None:
+        """
+        Stop writing to the snapshot, keeping it to resume from.
+        """
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def finish(self) -> None:
+        """
+        Close and remove the snapshot once the batch is complete.
+        """
+        self.close()
+        if osp.exists(self.path):
+            os.remove(self.path)
+
+
+# Global snapshot of the current batch
+job = JobSnapshot(con.path_job)
@@ -8,7 +8,9 @@ from typing import Optional, Match, Union, Type
 from src.constants import con
 from src.settings import cfg
 from src import scryfall as scry
+from src.cards import CardRecord, get_record
 from src.frame_logic import select_frame_layers, FrameDetails
+from src.symbols import symbol_table
 from src.utils.strings import normalize_str
 
 # Regex
@@ -21,21 +23,16 @@ class_regex = re.compile(r"(.+?): Level (\d)\n(.+)")
 class NormalLayout:
     """
     Defines unified properties for all cards.
+    Properties are computed on first use, set data is only looked up once collector info is needed.
     """
-    def __init__(self, scryfall: dict, file: dict):
+    def __init__(self, scryfall: Union[CardRecord, dict], file: dict):
 
         # settable properties
         self.file = file
-        self.scryfall = scryfall
+        self.scryfall = get_record(scryfall)
         self.filename = self.file['filename']
         self._template_path = ''
 
-        # Cache mtgset early
-        if self.mtgset:
-            print(f"{self.name}: Valid set data has been generated.")
-        else:
-            print(f"{self.name}: No set data was available.")
-
     def __str__(self):
         return "{} [{}]".format(self.name, self.set)
 
@@ -64,7 +61,7 @@ class NormalLayout:
     """
 
     @cached_property
-    def card(self) -> dict:
+    def card(self) -> CardRecord:
         # Double faced card?
         if 'card_faces' in self.scryfall:
             # First card face is the front side
@@ -246,19 +243,9 @@ class NormalLayout:
     @cached_property
     def symbol(self) -> str:
         # Automatic set symbol enabled?
-        if not cfg.symbol_force_default and self.set in con.set_symbols:
-            sym = con.set_symbols[self.set]
-            # Check if this is a reference to another symbol
-            if isinstance(sym, str) and len(sym) > 1 and sym in con.set_symbols:
-                return con.set_symbols[sym]
-            return sym
-        elif not cfg.symbol_force_default and self.set[1:] in con.set_symbols:
-            sym = con.set_symbols[self.set[1:]]
-            # Check if this is a reference to another symbol
-            if isinstance(sym, str) and len(sym) > 1 and sym in con.set_symbols:
-                return con.set_symbols[sym]
+        if not cfg.symbol_force_default and (sym := symbol_table.get(self.set)):
             return sym
-        return con.set_symbols.get(cfg.symbol_default, con.set_symbols['MTG'])
+        return symbol_table.symbols.get(cfg.symbol_default, symbol_table['MTG'])
 
     @cached_property
     def watermark(self) -> str:
@@ -325,7 +312,7 @@ class NormalLayout:
     """
 
     @cached_property
-    def other_face(self) -> dict:
+    def other_face(self) -> Union[CardRecord, dict]:
         if 'card_faces' in self.scryfall:
             if self.scryfall['card_faces'][0]['name'] == self.name_raw:
                 return self.scryfall['card_faces'][1]
@@ -500,7 +487,7 @@ class MeldLayout (NormalLayout):
     """
 
     @cached_property
-    def card(self) -> dict:
+    def card(self) -> CardRecord:
         for face in self.scryfall['faces']:
             if normalize_str(face['name']) == normalize_str(self.scryfall['name']):
                 if face['component'] == 'meld_result':
@@ -510,7 +497,7 @@ class MeldLayout (NormalLayout):
                 return face
 
     @cached_property
-    def other_face(self) -> Optional[dict]:
+    def other_face(self) -> Union[CardRecord, dict]:
         if self.card['front']:
             for face in self.scryfall['faces']:
                 if face['component'] == 'meld_result':
@@ -724,7 +711,7 @@ class BasicLandLayout (NormalLayout):
     """
     No special data entry, just a basic land
     """
-    def __init__(self, scryfall: dict,  file: dict):
+    def __init__(self, scryfall: Union[CardRecord, dict],  file: dict):
         # Add artist to Scryfall data
         scryfall['artist'] = file['artist'] or 'Unknown'
         scryfall['creator'] = file['creator'] or None
@@ -0,0 +1,137 @@
+"""
+MANA SYMBOL TOKENIZER
+"""
+import re
+from typing import Optional
+
+from src.constants import con
+
+# Precompiled regex
+reg_symbol = re.compile(r"(\{.*?})")
+reg_mana_normal = re.compile(r"{([WUBRG])}")
+reg_mana_hybrid = re.compile(r"{([2WUBRG])/([WUBRG])}")
+reg_mana_phyrexian = re.compile(r"{([WUBRG])/P}")
+reg_mana_phyrexian_hybrid = re.compile(r"{([WUBRG])/([WUBRG])/P}")
+
+# Color slot: name of a symbol color, and the key to look up if it names a color map
+ColorSlot = tuple[str, Optional[str]]
+
+# Symbol span: start and end index in the translated string, symbol, color slots
+SymbolSpan = tuple[int, int, str, Optional[tuple[ColorSlot, ...]]]
+
+
+class SymbolTokenizer:
+    """
+    Translates every symbol in a string to the NDPMTG characters representing it in a single scan.
+    Each symbol in con.symbols is mapped once to its characters and the color slots of those characters,
+    entries are checked against con.symbols when used so templates can still change the characters.
+    """
+    def __init__(self):
+        self.table: dict[str, tuple[str, Optional[tuple[ColorSlot, ...]]]] = {}
+        for symbol in con.symbols:
+            self.get(symbol)
+
+    def get(self, symbol: str) -> Optional[tuple[str, Optional[tuple[ColorSlot, ...]]]]:
+        """
+        Get the characters and color slots of a symbol.
+        @param symbol: Scryfall symbol, ex: {W/U}
+        @return: Tuple of NDPMTG characters and color slots, None if the symbol isn't supported.
+        """
+        chars = con.symbols.get(symbol)
+        if chars is None:
+            return
+        entry = self.table.get(symbol)
+        if not entry or entry[0] != chars:
+            entry = self.table[symbol] = (chars, get_symbol_color_slots(symbol, len(chars)))
+        return entry
+
+    def tokenize(self, text: str) -> tuple[str, list[SymbolSpan], Optional[str]]:
+        """
+        Replace the symbols in a string with their NDPMTG characters and record where each one landed.
+        Scanning stops at the first symbol which isn't supported, leaving the rest of the string as is.
+        @param text: String containing Scryfall symbols, ex: {T}: Add {G}.
+        @return: Translated string, list of symbol spans, and the unsupported symbol if one was found.
+        """
+        parts, spans, last, shift = [], [], 0, 0
+        for match in reg_symbol.finditer(text):
+            symbol = match[1]
+            if not (entry := self.get(symbol)):
+                parts.append(text[last:])
+                return ''.join(parts), spans, symbol
+            chars, slots = entry
+            start = match.start() + shift
+            parts.append(text[last:match.start()])
+            parts.append(chars)
+            spans.append((start, start + len(chars), symbol, slots))
+            shift += len(chars) - len(symbol)
+            last = match.end()
+        parts.append(text[last:])
+        return ''.join(parts), spans, None
+
+    def translate(self, text: str) -> str:
+        """
+        Replace every supported symbol in a string with its NDPMTG characters.
+        @param text: String containing Scryfall symbols.
+        @return: Translated string, unsupported symbols are left as is.
+        """
+        if '{' not in text:
+            return text
+        return reg_symbol.sub(lambda m: entry[0] if (entry := self.get(m[1])) else m[1], text)
+
+
+"""
+UTILITIES
+"""
+
+
+def get_symbol_color_slots(symbol: str, symbol_length: int) -> Optional[tuple[ColorSlot, ...]]:
+    """
+    Determine which symbol colors fill each character of a symbol.
+    @param symbol: Scryfall symbol, ex: {2/B}
+    @param symbol_length: Number of NDPMTG characters representing the symbol.
+    @return: Color slot of each character, None if the symbol's colors are unknown.
+    """
+    # Special Symbols
+    if symbol in ("{E}", "{CHAOS}"):
+        # Energy or chaos symbols
+        return ('clr_primary', None),
+    elif symbol == "{S}":
+        # Snow symbol
+        return ('clr_c', None), ('clr_primary', None), ('clr_secondary', None)
+    elif symbol == "{Q}":
+        # Untap symbol
+        return ('clr_primary', None), ('clr_secondary', None)
+
+    # Normal mana symbol
+    if match := reg_mana_normal.match(symbol):
+        return ('color_map', match[1]), ('color_map_inner', match[1])
+
+    # Hybrid, use the darker color for black's symbols for 2/B hybrid symbols
+    if match := reg_mana_hybrid.match(symbol):
+        color_map = 'hybrid_color_map' if match[1] == "2" else 'color_map'
+        return (
+            (color_map, match[2]), (color_map, match[1]),
+            ('color_map_inner', match[1]), ('color_map_inner', match[2])
+        )
+
+    # Phyrexian
+    if match := reg_mana_phyrexian.match(symbol):
+        return ('hybrid_color_map', match[1]), ('hybrid_color_map_inner', match[1])
+
+    # Phyrexian hybrid
+    if match := reg_mana_phyrexian_hybrid.match(symbol):
+        return (
+            ('color_map', match[2]), ('color_map', match[1]),
+            ('color_map_inner', match[1]), ('color_map_inner', match[2])
+        )
+
+    # Weird situation?
+    if symbol_length == 2:
+        return ('clr_c', None), ('clr_primary', None)
+
+    # Nothing matching found!
+    return
+
+
+# Global tokenizer
+tokenizer = SymbolTokenizer()
@@ -0,0 +1,132 @@
+"""
+CARD NAME RESOLVER
+"""
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Optional, Iterable
+
+from src.constants import con
+from src.utils.cache import cache
+from src.utils.strings import normalize_str
+
+# Minimum similarity for a name to be corrected
+MATCH_THRESHOLD = 0.85
+
+# Matches closer than this to the best match make it ambiguous
+AMBIGUOUS_MARGIN = 0.03
+
+# Candidates compared in full after the trigram pass
+CANDIDATES = 10
+
+
+class NameResolver:
+    """
+    Corrects card names taken from art filenames to their canonical Scryfall names,
+    using normalized keys for exact matches and a trigram index for close matches.
+    @param names: Canonical card names, loaded from the Scryfall card names catalog if not provided.
+    """
+    def __init__(self, names: Optional[Iterable[str]] = None):
+        self.names: list[str] = []
+        self.keys: list[str] = []
+        self.sizes: list[int] = []
+        self.exact: dict[str, list[int]] = {}
+        self.trigrams: dict[str, list[int]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        if names is not None:
+            self.load(names)
+
+    def load(self, names: Iterable[str]) -> None:
+        """
+        Build the index from a list of names. Double faced names are also indexed by each face.
+        @param names: Canonical card names.
+        """
+        self.names, self.keys, self.sizes, self.exact, self.trigrams = [], [], [], {}, {}
+        seen = set()
+        for name in names:
+            for n in [name, *name.split(' // ')] if ' // ' in name else [name]:
+                if n in seen:
+                    continue
+                seen.add(n)
+                key = normalize_str(n, True)
+                grams = get_trigrams(key)
+                self.names.append(n)
+                self.keys.append(key)
+                self.sizes.append(len(grams))
+                self.exact.setdefault(key, []).append(len(self.names) - 1)
+                for gram in grams:
+                    self.trigrams.setdefault(gram, []).append(len(self.names) - 1)
+        self._loaded = True
+
+    def ensure_loaded(self) -> bool:
+        """
+        Load the card names catalog on first use.
+        @return: True if names are available, otherwise False.
+        """
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self.load(cache.request_json(
+                        f"{con.scryfall_api}/catalog/card-names",
+                        headers=con.http_header
+                    )['data'])
+                except Exception as e:
+                    # Catalog unavailable, names will be searched as given
+                    print(e, "\nCouldn't load the card names catalog!")
+                    self._loaded = True
+        return bool(self.names)
+
+    def resolve(self, name: str) -> tuple[Optional[str], list[str]]:
+        """
+        Find the canonical card name closest to a given name.
+        @param name: Card name, ex: Jace the Mindsculptor
+        @return: Canonical name and an empty list, or None and every close candidate if the match is ambiguous.
+            Returns None and an empty list if nothing is close enough.
+        """
+        if not self.ensure_loaded():
+            return None, []
+        key = normalize_str(name, True)
+
+        # Exact match after normalizing
+        if key in self.exact:
+            matches = sorted({self.names[i] for i in self.exact[key]})
+            return (matches[0], []) if len(matches) == 1 else (None, matches)
+
+        # Shortlist names sharing the most trigrams
+        grams = get_trigrams(key)
+        counts = Counter(i for g in grams for i in self.trigrams.get(g, []))
+        shortlist = sorted(
+            counts.items(),
+            key=lambda c: 2 * c[1] / (len(grams) + self.sizes[c[0]]),
+            reverse=True
+        )[:CANDIDATES]
+
+        # Compare the shortlist in full
+        scores = sorted(
+            [(SequenceMatcher(None, key, self.keys[i]).ratio(), self.names[i]) for i, _ in shortlist],
+            reverse=True
+        )
+        if not scores or scores[0][0] < MATCH_THRESHOLD:
+            return None, []
+        close = [n for s, n in scores if s >= MATCH_THRESHOLD and scores[0][0] - s < AMBIGUOUS_MARGIN]
+        return (scores[0][1], []) if len(close) == 1 else (None, close)
+
+
+"""
+UTILITIES
+"""
+
+
+def get_trigrams(key: str) -> set[str]:
+    """
+    Get the set of three character sequences in a normalized name, padded so short names still have some.
+    @param key: Normalized name.
+    @return: Set of trigrams.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Global resolver
+resolver = NameResolver()
@@ -1,44 +1,80 @@
 """
 FUNCTIONS THAT INTERACT WITH SCRYFALL
 """
-import os
-import time
 import json
-from shutil import copyfileobj
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from typing import Optional, Union
+from typing import Optional, Union, Iterable
 from urllib import parse
 
 from src.settings import cfg
+from src.client import client
 from src.constants import con
+from src import bulk, sets, names
+from src.core import CardDetails
+from src.cards import CardRecord
 from src.__console__ import console
+from src.utils.cache import cache, images
+from src.utils.concurrency import SingleFlight
+from src.utils.json_stream import extract_fields
 from src.utils.strings import msg_warn, normalize_str
 
+# Bytes read from a streamed response at a time
+CHUNK_SIZE = 256 * 1024  # 256 KB
+
+# Set and card lookups in flight
+set_lookups = SingleFlight()
+card_lookups = SingleFlight()
+
+# Background set lookups
+set_prefetch = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sets")
+
+
+class LookupFailure(str, Enum):
+    """
+    Reasons a card lookup can fail.
+    """
+    NotFound = "not found"
+    Network = "network error"
+    RateLimited = "rate limited"
+    Parse = "invalid response"
+
+
+class CardLookupError(Exception):
+    """
+    Card lookup failed, kind describes why.
+    """
+    def __init__(self, message: str, kind: LookupFailure):
+        super().__init__(message)
+        self.kind = kind
+
 
 def card_info(
     card_name: str,
     card_set: Optional[str] = None
-) -> Union[dict, Exception, None]:
+) -> Union[CardRecord, Exception, None]:
     """
     Fetch card data from Scryfall API.
     @param card_name: Name of the card.
     @param card_set: Set code of the card.
-    @return: Scryfall dict or Exception.
+    @return: Card record or Exception.
     """
     # Enforce Basic Land template?
     if normalize_str(card_name, True) in con.basic_land_names and cfg.render_basic:
         return basic_land_info(card_name, card_set)
 
-    # Alternate language
+    # Alternate language, search every language at once and prefer the chosen one
     if cfg.lang != "en":
-        card = get_card_search(card_name, set_code=card_set, language=cfg.lang)
-        if isinstance(card, dict):
-            # Process card data
-            return process_scryfall_data(card)
-        elif not cfg.dev_mode:
+        prints = get_card_prints(card_name, set_code=card_set, language='any', prefer=cfg.lang)
+        if isinstance(prints, Exception):
+            return prints
+        card = select_language(prints, cfg.lang)
+        if card.get('lang', 'en') != bulk.lang_codes.get(cfg.lang, cfg.lang) and not cfg.dev_mode:
             # Language couldn't be found
             console.update(msg_warn(f"Reverting to English: [b]{card_name}[/b]"))
+        return process_scryfall_data(card)
 
     # Query the card in English
     card = get_card_search(card_name, set_code=card_set)
@@ -48,6 +84,25 @@ def card_info(
     return card
 
 
+def resolve_card_name(card: CardDetails) -> CardDetails:
+    """
+    Correct the name of a card parsed from an art filename to its canonical name before searching for it.
+    @param card: Card details parsed from the art filename.
+    @return: Card details with the corrected name.
+    """
+    if not cfg.fix_names:
+        return card
+    name, candidates = names.resolver.resolve(card['name'])
+    if candidates:
+        # Don't guess between similar names
+        console.update(msg_warn(f"Ambiguous card name: [b]{card['name']}[/b], could be: {', '.join(candidates)}"))
+    elif name and name != card['name']:
+        if normalize_str(name, True) != normalize_str(card['name'], True):
+            console.update(msg_warn(f"Corrected card name: [b]{card['name']}[/b] to [b]{name}[/b]"))
+        card['name'] = name
+    return card
+
+
 def get_card_search(
     name: str,
     set_code: Optional[str] = None,
@@ -60,30 +115,203 @@ def get_card_search(
     @param language: Lang code to look for, ex: en
     @return: Card dict or exception
     """
+    prints = get_card_prints(name, set_code, language)
+    return prints[0] if isinstance(prints, list) else prints
+
+
+def get_card_prints(
+    name: str,
+    set_code: Optional[str] = None,
+    language: Optional[str] = None,
+    prefer: Optional[str] = None
+) -> Union[list[dict], Exception]:
+    """
+    Get every playable printing of a card using cards/search scryfall API.
+    @param name: Name of the card, ex: Damnation
+    @param set_code: Set code to look for, ex: MH2
+    @param language: Lang code to look for, ex: en, or any for every language
+    @param prefer: Lang code which should be among the printings, further pages and the
+        Scryfall API are searched until a printing in this language is found.
+    @return: List of card dicts or exception
+    """
+    # Check the offline index first, which may only hold English printings
+    prints = [c for c in get_cards_local(name, set_code, language) if check_playable_card(c)]
+    if prints and (not prefer or has_language(prints, prefer)):
+        return prints
+
     # Order, language, set code
     order = "&order=released&dir=asc" if cfg.scry_ascending else ""
     lang = f" lang:{language}" if language else ""
     code = f"+set%3A{set_code}" if set_code else ""
 
-    # Query Scryfall, 3 retries
-    url = f'https://api.scryfall.com/cards/search?unique=prints' \
+    # Query Scryfall
+    url = f'{con.scryfall_api}/cards/search?unique=prints' \
           f'{order}&q=!"{parse.quote(name)}"{code} include:extras{lang}'
-    err = None
-    for i in range(3):
-        try:
-            card = requests.get(url, headers=con.http_header).json()
-            # Find the first playable result
-            for c in card['data']:
-                if check_playable_card(c):
-                    return c
-            # No playable results
-            raise Exception("Could not find a playable card with this name!")
-        except Exception as e:
-            err = e
-        # Scryfall rate limit, 3 Retries
-        # https://scryfall.com/docs/api
-        time.sleep(0.5)
-    return err
+    prints = []
+    for page in range(con.scryfall_max_pages):
+        res = get_scryfall_json(url)
+        if isinstance(res, Exception):
+            return res
+        if not isinstance(res.get('data'), list):
+            return CardLookupError("Scryfall returned invalid data!", LookupFailure.Parse)
+
+        # Keep the playable results
+        prints.extend([c for c in res['data'] if check_playable_card(c)])
+        if not prefer or has_language(prints, prefer) or not res.get('has_more'):
+            break
+        url = res['next_page']
+
+    # No playable results
+    if not prints:
+        return CardLookupError("Could not find a playable card with this name!", LookupFailure.NotFound)
+    return prints
+
+
+def get_card_by_id(card_id: str) -> Union[dict, Exception]:
+    """
+    Get card by its Scryfall id, from the offline index if possible, otherwise using cards/:id scryfall API.
+    Concurrent lookups of the same card share one request.
+    @param card_id: Scryfall id of the card.
+    @return: Card dict or exception
+    """
+    if cfg.offline_index and (card := bulk.index.get(card_id)):
+        return card
+    return card_lookups.do(card_id, get_scryfall_json, f"{con.scryfall_api}/cards/{card_id}")
+
+
+def get_scryfall_json(url: str) -> Union[dict, Exception]:
+    """
+    Make a cached request to the scryfall API, the client handles rate limits and retries transient errors.
+    @param url: Scryfall API url.
+    @return: Decoded JSON object or a classified exception.
+    """
+    try:
+        res = cache.request_json(url, headers=con.http_header)
+    except (json.JSONDecodeError, requests.exceptions.JSONDecodeError) as e:
+        return CardLookupError(f"Scryfall returned invalid data: {e}", LookupFailure.Parse)
+    except requests.HTTPError as e:
+        # Error response without an error object
+        if e.response is not None and e.response.status_code == 429:
+            return CardLookupError(str(e), LookupFailure.RateLimited)
+        return CardLookupError(str(e), LookupFailure.Network)
+    except requests.RequestException as e:
+        return CardLookupError(str(e), LookupFailure.Network)
+
+    # Scryfall error object
+    if not isinstance(res, dict):
+        return CardLookupError("Scryfall returned invalid data!", LookupFailure.Parse)
+    if res.get('object') == 'error':
+        return get_lookup_error(res)
+    return res
+
+
+def get_card_local(
+    name: str,
+    set_code: Optional[str] = None,
+    language: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Get card from the offline bulk data index, if enabled.
+    @param name: Name of the card, ex: Damnation
+    @param set_code: Set code to look for, ex: MH2
+    @param language: Lang code to look for, ex: en
+    @return: Card dict or None
+    """
+    for c in get_cards_local(name, set_code, language):
+        if check_playable_card(c):
+            return c
+    return
+
+
+def get_cards_local(
+    name: str,
+    set_code: Optional[str] = None,
+    language: Optional[str] = None
+) -> list[dict]:
+    """
+    Get every printing of a card from the offline bulk data index, if enabled.
+    @param name: Name of the card, ex: Damnation
+    @param set_code: Set code to look for, ex: MH2
+    @param language: Lang code to look for, ex: en, or any for every language
+    @return: List of card dicts
+    """
+    if cfg.offline_index:
+        return bulk.index.search(name, set_code, language, cfg.scry_ascending)
+    return []
+
+
+def card_info_batch(cards: list[CardDetails]) -> dict[int, CardRecord]:
+    """
+    Fetch card data for a list of cards using as few Scryfall requests as possible.
+    Cards which couldn't be resolved here should be looked up individually using card_info.
+    @param cards: List of card details parsed from art filenames.
+    @return: Dict mapping the position of each resolved card to its card record.
+    """
+    resolved: dict[int, CardRecord] = {}
+    pending: dict[tuple[str, str], list[int]] = {}
+    for i, card in enumerate(cards):
+        # Enforce Basic Land template?
+        if normalize_str(card['name'], True) in con.basic_land_names and cfg.render_basic:
+            resolved[i] = basic_land_info(card['name'], card['set'])
+            continue
+
+        # Collection lookups only return the default English printing
+        if cfg.lang != "en" or (cfg.scry_ascending and not card['set']):
+            continue
+
+        # Check the offline index
+        if local := get_card_local(card['name'], card['set']):
+            if isinstance(data := process_scryfall_data(local), CardRecord):
+                resolved[i] = data
+                continue
+
+        # Group duplicate cards under one identifier
+        pending.setdefault((normalize_str(card['name'], True), card['set'].lower()), []).append(i)
+
+    # Request each chunk of identifiers
+    keys = list(pending.keys())
+    for n in range(0, len(keys), 75):
+        chunk = keys[n:n + 75]
+        identifiers = []
+        for key in chunk:
+            card = cards[pending[key][0]]
+            identifiers.append({'name': card['name'], 'set': card['set']} if card['set'] else {'name': card['name']})
+
+        # Map each playable result back to the identifiers it matches
+        matches: dict[tuple[str, str], dict] = {}
+        for c in get_card_collection(identifiers):
+            if not check_playable_card(c):
+                continue
+            for name in bulk.get_name_keys(c):
+                matches.setdefault((name, c['set'].lower()), c)
+                matches.setdefault((name, ''), c)
+        for key in chunk:
+            if key in matches:
+                data = process_scryfall_data(matches[key])
+                if not isinstance(data, CardRecord):
+                    # Leave failed meld parts to the individual search
+                    continue
+                for i in pending[key]:
+                    resolved[i] = data
+    return resolved
+
+
+def get_card_collection(identifiers: list[dict]) -> list[dict]:
+    """
+    Get cards using cards/collection scryfall API.
+    @param identifiers: Up to 75 card identifiers, ex: {'name': 'Damnation', 'set': 'MH2'}
+    @return: List of card dicts found.
+    """
+    try:
+        res = cache.request_json(
+            f"{con.scryfall_api}/cards/collection",
+            payload={'identifiers': identifiers},
+            headers=con.http_header
+        )
+        return res['data']
+    except Exception as e:
+        console.log_exception(e)
+    return []
 
 
 def get_mtg_set_mtgjson(set_code: str) -> dict:
@@ -92,32 +320,20 @@ def get_mtg_set_mtgjson(set_code: str) -> dict:
     @param set_code: The set to look for, ex: MH2
     @return: MTGJson set dict or empty dict.
     """
-    err = None
-    for i in range(3):
-        try:
-            # Grab from MTG JSON
-            source = requests.get(
-                f"https://mtgjson.com/api/v5/{set_code.upper()}.json",
-                headers=con.http_header
-            ).text
-            j = json.loads(source)['data']
-
-            # Minimize data stored
-            j.pop('cards', None)
-            j.pop('tokens', None)
-            j.pop('booster', None)
-            j.pop('sealedProduct', None)
-
-            # Return data if valid
-            return j if j.get('name') else {}
-        except Exception as e:
-            # Remote disconnected / invalid data
-            err = e
-        # Scryfall rate limit, 3 Retries
-        # https://scryfall.com/docs/api
-        time.sleep(0.05)
-    # Remote disconnected
-    console.log_exception(err)
+    try:
+        # Stream the set header from MTG JSON, skipping the card arrays
+        with client.get(
+            f"{con.mtgjson_api}/{set_code.upper()}.json",
+            headers=con.http_header, stream=True
+        ) as res:
+            res.raise_for_status()
+            j = extract_fields(res.iter_content(chunk_size=CHUNK_SIZE), con.mtgjson_set_fields, ['data']) or {}
+
+        # Return data if valid
+        return j if j.get('name') else {}
+    except Exception as e:
+        # Remote disconnected / invalid data
+        console.log_exception(e)
     return {}
 
 
@@ -127,27 +343,19 @@ def get_mtg_set_scryfall(set_code: str) -> dict:
     @param set_code: The set to look for, ex: MH2
     @return: Scryfall set dict or empty dict.
     """
-    err = None
-    for i in range(3):
-        try:
-            # Grab from MTG JSON
-            source = requests.get(
-                f"https://api.scryfall.com/sets/{set_code.upper()}",
-                headers=con.http_header
-            ).text
-            j = json.loads(source)
-
-            # Return data if valid
-            j['scryfall'] = True
-            return j if j.get('name') else {}
-        except Exception as e:
-            # Remote disconnected / invalid data
-            err = e
-        # Scryfall rate limit, 3 Retries
-        # https://scryfall.com/docs/api
-        time.sleep(0.05)
-    # Remote disconnected
-    console.log_exception(err)
+    try:
+        # Grab from Scryfall
+        j = cache.request_json(
+            f"{con.scryfall_api}/sets/{set_code.upper()}",
+            headers=con.http_header
+        )
+
+        # Return data if valid
+        j['scryfall'] = True
+        return j if j.get('name') else {}
+    except Exception as e:
+        # Remote disconnected / invalid data
+        console.log_exception(e)
     return {}
 
 
@@ -158,27 +366,35 @@ def get_mtg_set(set_code: str) -> Optional[dict]:
     @return: MTG set dict or empty dict.
     """
     # Has this set been logged?
-    filepath = os.path.join(con.path_data_sets, f"SET-{set_code.upper()}.json")
-    try:
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                loaded = json.load(f)
-                # Load if it has Scryfall data
-                if loaded.get('scryfall'):
-                    return loaded
-    except Exception as e:
-        # Object couldn't be loaded
-        console.log_exception(e)
+    stored = sets.store.get(set_code)
+    if stored and sets.is_complete(stored):
+        return stored
+
+    # Share one lookup between every card waiting on this set
+    return set_lookups.do(set_code.upper(), fetch_mtg_set, set_code)
+
+
+def fetch_mtg_set(set_code: str) -> dict:
+    """
+    Fetch set data from Scryfall and MTG Json at the same time and store the merged result.
+    @param set_code: The set to look for, ex: MH2
+    @return: MTG set dict or empty dict.
+    """
+    # Another lookup may have finished while we waited
+    stored = sets.store.get(set_code)
+    if stored and sets.is_complete(stored):
+        return stored
 
-    # Get set data
-    data_scry = get_mtg_set_scryfall(set_code)
-    data_mtg = get_mtg_set_mtgjson(set_code)
+    # Get set data, Scryfall data may already be stored by warm_mtg_sets
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        mtgjson = pool.submit(get_mtg_set_mtgjson, set_code)
+        data_scry = dict(stored) if stored and stored.get('scryfall') else get_mtg_set_scryfall(set_code)
+        data_mtg = mtgjson.result()
     try:
         # Save the data if both lookups were valid, or 'printed_size' is present
         data_scry.update(data_mtg)
         if (data_mtg and data_scry) or 'printed_size' in data_scry:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data_scry, f, sort_keys=True, ensure_ascii=False)
+            sets.store.put(set_code, data_scry)
         return data_scry
     except Exception as e:
         # Invalid data
@@ -186,38 +402,64 @@ def get_mtg_set(set_code: str) -> Optional[dict]:
     return {}
 
 
+def prefetch_mtg_sets(set_codes: Iterable[str]) -> None:
+    """
+    Look up set data in the background so it's ready when collector info is needed.
+    @param set_codes: Set codes used by the queued cards.
+    """
+    for code in {c.upper() for c in set_codes if c}:
+        stored = sets.store.get(code)
+        if not (stored and sets.is_complete(stored)):
+            set_prefetch.submit(get_mtg_set, code)
+
+
+def warm_mtg_sets() -> int:
+    """
+    Store Scryfall data for every set using a single request to the Scryfall sets list.
+    Sets without a printed size are completed with MTGJSON data the first time they're used.
+    @return: Number of sets stored.
+    """
+    try:
+        res = client.get(f"{con.scryfall_api}/sets", headers=con.http_header).json()
+        data = {}
+        for s in res['data']:
+            # Keep MTGJSON data already stored for this set
+            s['scryfall'] = True
+            data[s['code'].upper()] = {**(sets.store.get(s['code']) or {}), **s}
+        sets.store.put_many(data)
+        return len(data)
+    except Exception as e:
+        # Remote disconnected / invalid data
+        console.log_exception(e)
+    return 0
+
+
 def card_scan(img_url: str) -> Optional[str]:
     """
-    Downloads scryfall art from URL
+    Downloads scryfall art from URL, or reuses the copy saved last time it was needed.
     @param img_url: Scryfall URI for image.
     @return: Filename of the saved image, None if unsuccessful.
     """
-    try:
-        r = requests.get(img_url, stream=True)
-        with open(con.scryfall_scan_path, 'wb') as f:
-            copyfileobj(r.raw, f)
-            return f.name
-    except Exception as e:
-        # HTTP request failed
-        print(e, "\nCouldn't retrieve scryfall image scan! Continuing without it.")
-        return
+    scan = images.get(img_url)
+    if not scan:
+        print("Couldn't retrieve scryfall image scan! Continuing without it.")
+    return scan
 
 
-def basic_land_info(card_name: str, set_code: Optional[str]) -> dict:
+def basic_land_info(card_name: str, set_code: Optional[str]) -> CardRecord:
     """
     Generate fake Scryfall data from basic land.
     @param card_name: Name of the basic land card.
     @param set_code: Desired set code for the basic land.
-    @return: Fake scryfall data.
+    @return: Fake card record.
     """
-    return {
-        'name': card_name,
-        'set': (set_code or 'MTG').upper(),
-        'layout': 'basic',
-        'rarity': 'common',
-        'collector_number': None,
-        'printed_count': None
-    }
+    return CardRecord(
+        name=card_name,
+        set=(set_code or 'MTG').upper(),
+        layout='basic',
+        rarity='common',
+        collector_number=None
+    )
 
 
 """
@@ -225,6 +467,46 @@ UTILITIES
 """
 
 
+def has_language(prints: list[dict], language: str) -> bool:
+    """
+    Check if a list of printings includes one in a given language.
+    @param prints: List of card dicts.
+    @param language: Lang code, ex: jp
+    @return: True if a printing in this language is present.
+    """
+    code = bulk.lang_codes.get(language, language)
+    return any(c.get('lang', 'en') == code for c in prints)
+
+
+def select_language(prints: list[dict], language: str) -> dict:
+    """
+    Pick the first printing in a given language, falling back to English, then to any printing.
+    @param prints: List of card dicts, in order of preference.
+    @param language: Lang code, ex: jp
+    @return: Chosen card dict.
+    """
+    for code in [bulk.lang_codes.get(language, language), 'en']:
+        for c in prints:
+            if c.get('lang', 'en') == code:
+                return c
+    return prints[0]
+
+
+def get_lookup_error(error: dict) -> CardLookupError:
+    """
+    Classify a Scryfall error object.
+    @param error: Scryfall error object.
+    @return: Lookup error describing the failure.
+    """
+    status = error.get('status', 0)
+    message = error.get('details', "Scryfall returned an error!")
+    if status == 429:
+        return CardLookupError(message, LookupFailure.RateLimited)
+    if status >= 500:
+        return CardLookupError(message, LookupFailure.Network)
+    return CardLookupError(message, LookupFailure.NotFound)
+
+
 def check_playable_card(card_json: dict) -> bool:
     """
     Checks if this card object is a playable game piece.
@@ -236,23 +518,27 @@ def check_playable_card(card_json: dict) -> bool:
     return False
 
 
-def process_scryfall_data(card_json: dict) -> dict:
+def process_scryfall_data(card_json: dict) -> Union[CardRecord, Exception]:
     """
     Process any additional required data before sending it to the layout object.
     @param card_json: Unprocessed scryfall data.
-    @return: Processed scryfall data.
+    @return: Compact card record, or exception if a meld part couldn't be found.
     """
     # Lookup faces for Meld card
     if card_json['layout'] == "meld":
-        # Add list of faces to the JSON data
+        # Ignore tokens and other objects
+        parts = [p for p in card_json['all_parts'] if p['component'] in ('meld_part', 'meld_result')]
+
+        # Grab the card face data for every part at once
+        with ThreadPoolExecutor(max_workers=len(parts) or 1) as pool:
+            faces = list(pool.map(get_card_by_id, [p['id'] for p in parts]))
+
+        # Add component type, add list of faces to the JSON data
         card_json['faces'] = []
-        for part in card_json['all_parts']:
-            # Ignore tokens and other objects
-            if part['component'] in ('meld_part', 'meld_result'):
-                # Grab the card face data, add component type, insert it
-                data = requests.get(part["uri"], headers=con.http_header).json()
-                data['component'] = part['component']
-                card_json["faces"].append(data)
-
-    # Return updated data
-    return card_json
+        for part, data in zip(parts, faces):
+            if isinstance(data, Exception):
+                return data
+            card_json['faces'].append({**data, 'component': part['component']})
+
+    # Keep only the fields layouts need
+    return CardRecord.from_scryfall(card_json)
@@ -0,0 +1,134 @@
+"""
+SET METADATA STORE
+"""
+import os
+import json
+import sqlite3
+import threading
+from glob import glob
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional
+
+from src.constants import con
+
+# Sets kept in memory
+LRU_SIZE = 512
+
+
+class SetStore:
+    """
+    Set metadata from Scryfall and MTGJSON kept in one SQLite table, with an in-memory LRU in front of it.
+    @param path: Path to the store database file.
+    @param capacity: Maximum sets kept in memory.
+    """
+    def __init__(self, path: str, capacity: int = LRU_SIZE):
+        self.path = path
+        self.capacity = capacity
+        self.memory: OrderedDict[str, dict] = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads
+        if not hasattr(self._local, 'connection'):
+            Path(os.path.dirname(self.path)).mkdir(mode=511, parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            with self._lock:
+                if not db.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sets'"
+                ).fetchone():
+                    db.execute("CREATE TABLE sets (code TEXT PRIMARY KEY, data TEXT)")
+                    self._migrate(db)
+                    db.commit()
+            self._local.connection = db
+        return self._local.connection
+
+    def get(self, code: str) -> Optional[dict]:
+        """
+        Get the stored data for a set.
+        @param code: Set code, ex: MH2
+        @return: Set dict, or None if not stored.
+        """
+        code = code.upper()
+        with self._lock:
+            if code in self.memory:
+                self.memory.move_to_end(code)
+                return self.memory[code]
+        try:
+            row = self.connection.execute("SELECT data FROM sets WHERE code = ?", (code,)).fetchone()
+        except sqlite3.Error as e:
+            print(e, "\nSet data couldn't be read!")
+            return
+        if not row:
+            return
+        data = json.loads(row[0])
+        self._remember(code, data)
+        return data
+
+    def put(self, code: str, data: dict) -> None:
+        """
+        Save the data for a set.
+        @param code: Set code, ex: MH2
+        @param data: Set dict.
+        """
+        self.put_many({code: data})
+
+    def put_many(self, sets: dict[str, dict]) -> None:
+        """
+        Save the data for several sets in one transaction.
+        @param sets: Dict mapping set codes to set dicts.
+        """
+        rows = [
+            (code.upper(), json.dumps(data, sort_keys=True, ensure_ascii=False))
+            for code, data in sets.items()
+        ]
+        try:
+            with self._lock:
+                self.connection.executemany("INSERT OR REPLACE INTO sets VALUES (?, ?)", rows)
+                self.connection.commit()
+        except sqlite3.Error as e:
+            print(e, "\nSet data couldn't be saved!")
+            return
+        for code, data in sets.items():
+            self._remember(code.upper(), data)
+
+    def _remember(self, code: str, data: dict) -> None:
+        with self._lock:
+            self.memory[code] = data
+            self.memory.move_to_end(code)
+            while len(self.memory) > self.capacity:
+                self.memory.popitem(last=False)
+
+    @staticmethod
+    def _migrate(db: sqlite3.Connection) -> None:
+        # Import set files saved by older versions
+        for file in glob(os.path.join(con.path_data_sets, "SET-*.json")):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                code = os.path.basename(file)[4:-5].upper()
+                db.execute("INSERT OR REPLACE INTO sets VALUES (?, ?)", (
+                    code, json.dumps(data, sort_keys=True, ensure_ascii=False)
+                ))
+            except (OSError, ValueError):
+                continue
+
+
+"""
+UTILITIES
+"""
+
+
+def is_complete(data: dict) -> bool:
+    """
+    Check whether set data has everything needed to count cards, otherwise MTGJSON should be checked for a set size.
+    @param data: Set dict.
+    @return: True if complete, otherwise False.
+    """
+    return bool(data.get('scryfall') and ('printed_size' in data or 'baseSetSize' in data))
+
+
+# Global store
+store = SetStore(con.path_sets_db)
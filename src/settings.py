@@ -60,6 +60,10 @@ class Config:
 		self.exit_early = self.file.getboolean('APP', 'Manual.Edit')
 		self.skip_failed = self.file.getboolean('APP', 'Skip.Failed')
 		self.scry_ascending = self.file.getboolean('APP', 'Scryfall.Ascending')
+		self.offline_index = self.file.getboolean('APP', 'Offline.Card.Index')
+		# Rate limit must be positive, a limit of 0 would stall every request
+		self.scry_rate_limit = max(self.file.getfloat('APP', 'Scryfall.Rate.Limit', fallback=10), 0.1)
+		self.fix_names = self.file.getboolean('APP', 'Fix.Card.Names')
 		self.targeted_replace = self.file.getboolean('APP', 'Targeted.Replace')
 		self.dev_mode = self.file.getboolean('APP', 'Dev.Mode')
 
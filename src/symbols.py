@@ -0,0 +1,121 @@
+"""
+SET SYMBOL TABLE
+"""
+import threading
+from typing import Optional, Union, Callable, Any
+
+from src.constants import con
+
+# Symbol data types
+SymbolData = Union[str, dict, list]
+
+
+class SymbolTable:
+    """
+    Set symbols from symbols.json and custom_symbols.json compiled once, with aliases fully resolved
+    and promo set codes mapped to the symbol of their parent set, so finding a symbol is a single dict hit.
+    Formatted symbol effects are also kept once built, for each symbol, rarity and stroke size.
+    The table is compiled again whenever the constants object loads a new symbol library, ex: after
+    symbols.json is updated or the constants are reloaded.
+    @param source: Function returning the dict mapping set codes to symbol data or the set code of another symbol.
+    """
+    def __init__(self, source: Callable[[], dict[str, SymbolData]]):
+        self.source = source
+        self.loaded: Optional[dict[str, SymbolData]] = None
+        self._symbols: dict[str, SymbolData] = {}
+        self.codes: dict[str, Optional[str]] = {}
+        self.formatted: dict[tuple, Any] = {}
+        self._ids: set[int] = set()
+        self._lock = threading.Lock()
+        self.reload()
+
+    def __getitem__(self, code: str) -> SymbolData:
+        return self.symbols[code]
+
+    @property
+    def symbols(self) -> dict[str, SymbolData]:
+        self.reload()
+        return self._symbols
+
+    def reload(self) -> None:
+        """
+        Compile the table again if the symbol library was loaded again since it was compiled.
+        """
+        symbols = self.source()
+        if symbols is self.loaded:
+            return
+        with self._lock:
+            if symbols is self.loaded:
+                return
+            self._symbols = {code: resolve_alias(symbols, code) for code in symbols}
+            self.codes = {code: code for code in self._symbols}
+            self.formatted = {}
+            self._ids = {id(sym) for sym in self._symbols.values()}
+            self.loaded = symbols
+
+    def get_code(self, set_code: str) -> Optional[str]:
+        """
+        Get the code of the symbol used by a set. Promo sets like PMID use the symbol of their parent set.
+        @param set_code: Set code, ex: PMID
+        @return: Symbol code, ex: MID, or None if the set has no symbol.
+        """
+        symbols, code = self.symbols, set_code.upper()
+        if code not in self.codes:
+            self.codes[code] = code[1:] if code[1:] in symbols else None
+        return self.codes[code]
+
+    def get(self, set_code: str) -> Optional[SymbolData]:
+        """
+        Get the symbol used by a set.
+        @param set_code: Set code, ex: MH2
+        @return: Resolved symbol data, or None if the set has no symbol.
+        """
+        code = self.get_code(set_code)
+        return self.symbols[code] if code else None
+
+    def get_formatted(self, symbol: SymbolData, rarity: str, stroke: str, formatter: Callable) -> Any:
+        """
+        Get the formatted effects of a symbol, formatting them the first time they're needed.
+        Symbols which didn't come from this table are formatted every time.
+        @param symbol: Symbol data.
+        @param rarity: Rarity of the card.
+        @param stroke: Stroke size setting.
+        @param formatter: Function taking the symbol and rarity, which formats the effects.
+        @return: Formatted symbol effects.
+        """
+        self.reload()
+        if not isinstance(symbol, str) and id(symbol) not in self._ids:
+            return formatter(symbol, rarity)
+        key = (symbol if isinstance(symbol, str) else id(symbol), rarity, stroke, formatter)
+        with self._lock:
+            if key in self.formatted:
+                return self.formatted[key]
+
+        # Format outside the lock, the first result stored is the one every caller gets
+        result = formatter(symbol, rarity)
+        with self._lock:
+            return self.formatted.setdefault(key, result)
+
+
+"""
+UTILITIES
+"""
+
+
+def resolve_alias(symbols: dict[str, SymbolData], code: str) -> SymbolData:
+    """
+    Follow a set code referencing the symbol of another set until it reaches symbol data.
+    Single characters are symbol data, longer strings found in the symbols are references.
+    @param symbols: Dict mapping set codes to symbol data or references.
+    @param code: Set code to resolve.
+    @return: Symbol data.
+    """
+    sym, seen = symbols[code], {code}
+    while isinstance(sym, str) and len(sym) > 1 and sym in symbols and sym not in seen:
+        seen.add(sym)
+        sym = symbols[sym]
+    return sym
+
+
+# Global symbol table
+symbol_table = SymbolTable(lambda: con.set_symbols)
@@ -29,6 +29,7 @@ class BaseTemplate:
     """
     template_file_name = ""
     template_suffix = ""
+    output_file = ""
 
     def __init__(self, layout: CardLayout):
 
@@ -970,6 +971,8 @@ class BaseTemplate:
                 psd.save_document_psd(file_name)
             else:
                 psd.save_document_jpeg(file_name)
+            ext = cfg.output_filetype if cfg.output_filetype in ("png", "psd") else "jpg"
+            self.output_file = osp.join(con.cwd, f"out/{file_name}.{ext}")
             if not cfg.dev_mode:
                 console.update(f"[b]{file_name}[/b] rendered successfully!")
         except Exception as e:
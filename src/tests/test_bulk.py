@@ -0,0 +1,149 @@
+"""
+OFFLINE CARD INDEX TESTS
+Builds the offline card index from a small bulk data fixture and checks lookups against it, run with:
+python -m pytest src/tests/test_bulk.py
+"""
+import gzip
+import shutil
+from os import path as osp
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+from src import bulk
+from src.bulk import BulkIndex
+
+# Pinned data
+PATH_BULK = osp.join(con.path_tests, 'fixtures', 'bulk_cards.json.gz')
+BULK_TOTAL = 8
+
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    path = str(tmp_path / 'default_cards.json')
+    with gzip.open(PATH_BULK, 'rb') as f, open(path, 'wb') as out:
+        shutil.copyfileobj(f, out)
+    return path
+
+
+@pytest.fixture
+def index(tmp_path, source) -> BulkIndex:
+    idx = BulkIndex(str(tmp_path / 'cards.db'))
+    idx.build(source, updated=100)
+    yield idx
+    idx.close()
+
+
+"""
+BUILD
+"""
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, bulk.CHUNK_SIZE])
+def test_iter_bulk_cards(monkeypatch, source, chunk_size: int):
+    monkeypatch.setattr(bulk, 'CHUNK_SIZE', chunk_size)
+    cards = list(bulk.iter_bulk_cards(source))
+    assert len(cards) == BULK_TOTAL
+    assert cards[-1]['name'] == "Æther Vial"
+
+
+def test_build(monkeypatch, tmp_path, source):
+    monkeypatch.setattr(bulk, 'BATCH_SIZE', 3)
+    idx, counts = BulkIndex(str(tmp_path / 'cards.db')), []
+    assert idx.build(source, callback=counts.append) == BULK_TOTAL
+    assert counts == [3, 6, 8]
+    assert not osp.exists(f"{idx.path}.tmp")
+    assert idx.updated == osp.getmtime(source)
+    idx.close()
+
+
+"""
+LOOKUPS
+"""
+
+
+def test_search_name(index: BulkIndex):
+    sets = [c['set'] for c in index.search("Lightning Bolt")]
+    assert sets == ['2xm', 'm10', 'lea']
+    assert [c['set'] for c in index.search("lightning bolt", ascending=True)] == ['lea', 'm10', '2xm']
+    assert [c['name'] for c in index.search("Æther Vial")] == ["Æther Vial"]
+    assert index.search("Lightning Helix") == []
+
+
+def test_search_set(index: BulkIndex):
+    assert [c['set'] for c in index.search("Lightning Bolt", set_code='M10')] == ['m10']
+    assert index.search("Lightning Bolt", set_code='mh2') == []
+
+
+def test_search_language(index: BulkIndex):
+    assert [c['set'] for c in index.search("Lightning Bolt", language='jp')] == ['jmp']
+    assert [c['lang'] for c in index.search("Lightning Bolt", language='ja')] == ['ja']
+    assert len(index.search("Lightning Bolt", language='any')) == 4
+    assert index.search("Damnation", language='jp') == []
+    assert [c['lang'] for c in index.search("Damnation", language='any')] == ['en', 'ru']
+
+
+def test_search_faces(index: BulkIndex):
+    for name in ["Delver of Secrets", "Insectile Aberration", "Delver of Secrets // Insectile Aberration"]:
+        assert [c['set'] for c in index.search(name)] == ['isd']
+
+
+def test_search_empty_name(index: BulkIndex):
+    # Printed names in non-Latin scripts don't leave empty names behind
+    assert index.connection.execute("SELECT COUNT(*) FROM names WHERE name = ''").fetchone()[0] == 0
+    assert index.search("", language='any') == []
+    assert index.search("Проклятие", language='any') == []
+
+
+def test_get(index: BulkIndex):
+    card = index.search("Damnation")[0]
+    assert index.get(card['id']) == card
+    assert index.get('00000000-0000-0000-0000-000000000000') is None
+
+
+"""
+STALENESS
+"""
+
+
+def test_missing_index(tmp_path):
+    idx = BulkIndex(str(tmp_path / 'cards.db'))
+    assert idx.updated is None
+    assert idx.is_stale(0)
+    assert idx.search("Lightning Bolt") == []
+
+
+def test_is_stale(index: BulkIndex):
+    assert index.updated == 100
+    assert not index.is_stale(50)
+    assert not index.is_stale(100)
+    assert index.is_stale(200)
+
+
+def test_rebuild(index: BulkIndex, tmp_path, source):
+    # Newer bulk data replaces the content of the index
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write('[{"object": "card", "id": "new", "name": "Damnation", "set": "tsr", "lang": "en", '
+                '"released_at": "2021-03-19"}]')
+    assert index.search("Lightning Bolt")
+    assert index.build(source, updated=200) == 1
+    assert not index.is_stale(200)
+    assert index.search("Lightning Bolt") == []
+    assert [c['set'] for c in index.search("Damnation")] == ['tsr']
+
+
+def test_index_without_meta(index: BulkIndex):
+    # Indexes built before staleness was tracked are always rebuilt
+    index.connection.execute("DROP TABLE meta")
+    index.connection.commit()
+    assert index.updated is None
+    assert index.is_stale(0)
+
+
+def test_bulk_data_updated():
+    info = {'updated_at': "2023-01-12T10:02:54.529+00:00"}
+    assert bulk.get_bulk_data_updated(info) == pytest.approx(1673517774.529)
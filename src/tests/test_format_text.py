@@ -0,0 +1,178 @@
+"""
+TEXT FITTING TESTS
+Checks the font size search used to fit text layers against simulated text measurements, run with:
+python -m pytest src/tests/test_format_text.py
+"""
+import math
+from typing import Callable, Iterator
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+import src.helpers as psd
+from src import format_text
+from src.format_text import fit_text_size, scale_text_layers_to_fit, FIT_PRECISION, FIT_STEP
+
+# Most measurements a fit may take
+FIT_MAX_MEASUREMENTS = 8
+
+# Height of text at a font size: area scaling with the square of the size, and text wrapping onto whole lines
+HEIGHT_MODELS = {
+    'area': lambda size, k: size * size * k,
+    'lines': lambda size, k: math.ceil(size * k) * size * 1.2
+}
+
+
+class FakeText:
+    """
+    Text item whose height follows a height model, counting every time it's measured.
+    """
+    def __init__(self, size: float, height: Callable[[float], float]):
+        self.size = self.leading = size
+        self.height = height
+        self.sizes: list[float] = []
+        self.measurements = 0
+
+    def set_size(self, size: float) -> None:
+        self.size = self.leading = size
+        self.sizes.append(size)
+
+    def measure(self) -> float:
+        self.measurements += 1
+        return self.height(self.size)
+
+
+class FakeLayer:
+    def __init__(self, text: FakeText, name: str = 'Rules Text'):
+        self.textItem = text
+        self.name = name
+
+
+"""
+UTILITIES
+"""
+
+
+def get_fitting_size(height: Callable[[float], float], ref_height: float, font_size: float) -> float:
+    """
+    Find the largest size which fits by brute force, in steps much finer than the fit precision.
+    @param height: Height model.
+    @param ref_height: Height the text must fit.
+    @param font_size: Largest size to consider.
+    @return: Largest fitting size.
+    """
+    sizes = [n / 1000 for n in range(int(FIT_PRECISION * 1000), int(font_size * 1000))]
+    return max([s for s in sizes if height(s) <= ref_height], default=FIT_PRECISION)
+
+
+def get_cases() -> Iterator[tuple[str, float, float, float]]:
+    """
+    Text overshooting its box by up to 12 pt, for every height model.
+    @return: Iterator of (model, scale, font size, reference height) tuples.
+    """
+    for model in HEIGHT_MODELS:
+        for font_size in [9, 12, 24]:
+            for k in [0.3, 0.55, 1.1]:
+                for ref_height in [40, 90, 150]:
+                    height = HEIGHT_MODELS[model](font_size, k)
+                    if height > ref_height and font_size - get_fitting_size(
+                        lambda s: HEIGHT_MODELS[model](s, k), ref_height, font_size
+                    ) <= 12:
+                        yield model, k, font_size, ref_height
+
+
+@pytest.fixture
+def hooks() -> Iterator[list[tuple[str, int]]]:
+    reports = []
+    format_text.fit_hooks.append(lambda name, n: reports.append((name, n)))
+    yield reports
+    format_text.fit_hooks.pop()
+
+
+"""
+TESTS
+"""
+
+
+@pytest.mark.parametrize('model, k, font_size, ref_height', list(get_cases()))
+def test_fit_text_size(hooks: list, model: str, k: float, font_size: float, ref_height: float):
+    height = lambda s: HEIGHT_MODELS[model](s, k)
+    text = FakeText(font_size, height)
+    size = fit_text_size(text.set_size, text.measure, ref_height, font_size, height=height(font_size), name='Test')
+
+    # Largest size which fits, to the fit precision, and the text is left at that size
+    fitting = get_fitting_size(height, ref_height, font_size)
+    assert height(size) <= ref_height
+    assert fitting - FIT_PRECISION - 0.001 <= size <= fitting + 0.001
+    assert text.size == size
+
+    # Measured only a few times, and every measurement is reported
+    assert 1 <= text.measurements <= FIT_MAX_MEASUREMENTS
+    assert hooks == [('Test', text.measurements)]
+
+
+@pytest.mark.parametrize('precision', [0.05, 0.1, 0.5, 1])
+def test_fit_precision(precision: float):
+    height = lambda s: HEIGHT_MODELS['lines'](s, 0.55)
+    text = FakeText(12, height)
+    size = fit_text_size(text.set_size, text.measure, 40, 12, precision=precision)
+    fitting = get_fitting_size(height, 40, 12)
+    assert height(size) <= 40
+    assert fitting - precision - 0.001 <= size <= fitting + 0.001
+
+
+def test_fit_guess():
+    # An accurate prediction is confirmed in two measurements
+    height = lambda s: HEIGHT_MODELS['lines'](s, 0.55)
+    fitting = get_fitting_size(height, 90, 12)
+    text = FakeText(12, height)
+    size = fit_text_size(text.set_size, text.measure, 90, 12, height=height(12), guess=fitting)
+    assert size == fitting
+    assert text.measurements == 2
+    assert text.sizes == [fitting, fitting + FIT_PRECISION, fitting]
+
+
+def test_fit_already_fits(hooks: list):
+    text = FakeText(12, lambda s: s)
+    assert fit_text_size(text.set_size, text.measure, 40, 12, height=12, name='Test') == 12
+    assert text.sizes == [] and text.measurements == 0
+    assert fit_text_size(text.set_size, text.measure, 40, 12, name='Test') == 12
+    assert text.sizes == [] and text.measurements == 1
+    assert hooks == [('Test', 0), ('Test', 1)]
+
+
+def test_fit_never_fits():
+    text = FakeText(12, lambda s: 100)
+    assert fit_text_size(text.set_size, text.measure, 40, 12) == FIT_PRECISION
+    assert text.size == FIT_PRECISION
+
+
+@pytest.mark.parametrize('ref_height, expected', [
+    (200, 12 + FIT_STEP / 2),
+    (12 * 12, 12)
+])
+def test_scale_layers_already_fit(monkeypatch, ref_height: float, expected: float):
+    # Layers which fit are still set a half step larger if that fits, like before
+    layers = [FakeLayer(FakeText(12, lambda s: s * s / 2)) for _ in range(2)]
+    monkeypatch.setattr(psd, 'get_text_scale_factor', lambda layer: 1)
+    monkeypatch.setattr(psd, 'get_text_layer_dimensions', lambda layer: {'height': layer.textItem.measure()})
+    scale_text_layers_to_fit(layers, ref_height)
+    assert [layer.textItem.size for layer in layers] == [expected, expected]
+    assert [layer.textItem.leading for layer in layers] == [expected, expected]
+
+
+def test_scale_layers_overflow(monkeypatch):
+    layers = [FakeLayer(FakeText(12, lambda s: HEIGHT_MODELS['lines'](s, 0.55))) for _ in range(3)]
+    monkeypatch.setattr(psd, 'get_text_scale_factor', lambda layer: 1)
+    monkeypatch.setattr(psd, 'get_text_layer_dimensions', lambda layer: {'height': layer.textItem.measure()})
+    scale_text_layers_to_fit(layers, 150)
+
+    # Every layer ends at the same size, and together they fit
+    fitting = get_fitting_size(lambda s: HEIGHT_MODELS['lines'](s, 0.55) * 3, 150, 12)
+    sizes = {layer.textItem.size for layer in layers}
+    assert len(sizes) == 1
+    assert fitting - FIT_PRECISION - 0.001 <= sizes.pop() <= fitting + 0.001
@@ -2,23 +2,72 @@
 FRAME LOGIC TESTS
 Credit to Chilli
 https://tinyurl.com/chilli-frame-logic-tests
+
+Offline regression suite for layout dispatch and frame logic, run from the working directory with:
+python -m pytest src/tests -s
+
+Curated cases are checked against Scryfall responses pinned in a fixture archive, and every pinned card is
+always checked against a pinned snapshot of its frame. Every card in the bulk data file in PROXYSHOP_BULK,
+or in the offline card index, is also checked against the snapshot when one is available.
+
+The pinned responses are synthetic: the card objects were transcribed by hand with the fields frame logic
+reads (cost, type line, oracle text, color identity and indicator, frame effects, faces, meld parts) rather
+than recorded from Scryfall, which couldn't be reached when they were made. Record them from Scryfall, and
+the snapshot again, whenever Scryfall data or the expected frames change. The snapshot pins whatever the
+current frame logic returns, so record it from logic known to be correct:
+python -m src.tests.test_frame_data record
+python -m src.tests.test_frame_data snapshot [bulk data file]
 """
-# Change to root directory
 import os
+import gzip
+import json
 import time
+import argparse
+import tracemalloc
 from os import path as osp
-os.chdir(osp.abspath(osp.join(os.getcwd(), '..', '..')))
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import pytest
 
 # Run headless
 from src.constants import con
 con.headless = True
 
 # Additional imports
+from src import bulk
+from src.settings import cfg
+from src.cards import CardRecord
 from src.layouts import TransformLayout, MeldLayout, ModalDoubleFacedLayout, layout_map
-from src.layouts import NormalLayout
+from src.layouts import NormalLayout, CardLayout
+from src.client import client
 from src.scryfall import card_info
+from src.utils.cache import cache
+from src.utils.http import transport
+from src.utils.replay import FixtureArchive, Fixtures
+from src.utils.concurrency import TokenBucket
+
+# Pinned data
+PATH_FIXTURES = osp.join(con.path_tests, 'fixtures')
+PATH_CARDS = osp.join(PATH_FIXTURES, 'frame_cards.json.gz')
+PATH_SNAPSHOT = osp.join(PATH_FIXTURES, 'frame_snapshot.json.gz')
+
+# Settings the expected frames and recorded requests depend on
+PINNED_SETTINGS = {
+    'lang': 'en',
+    'offline_index': False,
+    'fix_names': False,
+    'render_basic': True,
+    'render_snow': False,
+    'render_miracle': False,
+    'scry_ascending': False
+}
+
+# Layouts built per benchmark run, and the most memory each one may hold
+BENCH_LAYOUTS = 10000
+BENCH_MAX_BYTES = 2048
+
 
-# TODO: Implement actual pytest assertions
 test_cases = {
     # Basic test cases - mono colored, normal 'frame' cards
     "Healing Salve": {
@@ -845,49 +894,248 @@ test_cases = {
     },
 }
 
-# Singular test
+
+
 """
-test_cases = {
-    "Asmoranomardicadaistinaculdacar": {
-        'layout': NormalLayout,
-        'frame': [con.layers.BR, con.layers.BR, con.layers.LAND, False, False]
-    }
-}
+UTILITIES
 """
 
-# Test each card
-failed = []
-for card, correct_result in test_cases.items():
-    # Retrieve scryfall for the card
-    scryfall = card_info(card)
-    mock_file_info = {
-        'name': card,
-        'artist': '',
-        'set_code': '',
-        'creator': '',
-        'filename': ''
-    }
+
+@contextmanager
+def pinned(fixtures: Optional[Fixtures] = None) -> Iterator[None]:
+    """
+    Apply the pinned settings and bypass the response cache, restoring both afterwards.
+    Replayed responses aren't rate limited.
+    @param fixtures: Record or replay layer to install on the transport.
+    """
+    previous = {k: getattr(cfg, k) for k in PINNED_SETTINGS}, cache.ttl, transport.fixtures, client.limiter
+    for k, v in PINNED_SETTINGS.items():
+        setattr(cfg, k, v)
+    cache.ttl, transport.fixtures = {}, fixtures
+    if fixtures and fixtures.replaying:
+        client.limiter = TokenBucket(1000000)
     try:
-        layout = layout_map[scryfall['layout']](scryfall, mock_file_info)
-        actual_result = {
-            'layout': layout_map[scryfall['layout']],
-            'frame': [layout.background, layout.pinlines, layout.twins, layout.is_nyx, layout.is_colorless]
-        }
-    except Exception as e:
-        print(e)
-        print('Error at:', card)
-        continue
-
-    # Do the results match?
-    if not actual_result == correct_result:
-        print(card)
-        print('Result:', actual_result)
-        print('Desired Result:', correct_result)
-        failed.append({'name': card, 'expected': correct_result, 'actual': actual_result})
-        print("==================================")
-
-    # Scryfall rate limit
-    time.sleep(0.05)
-
-# Look over any failures
-print(failed if failed else "ALL SUCCESSFUL!")
+        yield
+    finally:
+        settings, cache.ttl, transport.fixtures, client.limiter = previous
+        for k, v in settings.items():
+            setattr(cfg, k, v)
+
+
+def get_file_info(name: str) -> dict:
+    """
+    Mock the details parsed from an art file.
+    @param name: Card name.
+    @return: File details dict.
+    """
+    return {'name': name, 'artist': '', 'set': '', 'creator': '', 'filename': ''}
+
+
+def get_result(layout: CardLayout) -> dict:
+    """
+    Get the layout class and frame of a layout in the format of the curated cases.
+    @param layout: Layout object.
+    @return: Dict containing layout class and frame list.
+    """
+    return {
+        'layout': type(layout),
+        'frame': [layout.background, layout.pinlines, layout.twins, layout.is_nyx, layout.is_colorless]
+    }
+
+
+def get_bulk_cards(source: Optional[str] = None) -> Optional[Iterator[dict]]:
+    """
+    Read every card from a bulk data file, or the offline card index.
+    @param source: Bulk data file, PROXYSHOP_BULK is used if not provided.
+    @return: Iterator of Scryfall card dicts, None if no cards are available.
+    """
+    if source := source or os.environ.get('PROXYSHOP_BULK'):
+        return bulk.iter_bulk_cards(source)
+    if bulk.index.exists:
+        return (json.loads(row[0]) for row in bulk.index.connection.execute("SELECT data FROM cards ORDER BY id"))
+    return
+
+
+def get_snapshot() -> dict[str, list]:
+    """
+    Read the pinned frame of every card.
+    @return: Dict mapping card id and face name to the card class and frame, or the error raised.
+    """
+    with gzip.open(PATH_SNAPSHOT, 'rt', encoding='utf-8') as f:
+        return json.load(f)['frames']
+
+
+def get_pinned_cards() -> Iterator[dict]:
+    """
+    Read every card found in the pinned Scryfall responses.
+    @return: Iterator of Scryfall card dicts, ordered by id.
+    """
+    cards = {}
+    for res in FixtureArchive(PATH_CARDS).responses.values():
+        data = json.loads(res['body'])
+        if data.get('object') == 'list':
+            cards.update({c['id']: c for c in data['data']})
+        elif data.get('object') == 'card':
+            cards[data['id']] = data
+    return (cards[k] for k in sorted(cards))
+
+
+def get_bulk_frames(cards: Iterator[dict]) -> dict[str, list]:
+    """
+    Build the layout for each face of every card and get its card class and frame.
+    Meld cards are skipped since their parts would have to be looked up.
+    @param cards: Scryfall card dicts.
+    @return: Dict mapping card id and face name to the card class and frame, or the error raised.
+    """
+    frames = {}
+    for card in cards:
+        if card.get('layout') not in layout_map or card['layout'] == 'meld':
+            continue
+        faces = card.get('card_faces', [card])
+        if card['layout'] not in ('transform', 'modal_dfc'):
+            faces = faces[:1]
+        record = CardRecord.from_scryfall(card)
+        for face in faces:
+            key = f"{card['id']}/{face['name']}"
+            try:
+                layout = layout_map[card['layout']](record, get_file_info(face['name']))
+                frames[key] = [layout.card_class, *get_result(layout)['frame']]
+            except Exception as e:
+                # Pin the failure too
+                frames[key] = [type(e).__name__]
+    return frames
+
+
+def measure(records: list[tuple[str, CardRecord]], total: int = BENCH_LAYOUTS) -> tuple[float, float]:
+    """
+    Measure layout dispatch and frame selection throughput, and the memory held by each layout.
+    @param records: Card names and records to cycle through.
+    @param total: Number of layouts to build.
+    @return: Layouts per second and bytes held per layout.
+    """
+    layouts = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(total):
+        name, record = records[i % len(records)]
+        layout = layout_map[record['layout']](record, get_file_info(name))
+        layouts.append((layout, layout.frame))
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total / elapsed, current / total
+
+
+"""
+TESTS
+"""
+
+
+@pytest.fixture(scope='module')
+def records() -> dict[str, CardRecord]:
+    # Look up every curated card from the pinned responses
+    if not osp.exists(PATH_CARDS):
+        pytest.skip("Pinned card data not recorded, run: python -m src.tests.test_frame_data record")
+    with pinned(Fixtures(FixtureArchive(PATH_CARDS))):
+        return {name: card_info(name) for name in test_cases}
+
+
+@pytest.mark.parametrize('name', list(test_cases))
+def test_frame(records: dict[str, CardRecord], name: str):
+    scryfall = records[name]
+    assert isinstance(scryfall, CardRecord), f"No pinned data for: {name}"
+    with pinned():
+        layout = layout_map[scryfall['layout']](scryfall, get_file_info(name))
+        assert get_result(layout) == test_cases[name]
+
+
+def test_benchmark(records: dict[str, CardRecord]):
+    found = [(name, r) for name, r in records.items() if isinstance(r, CardRecord)]
+    with pinned():
+        rate, memory = measure(found)
+    print(f"\nFrame logic: {rate:.0f} cards/sec, {memory:.0f} bytes per layout")
+    assert memory < BENCH_MAX_BYTES, f"Each layout holds {memory:.0f} bytes, more than {BENCH_MAX_BYTES}"
+
+
+def test_pinned_snapshot():
+    # Always runs, every pinned card must be in the snapshot with the same frame
+    assert osp.exists(PATH_CARDS) and osp.exists(PATH_SNAPSHOT), "Pinned card data or frame snapshot is missing"
+    expected = get_snapshot()
+    with pinned():
+        actual = get_bulk_frames(get_pinned_cards())
+    assert len(actual) >= len(test_cases)
+    missing = [k for k in actual if k not in expected]
+    assert not missing, f"{len(missing)} pinned cards aren't in the snapshot, ex: " + ", ".join(missing[:5])
+    changed = [k for k, v in actual.items() if expected[k] != v]
+    assert not changed, f"{len(changed)} frames changed, ex: " + ", ".join(
+        f"{k}: {expected[k]} -> {actual[k]}" for k in changed[:5]
+    )
+
+
+def test_bulk_snapshot():
+    if not osp.exists(PATH_SNAPSHOT):
+        pytest.skip("Frame snapshot not recorded, run: python -m src.tests.test_frame_data snapshot")
+    if not (cards := get_bulk_cards()):
+        pytest.skip("No bulk data available, build the offline card index or set PROXYSHOP_BULK")
+    expected = get_snapshot()
+
+    # Classify every card
+    with pinned():
+        start = time.perf_counter()
+        actual = get_bulk_frames(cards)
+        elapsed = time.perf_counter() - start
+    print(f"\nBulk snapshot: {len(actual)} cards in {elapsed:.2f} s ({len(actual) / elapsed:.0f} cards/sec)")
+
+    # Cards added since the snapshot are ignored
+    changed = [k for k, v in expected.items() if k in actual and actual[k] != v]
+    assert not changed, f"{len(changed)} frames changed, ex: " + ", ".join(
+        f"{k}: {expected[k]} -> {actual[k]}" for k in changed[:5]
+    )
+
+
+"""
+RECORD PINNED DATA
+"""
+
+
+def record_cards() -> None:
+    """
+    Record the Scryfall responses needed by the curated cases.
+    """
+    archive = FixtureArchive(PATH_CARDS)
+    archive.responses = {}
+    with pinned(Fixtures(archive, replay=False)):
+        missing = [name for name in test_cases if not isinstance(card_info(name), CardRecord)]
+    archive.meta = {'cards': list(test_cases), 'recorded': time.time()}
+    archive.save()
+    print(f"{len(archive.responses)} responses saved to: {PATH_CARDS}")
+    if missing:
+        print(f"Couldn't find: {', '.join(missing)}")
+
+
+def record_snapshot(source: Optional[str] = None) -> None:
+    """
+    Pin the frame of every card in the bulk data.
+    @param source: Bulk data file, the pinned cards are used if not provided.
+    """
+    cards = get_bulk_cards(source) if source else get_pinned_cards() if osp.exists(PATH_CARDS) else None
+    if not cards:
+        print("No bulk data available, record the pinned cards or provide a bulk data file!")
+        return
+    with pinned():
+        frames = get_bulk_frames(cards)
+    os.makedirs(PATH_FIXTURES, exist_ok=True)
+    with gzip.open(PATH_SNAPSHOT, 'wt', encoding='utf-8') as f:
+        json.dump({'recorded': time.time(), 'frames': frames}, f, separators=(',', ':'), sort_keys=True)
+    print(f"{len(frames)} card frames saved to: {PATH_SNAPSHOT}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record the pinned data used by the frame logic tests.")
+    parser.add_argument('data', choices=['record', 'snapshot'], help="Pinned data to record.")
+    parser.add_argument('file', nargs='?', help="Bulk data file to snapshot, the pinned cards if not provided.")
+    args = parser.parse_args()
+    if args.data == 'record':
+        record_cards()
+    else:
+        record_snapshot(args.file)
@@ -0,0 +1,116 @@
+"""
+RESUMABLE RENDER JOB TESTS
+Checks when a batch snapshot is resumed or started over, run with:
+python -m pytest src/tests/test_jobs.py
+"""
+import json
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+from src.cards import CardRecord
+from src.jobs import JobSnapshot
+
+# Settings a batch is started with
+SETTINGS = {'lang': 'en', 'scry_ascending': False, 'fix_names': False, 'templates': {'normal': 'Normal'}}
+
+
+"""
+UTILITIES
+"""
+
+
+def write_snapshot(path: str, entries: list[dict]) -> None:
+    """
+    Write a snapshot as a previous batch would have left it.
+    @param path: Path to the snapshot file.
+    @param entries: Entries following the job line.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in [{'type': 'job', 'settings': SETTINGS}, *entries]:
+            f.write(json.dumps(entry) + "\n")
+
+
+@pytest.fixture
+def output(tmp_path) -> str:
+    path = tmp_path / 'out' / 'Lightning Bolt.jpg'
+    path.parent.mkdir()
+    path.write_bytes(b'')
+    return str(path)
+
+
+"""
+TESTS
+"""
+
+
+def test_resume_without_cards(tmp_path, output: str):
+    # Finished renders are skipped even if no card lines were recorded
+    path = str(tmp_path / 'job.jsonl')
+    write_snapshot(path, [{'type': 'done', 'file': 'art/Lightning Bolt.jpg', 'output': output}])
+    job = JobSnapshot(path)
+    assert job.open(SETTINGS)
+    assert job.cards == {}
+    assert job.is_done('art/Lightning Bolt.jpg')
+    assert not job.is_done('art/Damnation.jpg')
+    job.close()
+
+
+def test_resume_empty(tmp_path):
+    path = str(tmp_path / 'job.jsonl')
+    write_snapshot(path, [])
+    job = JobSnapshot(path)
+    assert job.open(SETTINGS)
+    job.close()
+
+
+def test_new_batch(tmp_path, output: str):
+    path = str(tmp_path / 'job.jsonl')
+    job = JobSnapshot(path)
+    assert not job.open(SETTINGS)
+    job.close()
+
+    # Other settings start the batch over
+    write_snapshot(path, [{'type': 'done', 'file': 'art/Lightning Bolt.jpg', 'output': output}])
+    assert not job.open({**SETTINGS, 'lang': 'jp'})
+    assert not job.is_done('art/Lightning Bolt.jpg')
+    job.close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['type'] for line in f] == ['job']
+
+
+def test_resume_cards(tmp_path, output: str):
+    path = str(tmp_path / 'job.jsonl')
+    job = JobSnapshot(path)
+    job.open(SETTINGS)
+    details = {
+        'name': "Lightning Bolt", 'set': '', 'artist': '', 'creator': None, 'filename': 'art/Lightning Bolt.jpg'
+    }
+    job.add_card(details, CardRecord(name="Lightning Bolt", set='lea'), {'name': 'Normal'})
+    job.add_done(details['filename'], output)
+    job.close()
+
+    # Interrupted write at the end of the snapshot
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "card", "fi')
+
+    job = JobSnapshot(path)
+    assert job.open(SETTINGS)
+    assert job.is_done(details['filename'])
+    card_details, card = job.get_card(details['filename'])
+    assert card_details == details and card.set == 'lea'
+    job.close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['type'] for line in f] == ['job', 'card', 'done']
+
+
+def test_finish(tmp_path):
+    path = tmp_path / 'job.jsonl'
+    job = JobSnapshot(str(path))
+    job.open(SETTINGS)
+    job.finish()
+    assert not path.exists()
@@ -0,0 +1,122 @@
+"""
+STREAMING JSON TESTS
+Checks extract_fields against json.loads with the document split into chunks of every size, run with:
+python -m pytest src/tests/test_json_stream.py
+"""
+import json
+from typing import Iterator
+
+import pytest
+
+from src.utils.json_stream import extract_fields
+
+# Chunk sizes to split each document into, small sizes put every token across a chunk boundary
+CHUNK_SIZES = [1, 2, 3, 4, 5, 7, 13, 64, 1024 * 1024]
+
+# Shaped like an MTGJSON set file, the header fields are read and the rest skipped
+DOCUMENT = {
+    'meta': {'date': "2023-01-12", 'version': "5.2.1+20230112"},
+    'data': {
+        'cards': [
+            {
+                'name': "Æther Vial", 'text': 'Quote "{inside}" and [brackets] \\ backslash \\"',
+                'flavorText': "日本語 — テキスト 🐉", 'identifiers': {'scryfallId': "a-b-c"},
+                'manaValue': 1.0, 'power': None, 'isReprint': True
+            },
+            {'name': "Jötun Grunt", 'text': "é\t\n\r—🐉", 'numbers': [0, -1, 12.5, -3e+2]}
+        ],
+        'tokens': [[], {}, [[{}]], "}{][", "\\\\", "\\\""],
+        'baseSetSize': 249,
+        'name': "Coldsnap — “Theme” 🐉",
+        'code': "CSP",
+        'keyruneCode': "CSP",
+        'releaseDate': "2006-07-21",
+        'totalSetSize': 155.25,
+        'ratio': -1.25E-3,
+        'isFoilOnly': False,
+        'mtgoCode': None,
+        'translations': {'Japanese': "コールドスナップ", 'French': "Souffle glaciaire"},
+        'booster': {'default': {'contents': {'common': 10}, 'weights': [1, 2.5e2]}}
+    }
+}
+
+
+"""
+UTILITIES
+"""
+
+
+def get_chunks(data: bytes, size: int) -> Iterator[bytes]:
+    """
+    Split bytes into chunks of a fixed size, cutting through multibyte characters where they fall.
+    @param data: Bytes to split.
+    @param size: Size of each chunk.
+    @return: Iterator of chunks.
+    """
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def get_document(**kwargs) -> bytes:
+    return json.dumps(DOCUMENT, **kwargs).encode('utf-8')
+
+
+"""
+TESTS
+"""
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+@pytest.mark.parametrize('ascii_only', [False, True])
+def test_extract_fields(size: int, ascii_only: bool):
+    fields = [
+        'name', 'code', 'baseSetSize', 'totalSetSize', 'ratio', 'isFoilOnly', 'mtgoCode', 'translations', 'booster'
+    ]
+    data = get_document(ensure_ascii=ascii_only)
+    assert extract_fields(get_chunks(data, size), fields, ['data']) == {k: DOCUMENT['data'][k] for k in fields}
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_extract_fields_compact(size: int):
+    # No whitespace, so every value ends right at a delimiter
+    data = get_document(separators=(',', ':'), ensure_ascii=False)
+    fields = ['baseSetSize', 'totalSetSize', 'ratio', 'isFoilOnly', 'mtgoCode']
+    assert extract_fields(get_chunks(data, size), fields, ['data']) == {k: DOCUMENT['data'][k] for k in fields}
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+@pytest.mark.parametrize('number', ['0', '7', '-12', '249', '155.25', '-1.25E-3', '2.5e+10', '1e5'])
+def test_number_at_edge(size: int, number: str):
+    # A number ending the document, or cut short by the end of a chunk, is read in full
+    value = json.loads(number)
+    data = f'{{"a":{number},"b":{number}}}'.encode('utf-8')
+    assert extract_fields(get_chunks(data, size), ['a', 'b']) == {'a': value, 'b': value}
+
+    # Skipped numbers inside containers too
+    data = f'{{"a":[{number}],"b":{{"c":{number}}},"d":{number}}}'.encode('utf-8')
+    assert extract_fields(get_chunks(data, size), ['d']) == {'d': value}
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_byte_order_mark(size: int):
+    data = '\ufeff{"name": "Coldsnap"}'.encode('utf-8')
+    assert extract_fields(get_chunks(data, size), ['name']) == {'name': "Coldsnap"}
+
+
+def test_missing_path():
+    data = get_document()
+    assert extract_fields(get_chunks(data, 7), ['name'], ['missing']) is None
+    assert extract_fields(get_chunks(data, 7), ['missing']) == {}
+
+
+def test_stops_early():
+    # Reading stops once every field is found, later chunks are never requested
+    read = []
+
+    def chunks() -> Iterator[bytes]:
+        for chunk in get_chunks(b'{"name": "Coldsnap", "code": "CSP", "cards": [' + b'{}, ' * 1000 + b'{}]}', 16):
+            read.append(chunk)
+            yield chunk
+
+    assert extract_fields(chunks(), ['name', 'code']) == {'name': "Coldsnap", 'code': "CSP"}
+    assert len(read) < 5
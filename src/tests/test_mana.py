@@ -0,0 +1,147 @@
+"""
+MANA SYMBOL TOKENIZER TESTS
+Checks the symbol tokenizer finds the same symbols and colors as the per-symbol loop it replaced, run with:
+python -m pytest src/tests/test_mana.py
+"""
+import re
+from typing import Optional
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+import src.helpers as psd
+from src import format_text
+from src.format_text import SymbolMapper, locate_symbols
+from src.mana import tokenizer
+
+# Rules text mixing every kind of symbol, hybrid and phyrexian symbols next to each other
+SYMBOL_TEXT = [
+    "{T}: Add {G}.",
+    "{2/B}{2/B}{2/B}",
+    "{W/U}{U/B}{B/R}{R/G}{G/W}{W/B}{B/G}{G/U}{U/R}{R/W}",
+    "{W/P}{U/P}{B/P}{R/P}{G/P}, {T}, Sacrifice this: Draw a card.",
+    "As an additional cost, pay {G/U/P}{R/W/P} or {W/U/P}.",
+    "{2/W}{2/U}{2/R}{2/G}{X}{X}{C}{C}",
+    "{E}{E}{S}{Q}{CHAOS}: You get {E}{E}.",
+    "{0}{1}{10}{20}, {T}: Untap target {S} permanent.",
+    "Reminder ({B/P} can be paid with {B} or 2 life.)\r{B/P}{B/P}: Put a +1/+1 counter on this.",
+    "No symbols here.",
+    "{W}{U}{B}{R}{G}",
+    "{T}: Add {U}. {ZZZ} stops the scan before {W}."
+]
+
+
+class Color:
+    """
+    Color loaded from a constant, compared by identity so each symbol color can be told apart.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Color({self.value!r})"
+
+
+"""
+UTILITIES
+"""
+
+
+# Per-symbol loop locate_symbols used before the tokenizer
+reg_symbol = re.compile(r"(\{.*?})")
+reg_mana_normal = re.compile(r"{([WUBRG])}")
+reg_mana_hybrid = re.compile(r"{([2WUBRG])/([WUBRG])}")
+reg_mana_phyrexian = re.compile(r"{([WUBRG])/P}")
+reg_mana_phyrexian_hybrid = re.compile(r"{([WUBRG])/([WUBRG])/P}")
+
+
+def locate_symbols_loop(input_string: str, sym: SymbolMapper) -> dict:
+    """
+    Replace one symbol at a time, determining its colors from the regex it matches.
+    @param input_string: String containing Scryfall symbols.
+    @param sym: Symbol colors to use.
+    @return: Dict with the translated string and symbol indices, like locate_symbols.
+    """
+    symbol_indices = []
+    try:
+        while match := reg_symbol.search(input_string):
+            symbol = match[1]
+            symbol_index = match.span()[0]
+            symbol_char = con.symbols[symbol]
+            input_string = input_string.replace(symbol, symbol_char, 1)
+            symbol_indices.append({
+                'index': symbol_index,
+                'colors': determine_symbol_colors_loop(symbol, len(symbol_char), sym)
+            })
+    except KeyError:
+        pass
+    return {'input_string': input_string, 'symbol_indices': symbol_indices}
+
+
+def determine_symbol_colors_loop(symbol: str, symbol_length: int, sym: SymbolMapper) -> Optional[list]:
+    if symbol in ("{E}", "{CHAOS}"):
+        return [sym.clr_primary]
+    elif symbol == "{S}":
+        return [sym.clr_c, sym.clr_primary, sym.clr_secondary]
+    elif symbol == "{Q}":
+        return [sym.clr_primary, sym.clr_secondary]
+    if match := reg_mana_normal.match(symbol):
+        return [sym.color_map[match[1]], sym.color_map_inner[match[1]]]
+    if match := reg_mana_hybrid.match(symbol):
+        color_map = sym.hybrid_color_map if match[1] == "2" else sym.color_map
+        return [
+            color_map[match[2]], color_map[match[1]],
+            sym.color_map_inner[match[1]], sym.color_map_inner[match[2]]
+        ]
+    if match := reg_mana_phyrexian.match(symbol):
+        return [sym.hybrid_color_map[match[1]], sym.hybrid_color_map_inner[match[1]]]
+    if match := reg_mana_phyrexian_hybrid.match(symbol):
+        return [
+            sym.color_map[match[2]], sym.color_map[match[1]],
+            sym.color_map_inner[match[1]], sym.color_map_inner[match[2]]
+        ]
+    if symbol_length == 2:
+        return [sym.clr_c, sym.clr_primary]
+    return
+
+
+@pytest.fixture
+def sym(monkeypatch) -> SymbolMapper:
+    """
+    Symbol colors which are each a distinct object, even where two constants hold the same color.
+    """
+    monkeypatch.setattr(psd, 'get_color', Color)
+    mapper = SymbolMapper()
+    monkeypatch.setattr(format_text, 'sym', mapper)
+    return mapper
+
+
+"""
+TESTS
+"""
+
+
+@pytest.mark.parametrize('text', SYMBOL_TEXT)
+def test_locate_symbols(sym: SymbolMapper, text: str):
+    # Colors are compared by identity, each index must be filled with the same constant as before
+    assert locate_symbols(text) == locate_symbols_loop(text, sym)
+
+
+def test_every_symbol(sym: SymbolMapper):
+    # Every supported symbol, alone and next to every other kind of symbol
+    for symbol in con.symbols:
+        text = f"{{W/P}}{symbol}{{2/B}}{symbol}{{G/U/P}}"
+        assert locate_symbols(text) == locate_symbols_loop(text, sym), symbol
+
+
+def test_symbol_spans():
+    text, spans, unknown = tokenizer.tokenize("{2/B}{W/P}: Add {C}.")
+    assert text == "QqWTQp: Add oc."
+    assert [(start, end, symbol) for start, end, symbol, _ in spans] == [
+        (0, 4, "{2/B}"), (4, 6, "{W/P}"), (12, 14, "{C}")
+    ]
+    assert unknown is None
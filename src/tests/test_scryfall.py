@@ -0,0 +1,274 @@
+"""
+BATCHED CARD LOOKUP TESTS
+Checks card_info_batch, and how failed lookups are classified, against a local stand-in for the Scryfall API,
+run with:
+python -m pytest src/tests/test_scryfall.py
+"""
+import json
+import threading
+from typing import Iterator
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+from src.settings import cfg
+from src.cards import CardRecord
+from src.client import client
+from src.core import CardDetails
+from src.scryfall import card_info, card_info_batch, get_card_search, CardLookupError, LookupFailure
+from src.utils.cache import cache
+from src.utils.http import transport
+from src.utils.concurrency import TokenBucket
+
+# Settings the batch depends on
+BATCH_SETTINGS = {
+    'lang': 'en',
+    'offline_index': False,
+    'fix_names': False,
+    'render_basic': True,
+    'scry_ascending': False
+}
+
+
+class ScryfallStandIn(ThreadingHTTPServer):
+    """
+    Serves cards/collection and cards/search from a list of cards, recording every request made.
+    Cards named in 'search_only' are left out of collection results, like cards Scryfall only finds by search.
+    Searches for a name in 'errors' fail with the given status and raw body.
+    """
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ScryfallHandler)
+        self.cards: list[dict] = []
+        self.search_only: set[str] = set()
+        self.errors: dict[str, tuple[int, str]] = {}
+        self.requests: list[tuple[str, str, dict]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @property
+    def collections(self) -> list[list[dict]]:
+        return [body['identifiers'] for method, _, body in self.requests if method == 'POST']
+
+    @property
+    def searches(self) -> list[str]:
+        return [url for method, url, _ in self.requests if method == 'GET']
+
+    def find(self, name: str, set_code: str = '') -> list[dict]:
+        return [
+            c for c in self.cards
+            if name.lower() in [n.lower() for n in get_names(c)]
+            and (not set_code or c['set'] == set_code.lower())
+        ]
+
+
+class ScryfallHandler(BaseHTTPRequestHandler):
+    server: ScryfallStandIn
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.requests.append(('POST', self.path, body))
+        data, not_found = [], []
+        for ident in body['identifiers']:
+            found = [
+                c for c in self.server.find(ident['name'], ident.get('set', ''))
+                if c['name'] not in self.server.search_only
+            ]
+            if found:
+                data.append(found[0])
+            else:
+                not_found.append(ident)
+        self.send_json(200, {'object': 'list', 'not_found': not_found, 'data': data})
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(('GET', self.path, {}))
+        query = parse_qs(urlsplit(self.path).query)['q'][0]
+        name = query.split('!"', 1)[1].split('"', 1)[0]
+        set_code = query.split('set:', 1)[1].split(' ', 1)[0] if 'set:' in query else ''
+        if name in self.server.errors:
+            status, body = self.server.errors[name]
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+        elif found := self.server.find(name, set_code):
+            self.send_json(200, {'object': 'list', 'total_cards': len(found), 'has_more': False, 'data': found})
+        else:
+            self.send_json(404, {
+                'object': 'error', 'code': 'not_found', 'status': 404,
+                'details': "Your query didn't match any cards."
+            })
+
+    def send_json(self, status: int, obj: dict):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+"""
+FIXTURES
+"""
+
+
+@pytest.fixture(scope='module')
+def server() -> Iterator[ScryfallStandIn]:
+    srv = ScryfallStandIn()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def scryfall(server: ScryfallStandIn, monkeypatch) -> ScryfallStandIn:
+    """
+    Point lookups at the stand-in with fixed settings, bypassing the response cache and rate limit.
+    """
+    for k, v in BATCH_SETTINGS.items():
+        monkeypatch.setattr(cfg, k, v)
+    monkeypatch.setattr(con, 'scryfall_api', server.url)
+    monkeypatch.setattr(cache, 'ttl', {})
+    monkeypatch.setattr(transport, 'fixtures', None)
+    monkeypatch.setattr(client, 'limiter', TokenBucket(1000000))
+    server.cards = [get_card(f"Test Card {n}", 'tst') for n in range(160)]
+    server.search_only = set()
+    server.errors = {}
+    server.requests = []
+    return server
+
+
+"""
+UTILITIES
+"""
+
+
+def get_card(name: str, set_code: str) -> dict:
+    """
+    Mock a Scryfall card object.
+    @param name: Card name.
+    @param set_code: Set code of the printing.
+    @return: Scryfall card dict.
+    """
+    return {
+        'object': 'card', 'id': f"{set_code}-{name}", 'name': name, 'lang': 'en', 'layout': 'normal',
+        'set': set_code, 'set_name': "Test Set", 'set_type': 'expansion', 'type_line': "Instant",
+        'mana_cost': "{R}", 'oracle_text': "Deal 3 damage to any target."
+    }
+
+
+def get_names(card: dict) -> list[str]:
+    return [card['name']] + [f['name'] for f in card.get('card_faces', [])]
+
+
+def get_details(name: str, set_code: str = '') -> CardDetails:
+    """
+    Mock the details parsed from an art file.
+    @param name: Card name.
+    @param set_code: Set code, empty if none was given.
+    @return: Card details dict.
+    """
+    return {'name': name, 'set': set_code, 'artist': '', 'creator': None, 'filename': f"{name}.jpg"}
+
+
+"""
+TESTS
+"""
+
+
+def test_chunking(scryfall: ScryfallStandIn):
+    details = [get_details(f"Test Card {n}") for n in range(160)]
+    resolved = card_info_batch(details)
+    assert [len(c) for c in scryfall.collections] == [75, 75, 10]
+    assert scryfall.searches == []
+    assert sorted(resolved) == list(range(160))
+    assert all(isinstance(resolved[i], CardRecord) and resolved[i].name == d['name'] for i, d in enumerate(details))
+
+
+def test_duplicates(scryfall: ScryfallStandIn):
+    scryfall.cards.append(get_card("Test Card 1", 'alt'))
+    details = [
+        get_details("Test Card 1"), get_details("test card 1"), get_details("Test Card 1", 'ALT'),
+        get_details("Test Card 1"), get_details("Test Card 2")
+    ]
+    resolved = card_info_batch(details)
+
+    # One identifier per distinct name and set, each card shares its group's record
+    assert scryfall.collections == [[
+        {'name': "Test Card 1"}, {'name': "Test Card 1", 'set': 'ALT'}, {'name': "Test Card 2"}
+    ]]
+    assert sorted(resolved) == [0, 1, 2, 3, 4]
+    assert resolved[0] is resolved[1] is resolved[3]
+    assert resolved[0].set == 'tst'
+    assert resolved[2].set == 'alt'
+
+
+def test_not_found(scryfall: ScryfallStandIn):
+    scryfall.cards.append(get_card("Searchable Card", 'tst'))
+    scryfall.search_only = {"Searchable Card"}
+    details = [get_details("Test Card 3"), get_details("Searchable Card"), get_details("Missing Card")]
+    resolved = card_info_batch(details)
+    assert len(scryfall.collections) == 1
+    assert sorted(resolved) == [0]
+
+    # Cards left out of the batch are found by the individual search, or fail as not found
+    found = [card_info(d['name'], d['set']) for i, d in enumerate(details) if i not in resolved]
+    assert len(scryfall.searches) == 2
+    assert isinstance(found[0], CardRecord) and found[0].name == "Searchable Card"
+    assert isinstance(found[1], CardLookupError) and found[1].kind == LookupFailure.NotFound
+
+
+def test_basic_land(scryfall: ScryfallStandIn):
+    resolved = card_info_batch([get_details("Forest", 'tst'), get_details("Test Card 4")])
+    assert resolved[0].layout == 'basic' and resolved[0].set == 'TST'
+    assert scryfall.collections == [[{'name': "Test Card 4"}]]
+
+
+def test_language_bypass(scryfall: ScryfallStandIn, monkeypatch):
+    monkeypatch.setattr(cfg, 'lang', 'jp')
+    resolved = card_info_batch([get_details("Test Card 5"), get_details("Test Card 6", 'tst'), get_details("Plains")])
+    assert scryfall.requests == []
+    assert list(resolved) == [2]
+
+
+def test_ascending_bypass(scryfall: ScryfallStandIn, monkeypatch):
+    monkeypatch.setattr(cfg, 'scry_ascending', True)
+    details = [get_details("Test Card 7"), get_details("Test Card 8", 'tst')]
+    resolved = card_info_batch(details)
+
+    # Only cards with a set code are batched, the rest are searched oldest first
+    assert scryfall.collections == [[{'name': "Test Card 8", 'set': 'tst'}]]
+    assert list(resolved) == [1]
+    assert isinstance(card_info(details[0]['name'], details[0]['set']), CardRecord)
+    assert len(scryfall.searches) == 1 and 'order=released&dir=asc' in scryfall.searches[0]
+
+
+@pytest.mark.parametrize('status, body, kind', [
+    (503, "<html><body>Service Unavailable</body></html>", LookupFailure.Network),
+    (502, "", LookupFailure.Network),
+    (429, "<html>Too Many Requests</html>", LookupFailure.RateLimited),
+    (403, "<html>Forbidden</html>", LookupFailure.Network)
+])
+def test_error_page(scryfall: ScryfallStandIn, monkeypatch, status: int, body: str, kind: LookupFailure):
+    # Error pages aren't JSON, the failure is classified by status instead of as invalid data
+    monkeypatch.setattr(client, 'retries', 1)
+    scryfall.errors = {"Test Card 9": (status, body)}
+    result = get_card_search("Test Card 9")
+    assert isinstance(result, CardLookupError) and result.kind == kind
@@ -0,0 +1,117 @@
+"""
+SYMBOL TABLE TESTS
+Checks when the set symbol table and symbol colors are built again, run with:
+python -m pytest src/tests/test_symbols.py
+"""
+import threading
+
+import pytest
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+import src.helpers as psd
+from src.format_text import SymbolMapper
+from src.symbols import SymbolTable
+
+# Symbol library with a promo set and aliases
+SYMBOLS = {'MTG': "a", 'MID': {'char': "b"}, 'VOW': "MID", 'DBL': "VOW"}
+
+
+class Source:
+    """
+    Symbol library source, which can load a new library like the constants object does.
+    """
+    def __init__(self, symbols: dict):
+        self.symbols = symbols
+
+    def __call__(self) -> dict:
+        return self.symbols
+
+
+@pytest.fixture
+def source() -> Source:
+    return Source(dict(SYMBOLS))
+
+
+"""
+TESTS
+"""
+
+
+def test_resolve(source: Source):
+    table = SymbolTable(source)
+    assert table['DBL'] is table['VOW'] is source.symbols['MID']
+    assert table.get('PMID') is source.symbols['MID']
+    assert table.get_code('pvow') == 'VOW'
+    assert table.get('ZZZ') is None
+
+
+def test_reload_identity(source: Source):
+    table = SymbolTable(source)
+    compiled = table.symbols
+    fmt = lambda sym, rarity: [rarity]
+    formatted = table.get_formatted(table['MID'], 'rare', 'medium', fmt)
+
+    # The same library is kept, even if its contents changed
+    source.symbols['NEO'] = "c"
+    assert table.symbols is compiled and 'NEO' not in table.symbols
+    assert table.get_formatted(table['MID'], 'rare', 'medium', fmt) is formatted
+
+    # An equal library loaded again is compiled again, dropping formatted symbols
+    source.symbols = dict(source.symbols)
+    assert table.symbols is not compiled and 'NEO' in table.symbols
+    assert table.loaded is source.symbols
+    assert table.formatted == {}
+    assert table.get_formatted(table['MID'], 'rare', 'medium', fmt) is not formatted
+
+
+def test_formatted_foreign_symbol(source: Source):
+    # Symbols which didn't come from the table aren't kept
+    table = SymbolTable(source)
+    fmt = lambda sym, rarity: [rarity]
+    foreign = {'char': "b"}
+    first = table.get_formatted(foreign, 'rare', 'medium', fmt)
+    assert table.get_formatted(foreign, 'rare', 'medium', fmt) is not first
+    assert table.formatted == {}
+
+
+def test_formatted_threads(source: Source):
+    # Threads formatting the same symbol at once all get the stored result
+    table = SymbolTable(source)
+    barrier = threading.Barrier(8)
+
+    def fmt(sym, rarity):
+        barrier.wait(5)
+        return [rarity]
+
+    results = [None] * 8
+
+    def run(i: int):
+        results[i] = table.get_formatted(table['MID'], 'mythic', 'large', fmt)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(r is results[0] for r in results)
+    assert list(table.formatted.values()) == [results[0]]
+
+
+def test_symbol_colors_reload(monkeypatch):
+    # Symbol colors are only built again when a color constant changes
+    colors = []
+    monkeypatch.setattr(psd, 'get_color', lambda c: colors.append(c) or c)
+    mapper = SymbolMapper()
+    loaded = len(colors)
+    mapper.reload()
+    assert mapper.version == 1 and len(colors) == loaded
+
+    monkeypatch.setattr(con, 'clr_w', [1, 2, 3])
+    mapper.reload()
+    assert mapper.version == 2 and mapper.color_map['W'] == [1, 2, 3]
+    mapper.reload()
+    assert mapper.version == 2 and len(colors) == loaded * 2
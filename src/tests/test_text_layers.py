@@ -0,0 +1,285 @@
+"""
+FORMATTED TEXT TESTS
+Checks the formatted text worked out for rules and flavor text, and the action descriptors text layers build
+from it, against a pinned snapshot of the descriptors, along with the formatted text cache, run with:
+python -m pytest src/tests/test_text_layers.py
+
+The snapshot was recorded from the text layer code which built every descriptor by hand, before formatting was
+worked out once into styled runs and paragraphs. Record it again only from logic known to be correct:
+python -m src.tests.test_text_layers record
+"""
+import sys
+import json
+import sqlite3
+from os import path as osp
+from typing import Any, Callable
+from unittest.mock import MagicMock
+
+import pytest
+import photoshop.api as ps
+
+# Run headless
+from src.constants import con
+con.headless = True
+
+# Additional imports
+import src.helpers as psd
+import src.text_layers as tl
+import src.format_text as ft
+from src import formatted_text
+from src.formatted_text import FormattedText, FormattedTextCache, get_formatted_text, get_cache_key
+
+# Pinned descriptors
+PATH_SNAPSHOT = osp.join(con.path_tests, 'fixtures', 'text_layers_snapshot.json')
+
+# String IDs of the char IDs used to build text descriptors
+CHAR_IDS = {
+    'null': 'null', 'From': 'from', 'T   ': 'to', 'Txtt': 'textStyleRange', 'TxtS': 'textStyle',
+    'FntN': 'fontName', 'Sz  ': 'size', '#Pnt': 'pointsUnit', 'Ldng': 'leading', 'Algn': 'align',
+    'Alg ': 'alignmentType', 'TxLr': 'textLayer', 'Ordn': 'ordinal', 'Trgt': 'targetEnum', 'Txt ': 'textKey'
+}
+
+# Symbol color constants, each set to its own name so every run records which color it was given
+SYMBOL_COLORS = [
+    'clr_c', 'clr_w', 'clr_u', 'clr_b', 'clr_bh', 'clr_r', 'clr_g',
+    'clri_c', 'clri_w', 'clri_u', 'clri_b', 'clri_bh', 'clri_r', 'clri_g',
+    'clr_primary', 'clr_secondary'
+]
+
+# Rules text, flavor text and text field options
+TEXT_CASES: dict[str, tuple[str, dict]] = {
+    'rules': ("Flying, vigilance\rWhenever another creature you control dies, draw a card.", {}),
+    'symbols': ("{T}: Add {G}{G}.\r{2/B}{2/B}, {W/P}{G/U/P}: Destroy target creature. {X}{C}{S}{Q}{E}", {}),
+    'hybrid': ("{W/U}{U/B}{B/R}{R/G}{G/W}{W/B}{B/G}{G/U}{U/R}{R/W}{2/W}{2/U}{2/R}{2/G}: Untap this.", {}),
+    'reminder': ("Flash\rWard {2} (Whenever this becomes the target of a spell, counter it unless that "
+                 "player pays {2}.)\rCycling {W/P} ({W/P}, Discard this card: Draw a card.)", {}),
+    'ability word': ("Landfall — Whenever a land enters the battlefield under your control, you gain 1 life.\r"
+                     "Threshold — This gets +1/+1 as long as seven or more cards are in your graveyard.", {}),
+    'bold': ("Flying\r{1}{U}: Scry 1.", {'bold_rules_text': True}),
+    'modal': ("Choose one —\r• Destroy target artifact.\r• {R}: Deal 2 damage to any target.", {}),
+    'flavor': ("Haste", {'flavor': "The spark of war ignites."}),
+    'flavor asterisks': ("Trample", {'flavor': "*Monstrosity 3* — The *beast* awakens."}),
+    'flavor quote': ("Lifelink (Damage dealt by this creature also causes you to gain that much life.)", {
+        'flavor': "\"Even in death, there is order.\"\n—Ayli, Eternal Pilgrim", 'right_align_quote': True
+    }),
+    'flavor color': ("{T}: Add {C}.", {'flavor': "\"Power is power.\"\n—Unknown", 'flavor_color': 'flavor'}),
+    'flavor only': ("", {'flavor': "Some things are better left unsaid."}),
+    'centered': ("Defender\rReach", {'centered': True, 'flavor': "A wall of vines."}),
+    'leads': ("Vigilance\rMenace", {'line_break_lead': 2.5, 'flavor_text_lead': 6, 'flavor': "Onward."}),
+    'unknown symbol': ("{T}: Add {U}. {ZZZ} stops the scan before {W}.", {})
+}
+
+
+class RecordingDescriptor:
+    """
+    Action descriptor, list or reference storing what was put into it. Objects are copied when put, like
+    Photoshop does, so later changes to a descriptor don't change the copies already put elsewhere.
+    """
+    def __init__(self):
+        self.values: dict[str, Any] = {}
+        self.items: list[Any] = []
+
+    def __getattr__(self, name: str) -> Callable:
+        # Photoshop method names aren't case-sensitive
+        if name[0].isupper():
+            return getattr(self, name[0].lower() + name[1:])
+        raise AttributeError(name)
+
+    def putString(self, key: str, value: str):
+        self.values[key] = value
+
+    def putInteger(self, key: str, value: int):
+        self.values[key] = value
+
+    def putBoolean(self, key: str, value: bool):
+        self.values[key] = value
+
+    def putUnitDouble(self, key: str, unit: str, value: float):
+        self.values[key] = [unit, value]
+
+    def putEnumerated(self, key: str, enum_type: str, value: str):
+        self.values[key] = [enum_type, value]
+
+    def putReference(self, key: str, value: 'RecordingDescriptor'):
+        self.values[key] = value.data
+
+    def putList(self, key: str, value: 'RecordingDescriptor'):
+        self.values[key] = value.data
+
+    def putObject(self, key: str, *args):
+        # Descriptors take a key, class and value, lists take a class and value
+        if len(args) == 2:
+            self.values[key] = args[1].data
+        else:
+            self.items.append(args[0].data)
+
+    @property
+    def data(self) -> Any:
+        return json.loads(json.dumps(self.items if self.items else self.values))
+
+
+"""
+UTILITIES
+"""
+
+
+def record_text(contents: str, **kwargs) -> dict:
+    """
+    Format a text field, recording the descriptor sent to Photoshop. Must be called with patch_photoshop active.
+    @param contents: Rules text.
+    @param kwargs: Text field options.
+    @return: Descriptor of the text layer contents, with every color given as the name of the color it was.
+    """
+    layer = MagicMock()
+    field = tl.FormattedTextField(layer, contents, color='text', font_size=10, **kwargs)
+    field.format_text()
+    (_, desc, _), _ = tl.app.executeAction.call_args
+    return desc.data['to']
+
+
+def patch_photoshop(patch: Callable[[Any, str, Any], None]) -> None:
+    """
+    Replace the Photoshop calls used to build text descriptors with recording ones.
+    @param patch: Function setting an attribute on an object, ex: monkeypatch.setattr
+    """
+    for module in (tl, ft):
+        patch(module, 'sID', lambda s: s)
+        patch(module, 'cID', lambda c: CHAR_IDS[c])
+    patch(tl, 'app', MagicMock())
+    for name in ('ActionDescriptor', 'ActionList', 'ActionReference'):
+        patch(ps, name, RecordingDescriptor)
+
+    # Colors are recorded by name
+    for name in SYMBOL_COLORS:
+        patch(con, name, name)
+    patch(psd, 'get_color', lambda color: color)
+    patch(psd, 'apply_color', lambda desc, color: desc.putString('color', color))
+    patch(psd, 'get_text_scale_factor', lambda layer: 1)
+    patch(ft, 'sym', ft.SymbolMapper())
+
+
+def record() -> None:
+    """
+    Record the snapshot of every text case.
+    """
+    patch_photoshop(setattr)
+    snapshot = {name: record_text(contents, **kwargs) for name, (contents, kwargs) in TEXT_CASES.items()}
+    with open(PATH_SNAPSHOT, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=1, ensure_ascii=False)
+
+
+def get_text(contents: str) -> FormattedText:
+    """
+    Format rules text with the default settings, without the cache.
+    @param contents: Rules text.
+    @return: Formatted text.
+    """
+    return formatted_text.format_text(contents, '', False, False, False, 0, 0)
+
+
+@pytest.fixture(scope='module')
+def snapshot() -> dict:
+    with open(PATH_SNAPSHOT, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def recording(monkeypatch, tmp_path) -> None:
+    patch_photoshop(monkeypatch.setattr)
+    cache = FormattedTextCache(str(tmp_path / 'text_cache.db'), 1024 * 1024)
+    monkeypatch.setattr(formatted_text, 'text_cache', cache)
+
+
+"""
+TESTS
+"""
+
+
+@pytest.mark.parametrize('name', list(TEXT_CASES))
+def test_descriptors(recording, snapshot: dict, name: str):
+    contents, kwargs = TEXT_CASES[name]
+    assert record_text(contents, **kwargs) == snapshot[name]
+
+    # Formatted text from the cache builds the same descriptors
+    assert record_text(contents, **kwargs) == snapshot[name]
+
+
+@pytest.mark.parametrize('name', list(TEXT_CASES))
+def test_runs(recording, snapshot: dict, name: str):
+    # Styled runs and paragraphs hold the ranges, fonts, colors and paragraph styles of the pinned descriptors
+    contents, kwargs = TEXT_CASES[name]
+    field = tl.FormattedTextField(MagicMock(), contents, color='text', font_size=10, **kwargs)
+    text = field.text_details
+    pinned = snapshot[name]
+    assert text['input_string'] == pinned['textKey']
+    assert [
+        [run['start'], run['end'], run['font'], field.get_run_color(run['color'])] for run in text['styles']
+    ] == [[
+        r['from'], r['to'], r['textStyle']['fontPostScriptName'], r['textStyle']['color']
+    ] for r in pinned['textStyleRange']]
+    assert [[p['start'], p['end'], sorted(p['style'])] for p in text['paragraphs']] == [
+        [p['from'], p['to'], sorted(p['paragraphStyle'])] for p in pinned['paragraphStyleRange']
+    ]
+
+
+def test_cache_eviction(monkeypatch, tmp_path):
+    # Texts least recently used are dropped from disk once it's over the cap
+    clock = iter(range(1000))
+    monkeypatch.setattr(formatted_text.time, 'time', lambda: next(clock))
+    texts = {f"key{n}": get_text(f"Draw {n} cards.") for n in range(4)}
+    size = len(json.dumps(texts['key0'], separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+    cache = FormattedTextCache(str(tmp_path / 'text_cache.db'), size * 3, memory_size=1)
+    for key in ['key0', 'key1', 'key2']:
+        cache.put(key, texts[key])
+    assert cache.size == size * 3
+
+    # Reading a text from disk marks it as used
+    cache.entries.clear()
+    assert cache.get('key0') == texts['key0']
+    cache.put('key3', texts['key3'])
+    stored = [key for key, in cache.connection.execute("SELECT key FROM texts ORDER BY key")]
+    assert stored == ['key0', 'key2', 'key3']
+
+    # The size total follows every change
+    cache.put('key3', get_text("Draw a card, then discard a card."))
+    assert cache.size == sum(n for n, in cache.connection.execute("SELECT size FROM texts"))
+    assert cache.size <= size * 3
+
+
+def test_cache_upgrade(tmp_path):
+    # Texts stored before the cache had a size cap are kept and counted
+    path = str(tmp_path / 'text_cache.db')
+    text = get_text("Vigilance")
+    data = json.dumps(text, separators=(',', ':'), ensure_ascii=False)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE texts (key TEXT PRIMARY KEY, data TEXT)")
+    db.execute("INSERT INTO texts VALUES (?, ?)", ('key', data))
+    db.commit()
+    db.close()
+    cache = FormattedTextCache(path, 1024 * 1024)
+    assert cache.get('key') == text
+    assert cache.size == len(data.encode('utf-8'))
+
+
+def test_symbols_digest(monkeypatch):
+    # The symbol dictionary is only hashed again once a new one is loaded
+    monkeypatch.setattr(formatted_text, 'symbols_digest', (None, ''))
+    key = get_cache_key("{T}: Add {C}.", "", [])
+    digest = formatted_text.symbols_digest
+    assert get_cache_key("{T}: Add {C}.", "", []) == key and formatted_text.symbols_digest is digest
+    monkeypatch.setattr(con, 'symbols', {**con.symbols, '{C}': "oc2"})
+    assert get_cache_key("{T}: Add {C}.", "", []) != key
+    assert formatted_text.symbols_digest[0] is con.symbols
+
+
+def test_cache_settings(recording):
+    # Each combination of text and settings is formatted on its own
+    plain = get_formatted_text("Flying", "Soar.")
+    bold = get_formatted_text("Flying", "Soar.", bold_rules_text=True)
+    assert plain is not bold and plain['styles'] != bold['styles']
+    assert get_formatted_text("Flying", "Soar.") is plain
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['record']:
+        record()
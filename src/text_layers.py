@@ -11,6 +11,8 @@ import src.helpers as psd
 from src.constants import con
 from src.settings import cfg
 from src import format_text as ft
+from src.__console__ import console
+from src.formatted_text import FormattedText, ColorRef, get_formatted_text
 
 # QOL Definitions
 app = ps.Application()
@@ -101,36 +103,16 @@ class FormattedTextField (TextField):
     """
 
     @cached_property
-    def text_details(self) -> dict:
-
-        # Generate italic text arrays from things in (parentheses), ability words, and the given flavor text
-        italic_text = ft.generate_italics(self.contents)
-
-        # Add flavor text to italics array
-        flavor_text = self.flavor_text
-        if self.flavor_text.count("*") >= 2:
-            # Don't italicize text between asterisk
-            flavor_text_split = self.flavor_text.split("*")
-            italic_text.extend([v for i, v in enumerate(flavor_text_split) if not i % 2 and not v == ''])
-            flavor_text = ''.join(flavor_text_split)
-        elif self.flavor_text:
-            # Regular flavor text
-            italic_text.append(self.flavor_text)
-
-        # Locate symbols and update the input string
-        ret = ft.locate_symbols(self.contents)
-        input_string = f"{ret['input_string']}\r{flavor_text}"
-
-        # Locate italics text indices
-        italics_indices = ft.locate_italics(input_string, italic_text)
-
-        return {
-            'input_string': input_string,
-            'symbol_indices': ret['symbol_indices'],
-            'italics_indices': italics_indices,
-            'rules_text': ret['input_string'],
-            'flavor_text': flavor_text,
-        }
+    def text_details(self) -> FormattedText:
+        return get_formatted_text(
+            self.contents,
+            self.flavor_text,
+            bold_rules_text=self.bold_rules_text,
+            right_align_quote=self.right_align_quote,
+            flavor_color=self.flavor_color is not None,
+            line_break_lead=self.line_break_lead,
+            flavor_text_lead=self.flavor_text_lead
+        )
 
     @property
     def italics_indices(self) -> list[dict]:
@@ -138,7 +120,10 @@ class FormattedTextField (TextField):
 
     @property
     def symbol_indices(self) -> list[dict]:
-        return self.text_details['symbol_indices']
+        return [{
+            'index': symbol['index'],
+            'colors': ft.get_symbol_colors(symbol['symbol'], symbol['slots'])
+        } for symbol in self.text_details['symbol_indices']]
 
     @property
     def input(self) -> str:
@@ -217,197 +202,53 @@ class FormattedTextField (TextField):
     METHODS
     """
 
+    def get_run_color(self, color: ColorRef) -> ps.SolidColor:
+        """
+        Get the color of a styled run.
+        @param color: Color reference of the run.
+        @return: SolidColor object.
+        """
+        if color == 'text':
+            return self.color
+        if color == 'flavor':
+            return self.flavor_color
+        return ft.get_slot_color(color)
+
     def format_text(self):
         """
         Inserts the given string into the active layer and formats it according to defined parameters with symbols
-        from the NDPMTG font.
+        from the NDPMTG font. Formatting is worked out once per text and settings, this only builds the descriptors.
         """
-        # Prepare action descriptor and reference variables
-        primary_action_descriptor = ps.ActionDescriptor()
-        primary_action_list = ps.ActionList()
-        desc119 = ps.ActionDescriptor()
-        desc26 = ps.ActionDescriptor()
-        desc25 = ps.ActionDescriptor()
-        ref101 = ps.ActionReference()
-        desc141 = ps.ActionDescriptor()
-        desc142 = ps.ActionDescriptor()
-        desc143 = ps.ActionDescriptor()
-        desc144 = ps.ActionDescriptor()
-        desc145 = ps.ActionDescriptor()
-        list13 = ps.ActionList()
-        list14 = ps.ActionList()
-        list15 = ps.ActionList()
-        idkerningRange = sID("kerningRange")
-        idparagraphStyleRange = sID("paragraphStyleRange")
-        idfontPostScriptName = sID("fontPostScriptName")
-        idfirstLineIndent = sID("firstLineIndent")
-        idparagraphStyle = sID("paragraphStyle")
-        idautoLeading = sID("autoLeading")
-        idstartIndent = sID("startIndent")
-        idspaceBefore = sID("spaceBefore")
-        idleadingType = sID("leadingType")
-        idspaceAfter = sID("spaceAfter")
-        idTxtS = sID("textStyle")
-        idTxLr = sID("textLayer")
-        idTo = sID("to")
-        idFntN = sID("fontName")
-        idSz = sID("size")
-        idPnt = sID("pointsUnit")
-        idLdng = sID("leading")
-        idTxtt = sID("textStyleRange")
-        idFrom = sID("from")
+        # Ensure symbol colors are up-to-date
+        ft.sym.reload()
+        if self.text_details['unknown_symbol']:
+            console.update(f"Encountered a symbol I don't recognize: {self.text_details['unknown_symbol']}")
 
         # Spin up the text insertion action
-        ref101.putEnumerated(idTxLr, sID("ordinal"), sID("targetEnum"))
-        desc119.putReference(cID("null"), ref101)
+        primary_action_descriptor = ps.ActionDescriptor()
         primary_action_descriptor.putString(sID("textKey"), self.input)
-        desc25.putInteger(idFrom, 0)
-        desc25.putInteger(idTo, len(self.input))
-        desc26.putString(idfontPostScriptName, con.font_rules_text)  # MPlantin default
-        desc26.putString(idFntN, con.font_rules_text)  # MPlantin default
-        desc26.putUnitDouble(idSz, idPnt, self.font_size)
-        psd.apply_color(desc26, self.color)
-        desc26.putBoolean(idautoLeading, False)
-        desc26.putUnitDouble(idLdng, idPnt, self.font_size)
-        desc25.putObject(idTxtS, idTxtS, desc26)
-        current_layer_ref = desc25
-
-        # Bold the contents if necessary
-        if self.bold_rules_text and self.flavor_index != 0:
-            bold_action1 = ps.ActionDescriptor()
-            bold_action2 = ps.ActionDescriptor()
-            contents_index = len(self.input) - 1 if self.flavor_index < 0 else self.flavor_index - 1
-            primary_action_list.putObject(idTxtt, current_layer_ref)
-            bold_action1.putInteger(idFrom, 0)  # bold start index
-            bold_action1.putInteger(idTo, contents_index)  # bold end index
-            bold_action2.putString(idfontPostScriptName, con.font_rules_text_bold)
-            bold_action2.putString(idFntN, con.font_rules_text_bold)
-            bold_action2.putUnitDouble(idSz, idPnt, self.font_size)
-            psd.apply_color(bold_action2, self.color)
-            bold_action2.putBoolean(idautoLeading, False)
-            bold_action2.putUnitDouble(idLdng, idPnt, self.font_size)
-            bold_action1.putObject(idTxtS, idTxtS, bold_action2)
-            current_layer_ref = bold_action1
-
-        # Italicize text from our italics indices
-        for italics_index in self.italics_indices:
-            italics_action1 = ps.ActionDescriptor()
-            italics_action2 = ps.ActionDescriptor()
-            primary_action_list.putObject(idTxtt, current_layer_ref)
-            italics_action1.putInteger(idFrom, italics_index['start_index'])  # italics start index
-            italics_action1.putInteger(idTo, italics_index['end_index'])  # italics end index
-            italics_action2.putString(idfontPostScriptName, con.font_rules_text_italic)
-            italics_action2.putString(idFntN, con.font_rules_text_italic)
-            italics_action2.putUnitDouble(idSz, idPnt, self.font_size)
-            psd.apply_color(italics_action2, self.color)
-            italics_action2.putBoolean(idautoLeading, False)
-            italics_action2.putUnitDouble(idLdng, idPnt, self.font_size)
-            italics_action1.putObject(idTxtS, idTxtS, italics_action2)
-            current_layer_ref = italics_action1
-
-        # Format each symbol correctly
-        for symbol_index in self.symbol_indices:
-            current_layer_ref = ft.format_symbol(
-                primary_action_list=primary_action_list,
-                starting_layer_ref=current_layer_ref,
-                symbol_index=symbol_index['index'],
-                symbol_colors=symbol_index['colors'],
-                layer_font_size=self.font_size,
-            )
 
         # Insert actions for bold, italics, and symbol formatting
-        primary_action_list.putObject(idTxtt, current_layer_ref)
-        primary_action_descriptor.putList(idTxtt, primary_action_list)
+        idTxtt = sID("textStyleRange")
+        style_list = ps.ActionList()
+        for run in self.text_details['styles']:
+            style_list.putObject(idTxtt, ft.get_text_style_range(run, self.font_size, self.get_run_color(run['color'])))
+        primary_action_descriptor.putList(idTxtt, style_list)
 
         # Paragraph formatting
-        desc141.putInteger(idFrom, 0)
-        desc141.putInteger(idTo, len(self.input))  # input string length
-        desc142.putUnitDouble(idfirstLineIndent, idPnt, 0)
-        desc142.putUnitDouble(idstartIndent, idPnt, 0)
-        desc142.putUnitDouble(sID("endIndent"), idPnt, 0)
-        desc142.putUnitDouble(idspaceBefore, idPnt, self.line_break_lead)
-        desc142.putUnitDouble(idspaceAfter, idPnt, 0)
-        desc142.putInteger(sID("dropCapMultiplier"), 1)
-        desc142.putEnumerated(idleadingType, idleadingType, sID("leadingBelow"))
-        desc143.putString(idfontPostScriptName, con.font_mana)  # NDPMTG default
-        desc143.putString(idFntN, con.font_rules_text)  # MPlantin default
-        desc143.putBoolean(idautoLeading, False)
-        primary_action_descriptor.putList(idparagraphStyleRange, list13)
-        primary_action_descriptor.putList(idkerningRange, list14)
-
-        # Adjust formatting for modal card with bullet points
-        if "\u2022" in self.input:
-            startIndexBullet = self.input.find("\u2022")
-            endIndexBullet = self.input.rindex("\u2022")
-            desc141.putInteger(idFrom, startIndexBullet)
-            desc141.putInteger(idTo, endIndexBullet + 1)
-            desc142.putUnitDouble(idfirstLineIndent, idPnt, -con.modal_indent)  # negative modal indent
-            desc142.putUnitDouble(idstartIndent, idPnt, con.modal_indent)  # modal indent
-            desc142.putUnitDouble(idspaceBefore, idPnt, 1)
-            desc142.putUnitDouble(idspaceAfter, idPnt, 0)
-            desc143.putString(idfontPostScriptName, con.font_mana)  # NDPMTG default
-            desc143.putString(idFntN, con.font_rules_text)  # MPlantin default
-            desc143.putUnitDouble(idSz, idPnt, 12)
-            desc143.putBoolean(idautoLeading, False)
-            desc142.putObject(sID("defaultStyle"), idTxtS, desc143)
-            desc141.putObject(idparagraphStyle, idparagraphStyle, desc142)
-            list13.putObject(idparagraphStyleRange, desc141)
-            primary_action_descriptor.putList(idparagraphStyleRange, list13)
-            primary_action_descriptor.putList(idkerningRange, list14)
-
-        # Flavor text actions
-        if self.flavor_index >= 0:
-            # Add linebreak spacing between rules and flavor text
-            desc141.putInteger(idFrom, self.flavor_index + 3)
-            desc141.putInteger(idTo, self.flavor_index + 4)
-            desc142.putUnitDouble(idfirstLineIndent, idPnt, 0)
-            desc142.putUnitDouble(sID("impliedFirstLineIndent"), idPnt, 0)
-            desc142.putUnitDouble(idstartIndent, idPnt, 0)
-            desc142.putUnitDouble(sID("impliedStartIndent"), idPnt, 0)
-            desc142.putUnitDouble(idspaceBefore, idPnt, self.flavor_text_lead)  # Space between rules and flavor text
-            desc141.putObject(idparagraphStyle, idparagraphStyle, desc142)
-            list13.putObject(idparagraphStyleRange, desc141)
-            primary_action_descriptor.putList(idparagraphStyleRange, list13)
-            primary_action_descriptor.putList(idkerningRange, list14)
-
-            # Adjust flavor text color
-            if self.flavor_color:
-                desc144.PutInteger(sID("from"), self.flavor_index)
-                desc144.PutInteger(sID("to"), len(self.input))
-                desc145.putString(idfontPostScriptName, con.font_rules_text_italic)  # MPlantin italic default
-                desc145.putString(idFntN, con.font_rules_text_italic)  # MPlantin italic default
-                desc145.putUnitDouble(idSz, idPnt, self.font_size)
-                desc145.putBoolean(idautoLeading, False)
-                desc145.putUnitDouble(idLdng, idPnt, self.font_size)
-                psd.apply_color(desc145, self.flavor_color)
-                desc144.PutObject(sID("textStyle"), sID("textStyle"), desc145)
-                list15.PutObject(sID("textStyleRange"), desc144)
-                primary_action_descriptor.putList(sID("textStyleRange"), list15)
-
-        # Quote actions flavor text
-        if self.quote_index >= 0:
-            # Adjust line break spacing if there's a line break in the flavor text
-            desc141.putInteger(idFrom, self.quote_index + 3)
-            desc141.putInteger(idTo, len(self.input))
-            desc142.putUnitDouble(idspaceBefore, idPnt, 0)
-            desc141.putObject(idparagraphStyle, idparagraphStyle, desc142)
-            list13.putObject(idparagraphStyleRange, desc141)
-
-            # Optional, align quote credit to right
-            if self.right_align_quote and self.input.find('"\r—') >= 0:
-                # Get start and ending index of quotation credit
-                index_start = self.input.find('"\r—') + 2
-                index_end = len(self.input) - 1
-
-                # Align this part, disable justification reset
-                ft.align_formatted_text_right(list13, index_start, index_end)
-
-            # Add quote actions to primary action
-            primary_action_descriptor.putList(idparagraphStyleRange, list13)
-            primary_action_descriptor.putList(idkerningRange, list14)
+        idparagraphStyleRange = sID("paragraphStyleRange")
+        paragraph_list = ps.ActionList()
+        for paragraph in self.text_details['paragraphs']:
+            paragraph_list.putObject(idparagraphStyleRange, ft.get_paragraph_style_range(paragraph))
+        primary_action_descriptor.putList(idparagraphStyleRange, paragraph_list)
+        primary_action_descriptor.putList(sID("kerningRange"), ps.ActionList())
 
         # Push changes to text layer
-        desc119.putObject(idTo, idTxLr, primary_action_descriptor)
+        desc119 = ps.ActionDescriptor()
+        ref101 = ps.ActionReference()
+        ref101.putEnumerated(sID("textLayer"), sID("ordinal"), sID("targetEnum"))
+        desc119.putReference(cID("null"), ref101)
+        desc119.putObject(sID("to"), sID("textLayer"), primary_action_descriptor)
         app.executeAction(sID("set"), desc119, NO_DIALOG)
         app.activeDocument.activeLayer.textItem.hyphenation = False
 
@@ -16,6 +16,7 @@ from typing import Callable, Optional
 import requests
 
 from src.constants import con
+from src.utils.http import transport
 
 CHUNK_SIZE = 1024 * 1024  # 1 MB
 
@@ -85,61 +86,62 @@ def download_google(
     Path(os.path.dirname(Path(path))).mkdir(mode=511, parents=True, exist_ok=True)
     url = "https://drive.google.com/uc?id={id}".format(id=file_id)
     url_origin = url
-    sess = requests.session()
     header = con.http_header.copy()
 
-    # Cookies
-    cookies_file = osp.join(con.path_logs, "cookies.json")
-    if osp.exists(cookies_file) and use_cookies:
-        with open(cookies_file) as f:
-            cookies = json.load(f)
-        for k, v in cookies:
-            sess.cookies[k] = v
+    # Own session, so the confirmation cookies follow every redirect and stay out of the shared transport
+    with requests.session() as sess:
+        # Cookies
+        cookies_file = osp.join(con.path_logs, "cookies.json")
+        if osp.exists(cookies_file) and use_cookies:
+            with open(cookies_file) as f:
+                cookies = json.load(f)
+            for k, v in cookies:
+                sess.cookies[k] = v
 
-    # Get file resource
-    while True:
-        res = sess.get(url, headers=header, stream=True, verify=True)
+        # Get file resource
+        while True:
+            res = sess.get(url, headers=header, stream=True, verify=True, timeout=con.http_timeout)
 
-        # Save cookies
-        with open(cookies_file, "w") as f:
-            cookies = [
-                (k, v)
-                for k, v in sess.cookies.items()
-                if not k.startswith("download_warning_")
-            ]
-            json.dump(cookies, f, indent=2)
+            # Save cookies
+            with open(cookies_file, "w") as f:
+                cookies = [
+                    (k, v)
+                    for k, v in sess.cookies.items()
+                    if not k.startswith("download_warning_")
+                ]
+                json.dump(cookies, f, indent=2)
 
-        # Is this the right file?
-        if "Content-Disposition" in res.headers:
-            break
+            # Is this the right file?
+            if "Content-Disposition" in res.headers:
+                break
 
-        # Need to redirect with confirmation
-        try:
-            url = get_url_from_gdrive_confirmation(res.text)
-        except RuntimeError as e:
-            print("Access denied with the following error:")
-            error = "\n".join(textwrap.wrap(str(e)))
-            print("\n", error, "\n", file=sys.stderr)
-            print(
-                "You may still be able to access the file from the browser:",
-                file=sys.stderr,
-            )
-            print("\n\t", url_origin, "\n", file=sys.stderr)
-            return False
+            # Need to redirect with confirmation
+            try:
+                url = get_url_from_gdrive_confirmation(res.text)
+            except RuntimeError as e:
+                print("Access denied with the following error:")
+                error = "\n".join(textwrap.wrap(str(e)))
+                print("\n", error, "\n", file=sys.stderr)
+                print(
+                    "You may still be able to access the file from the browser:",
+                    file=sys.stderr,
+                )
+                print("\n\t", url_origin, "\n", file=sys.stderr)
+                return False
 
-    # Get temp file
-    details = get_temp_file(res, sess, path, url)
-    file, current, res = details['file'], details['current'], details['res']
+        # Get temp file
+        details = get_temp_file(res, path, url, sess)
+        file, current, res = details['file'], details['current'], details['res']
 
-    # Let the user know its downloading
-    print("Downloading...", file=sys.stderr)
-    if current != 0:
-        print("Resume:", file, file=sys.stderr)
-    print("From:", url_origin, file=sys.stderr)
-    print("To:", path, file=sys.stderr)
+        # Let the user know its downloading
+        print("Downloading...", file=sys.stderr)
+        if current != 0:
+            print("Resume:", file, file=sys.stderr)
+        print("From:", url_origin, file=sys.stderr)
+        print("To:", path, file=sys.stderr)
 
-    # Start the download
-    return download_file(file, res, sess, path, callback)
+        # Start the download
+        return download_file(file, res, path, callback)
 
 
 def download_s3(temp: dict, callback: Callable) -> bool:
@@ -153,13 +155,12 @@ def download_s3(temp: dict, callback: Callable) -> bool:
     key = f"{temp['plugin']}/{temp['filename']}" if temp['plugin'] else temp['filename']
     url = f"{con.cloudfront_url}/{key}"
 
-    # Establish session
-    sess = requests.session()
+    # Use the pooled session for this host
     header = con.http_header.copy()
-    res = sess.get(url, headers=header, stream=True, verify=True)
+    res = transport.get(url, headers=header, stream=True, verify=True)
 
     # Get temp file
-    details = get_temp_file(res, sess, temp['path'], url)
+    details = get_temp_file(res, temp['path'], url)
     file, current, res = details['file'], details['current'], details['res']
 
     # Let the user know its downloading
@@ -170,7 +171,7 @@ def download_s3(temp: dict, callback: Callable) -> bool:
     print("To:", temp['path'], file=sys.stderr)
 
     # Start the download
-    return download_file(file, res, sess, temp['path'], callback)
+    return download_file(file, res, temp['path'], callback)
 
 
 def download_s3_file(filename: str, path: str) -> bool:
@@ -183,29 +184,28 @@ def download_s3_file(filename: str, path: str) -> bool:
     # Establish this object's key
     url = f"{con.cloudfront_url}/{filename}"
 
-    # Establish session
-    sess = requests.session()
+    # Use the pooled session for this host
     header = con.http_header.copy()
-    res = sess.get(url, headers=header, stream=True, verify=True)
+    res = transport.get(url, headers=header, stream=True, verify=True)
 
     # Get temp file
-    details = get_temp_file(res, sess, path, url)
+    details = get_temp_file(res, path, url)
     file, current, res = details['file'], details['current'], details['res']
-    return download_file(file, res, sess, path)
+    return download_file(file, res, path)
 
 
 def get_temp_file(
         res: requests.Response,
-        sess: requests.Session,
         path: str,
         url: str,
+        sess: Optional[requests.Session] = None
 ) -> dict:
     """
     Check for an existing temporary file or create a new one.
     @param res: Planned download request.
-    @param sess: Current download session.
     @param path: Planned path name to the completed download.
     @param url: If resumable, url to generate a new download request.
+    @param sess: Session the download was started with, the pooled session for the host if not provided.
     @return: Dict containing temp file path, new download request, and total bytes downloaded.
     """
     existing_tmp_files = []
@@ -231,7 +231,11 @@ def get_temp_file(
     with open(tmp_file, "ab") as f:
         if tmp_file is not None and f.tell() != 0:
             header["Range"] = "bytes={}-".format(f.tell())
-            res = sess.get(url, headers=header, stream=True, verify=True)
+            res.close()
+            if sess:
+                res = sess.get(url, headers=header, stream=True, verify=True, timeout=con.http_timeout)
+            else:
+                res = transport.get(url, headers=header, stream=True, verify=True)
     return {
         'file': tmp_file,
         'res': res,
@@ -242,7 +246,6 @@ def get_temp_file(
 def download_file(
         file: str,
         res: requests.Response,
-        sess: requests.Session,
         path: Optional[str] = None,
         callback: Optional[Callable] = None
 ) -> bool:
@@ -250,7 +253,6 @@ def download_file(
     Download file as a temporary file, then rename to its correct filename.
     @param file: File path to download to.
     @param res: Download request.
-    @param sess: Download session.
     @param path: Final path to save the completed temporary file.
     @param callback: Callback to update download progress.
     @return: True if download completed without error, otherwise False.
@@ -271,5 +273,6 @@ def download_file(
         print(e, file=sys.stderr)
         return False
     finally:
-        sess.close()
+        # Release the connection back to the pool
+        res.close()
     return True
@@ -0,0 +1,341 @@
+"""
+Persistent HTTP Response Cache
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union, Iterable
+
+import requests
+
+from src.client import client
+from src.constants import con
+from src.utils.concurrency import SingleFlight
+
+
+class ResponseCache:
+    """
+    Disk backed cache of JSON API responses with per-endpoint TTLs, conditional revalidation
+    and least recently used eviction once the cache grows past its size cap.
+    Not found responses are also kept, for a shorter time, so repeated misses fail instantly.
+    @param path: Path to the cache database file.
+    @param ttl: Dict mapping URL fragments to the number of seconds a matching response stays fresh.
+    @param max_size: Maximum total size of stored responses in bytes.
+    @param negative_ttl: Seconds a not found response stays fresh.
+    """
+    def __init__(self, path: str, ttl: dict[str, int], max_size: int, negative_ttl: int = 0):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Counters for the current session
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared across threads
+        if not hasattr(self._local, 'connection'):
+            Path(os.path.dirname(self.path)).mkdir(mode=511, parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, body BLOB, "
+                "etag TEXT, modified TEXT, stored REAL, accessed REAL, size INTEGER, status INTEGER DEFAULT 200)"
+            )
+            if 'status' not in [c[1] for c in db.execute("PRAGMA table_info(responses)")]:
+                # Added after the first version of the cache
+                db.execute("ALTER TABLE responses ADD COLUMN status INTEGER DEFAULT 200")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)")
+            db.commit()
+            self._create_totals(db)
+            self._local.connection = db
+        return self._local.connection
+
+    @property
+    def size(self) -> int:
+        row = self.connection.execute("SELECT value FROM totals WHERE name = 'size'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.revalidated} revalidated"
+
+    def get_ttl(self, url: str) -> int:
+        """
+        Get the TTL of a URL from the most specific endpoint fragment it contains.
+        @param url: Request URL.
+        @return: Seconds a response stays fresh, 0 if it shouldn't be cached.
+        """
+        matches = [k for k in self.ttl if k in url]
+        return self.ttl[max(matches, key=len)] if matches else 0
+
+    def request_json(
+        self,
+        url: str,
+        payload: Optional[dict] = None,
+        headers: Optional[dict] = None
+    ) -> Union[dict, list]:
+        """
+        Make a GET request, or a POST request if a JSON payload is given, using the cached response when possible.
+        Server errors, and error responses which aren't JSON, raise an HTTPError.
+        @param url: Request URL.
+        @param payload: JSON body to POST.
+        @param headers: Request headers.
+        @return: Decoded JSON response.
+        """
+        ttl = self.get_ttl(url)
+        key = self.get_key(url, payload)
+        row = self._get(key) if ttl else None
+        if row and time.time() - row[3] < (ttl if row[4] == 200 else self.negative_ttl):
+            # Fresh response
+            with self._lock:
+                self.hits += 1
+            self._touch(key)
+            return json.loads(row[0])
+
+        # Revalidate a stale response if the server gave us validators
+        headers = dict(headers or {})
+        if row and row[4] != 200:
+            row = None
+        if row and row[1]:
+            headers['If-None-Match'] = row[1]
+        if row and row[2]:
+            headers['If-Modified-Since'] = row[2]
+
+        # Make the request
+        if payload is None:
+            res = client.get(url, headers=headers)
+        else:
+            res = client.post(url, json=payload, headers=headers)
+        if row and res.status_code == 304:
+            with self._lock:
+                self.revalidated += 1
+            self._touch(key, refresh=True)
+            return json.loads(row[0])
+        with self._lock:
+            self.misses += 1
+
+        # Server errors and error pages from proxies aren't JSON, fail as a network error instead
+        if res.status_code >= 500 or (not res.ok and 'json' not in res.headers.get('Content-Type', '')):
+            res.raise_for_status()
+
+        # Only successful and not found responses are stored
+        if ttl and (res.status_code == 200 or (res.status_code == 404 and self.negative_ttl)):
+            self._put(key, url, res)
+        return res.json()
+
+    @staticmethod
+    def get_key(url: str, payload: Optional[dict] = None) -> str:
+        """
+        Get the cache key of a request.
+        @param url: Request URL.
+        @param payload: JSON body of a POST request.
+        @return: Hex digest identifying the request.
+        """
+        if payload is not None:
+            url += json.dumps(payload, sort_keys=True)
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def reset_stats(self) -> None:
+        """
+        Reset the hit and miss counters.
+        """
+        with self._lock:
+            self.hits, self.misses, self.revalidated = 0, 0, 0
+
+    def clear(self) -> None:
+        """
+        Remove every stored response.
+        """
+        with self._lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+            self.connection.execute("VACUUM")
+
+    @staticmethod
+    def _create_totals(db: sqlite3.Connection) -> None:
+        # Running total of stored bytes, kept by triggers in the same transaction as each change
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER)")
+            db.execute(
+                "INSERT OR IGNORE INTO totals SELECT 'size', COALESCE(SUM(size), 0) FROM responses"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN "
+                "UPDATE totals SET value = value + new.size WHERE name = 'size'; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN "
+                "UPDATE totals SET value = value - old.size WHERE name = 'size'; END"
+            )
+            db.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses BEGIN "
+                "UPDATE totals SET value = value - old.size + new.size WHERE name = 'size'; END"
+            )
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+
+    def _get(self, key: str) -> Optional[tuple]:
+        try:
+            return self.connection.execute(
+                "SELECT body, etag, modified, stored, status FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            # Cache is unreadable, go to the network
+            print(e, "\nResponse cache couldn't be read!")
+            return
+
+    def _touch(self, key: str, refresh: bool = False) -> None:
+        now = time.time()
+        query = "UPDATE responses SET accessed = ?, stored = ? WHERE key = ?" if refresh \
+            else "UPDATE responses SET accessed = ? WHERE key = ?"
+        try:
+            with self._lock:
+                self.connection.execute(query, (now, now, key) if refresh else (now, key))
+                self.connection.commit()
+        except sqlite3.Error:
+            pass
+
+    def _put(self, key: str, url: str, res: requests.Response) -> None:
+        now = time.time()
+        body = res.content
+        try:
+            with self._lock:
+                # Upsert rather than replace, so the update trigger sees the size being replaced
+                self.connection.execute(
+                    "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                    "url = excluded.url, body = excluded.body, etag = excluded.etag, modified = excluded.modified, "
+                    "stored = excluded.stored, accessed = excluded.accessed, size = excluded.size, "
+                    "status = excluded.status", (
+                        key, url, body, res.headers.get('ETag'), res.headers.get('Last-Modified'),
+                        now, now, len(body), res.status_code
+                    )
+                )
+                self._evict()
+                self.connection.commit()
+        except sqlite3.Error as e:
+            print(e, "\nResponse couldn't be cached!")
+
+    def _evict(self) -> None:
+        # Drop the least recently used responses until we're under the cap
+        excess = self.size - self.max_size
+        if excess <= 0:
+            return
+        removed, keys = 0, []
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if removed >= excess:
+                break
+            keys.append((key,))
+            removed += size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+
+class ImageCache:
+    """
+    Disk cache of downloaded images named by a hash of their URL, with least recently used
+    files removed once the cache grows past its size cap.
+    @param path: Directory to store images in.
+    @param max_size: Maximum total size of stored images in bytes.
+    """
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self.downloads = SingleFlight()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+
+        # Running total of stored bytes, counted from the directory the first time it's needed
+        self.size: Optional[int] = None
+
+    def get_path(self, url: str) -> str:
+        """
+        Get the path an image is stored at.
+        @param url: Image URL.
+        @return: Path to the image file.
+        """
+        ext = os.path.splitext(urlsplit(url).path)[1] or '.jpg'
+        return os.path.join(self.path, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Get an image from the cache, downloading it if it isn't stored yet.
+        @param url: Image URL.
+        @return: Path to the image file, None if it couldn't be downloaded.
+        """
+        path = self.get_path(url)
+        if os.path.exists(path):
+            # Mark as recently used
+            os.utime(path)
+            return path
+        return self.downloads.do(url, self._download, url, path)
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        """
+        Download images in the background so they're ready when needed.
+        @param urls: Image URLs.
+        """
+        for url in set(urls):
+            if url and not os.path.exists(self.get_path(url)):
+                self.executor.submit(self.get, url)
+
+    def _download(self, url: str, path: str) -> Optional[str]:
+        # Download to a temporary file, move it into place once complete
+        Path(self.path).mkdir(mode=511, parents=True, exist_ok=True)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        try:
+            with client.get(url, stream=True) as res, os.fdopen(fd, 'wb') as f:
+                res.raise_for_status()
+                for chunk in res.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+            os.replace(temp, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            # HTTP request failed
+            if os.path.exists(temp):
+                os.remove(temp)
+            print(e, "\nCouldn't retrieve image!")
+            return
+        self._evict(size)
+        return path
+
+    def _evict(self, added: int) -> None:
+        # Remove the least recently used images once the running total goes over the cap
+        with self._lock:
+            if self.size is not None:
+                self.size += added
+                if self.size <= self.max_size:
+                    return
+            files = []
+            for entry in os.scandir(self.path):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            self.size = sum(f[1] for f in files)
+            for _, size, path in sorted(files):
+                if self.size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    self.size -= size
+                except OSError:
+                    continue
+
+
+# Global caches
+cache = ResponseCache(con.path_http_cache, con.http_cache_ttl, con.http_cache_size, con.http_cache_negative_ttl)
+images = ImageCache(con.path_scans, con.scan_cache_size)
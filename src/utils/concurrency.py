@@ -0,0 +1,100 @@
+"""
+Concurrency Utilities
+"""
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Optional, Callable, Hashable, Any
+
+
+class TokenBucket:
+    """
+    Asyncio rate limiter which allows short bursts up to its capacity while holding a steady average rate.
+    @param rate: Tokens added per second.
+    @param capacity: Maximum tokens that can accumulate, defaults to one second worth of tokens.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available, then consume it.
+        """
+        # Lock must be created inside the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key, so only the first caller does the work
+    and every other caller waits for its result.
+    """
+    def __init__(self):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call a function, or wait for the call already in flight for this key.
+        @param key: Identifies calls which should be shared.
+        @param func: Function to call.
+        @return: Result of the shared call, exceptions are raised to every caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        # Make the call and share the result
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30, retry_after: Optional[str] = None) -> float:
+    """
+    Get the delay before retrying a request, using jittered exponential backoff unless the server told us how long to wait.
+    @param attempt: Number of attempts made so far, starting at 1.
+    @param base: Delay before the first retry in seconds.
+    @param cap: Maximum delay in seconds.
+    @param retry_after: Value of the Retry-After header, either seconds or an HTTP date.
+    @return: Seconds to wait.
+    """
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(cap, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
@@ -0,0 +1,300 @@
+"""
+Offline Font Metrics and Text Layout
+"""
+import os
+import struct
+from functools import cache
+from os import path as osp
+from typing import Optional
+
+from src.constants import con
+
+# Name table IDs worth indexing: family, full name, PostScript name
+NAME_IDS = (1, 4, 6)
+
+# Paragraph and line separators used in Photoshop text
+LINE_BREAKS = ('\r', '\n', '\x03')
+
+
+class FontMetrics:
+    """
+    Glyph advances and vertical metrics read directly from a TrueType or OpenType font file,
+    used to predict how text wraps without asking Photoshop to measure it.
+    @param path: Path to the font file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            data = f.read()
+        tables = get_font_tables(data)
+
+        # Vertical metrics, in font units
+        self.units_per_em = struct.unpack_from('>H', data, tables['head'] + 18)[0]
+        self.ascender, self.descender, self.line_gap = struct.unpack_from('>hhh', data, tables['hhea'] + 4)
+
+        # Advance width of every glyph, glyphs past the last metric share its advance
+        count = struct.unpack_from('>H', data, tables['hhea'] + 34)[0]
+        glyphs = struct.unpack_from('>H', data, tables['maxp'] + 4)[0]
+        advances = [struct.unpack_from('>H', data, tables['hmtx'] + i * 4)[0] for i in range(count)]
+        self.advances = advances + [advances[-1]] * max(glyphs - count, 0)
+
+        # Character map
+        self.cmap = get_character_map(data, tables['cmap'])
+        self.symbol = bool(self.cmap) and min(self.cmap) >= 0xF000
+        self.widths: dict[str, float] = {}
+
+    def get_advance(self, char: str) -> float:
+        """
+        Get the advance width of a character, as a fraction of the font size.
+        @param char: Single character.
+        @return: Advance width in ems.
+        """
+        if char not in self.widths:
+            code = ord(char)
+            glyph = self.cmap.get(code, self.cmap.get(0xF000 + code, 0) if self.symbol else 0)
+            self.widths[char] = self.advances[glyph if glyph < len(self.advances) else 0] / self.units_per_em
+        return self.widths[char]
+
+    def get_width(self, text: str, size: float) -> float:
+        """
+        Get the width of a string of text set on one line.
+        @param text: Text to measure.
+        @param size: Font size.
+        @return: Width in the units of the font size.
+        """
+        return sum(self.get_advance(c) for c in text) * size
+
+    def wrap_text(self, text: str, size: float, width: float) -> list[str]:
+        """
+        Break text into the lines it occupies in a paragraph box, wrapping at spaces like Photoshop does
+        with hyphenation disabled. Words wider than the box are broken between characters.
+        @param text: Text to wrap, paragraphs separated by line breaks.
+        @param size: Font size.
+        @param width: Width of the paragraph box, in the units of the font size.
+        @return: List of lines.
+        """
+        lines, space = [], self.get_advance(' ') * size
+        for paragraph in split_paragraphs(text):
+            line, used = [], 0.0
+            for word in paragraph.split(' '):
+                advance = self.get_width(word, size)
+                needed = advance + (space if line else 0)
+                if line and used + needed > width:
+                    lines.append(' '.join(line))
+                    line, used, needed = [], 0.0, advance
+                while advance > width and len(word) > 1:
+                    # Break an overlong word at the last character that fits
+                    taken, total = 0, 0.0
+                    while taken < len(word) - 1 and total + self.get_advance(word[taken]) * size <= width:
+                        total += self.get_advance(word[taken]) * size
+                        taken += 1
+                    lines.append(word[:max(taken, 1)])
+                    word = word[max(taken, 1):]
+                    advance = needed = self.get_width(word, size)
+                line.append(word)
+                used += needed
+            lines.append(' '.join(line))
+        return lines
+
+    def get_text_height(self, text: str, size: float, width: float, leading: Optional[float] = None) -> float:
+        """
+        Predict the height of text wrapped in a paragraph box, from the top of the first line
+        to the bottom of the last.
+        @param text: Text to measure, paragraphs separated by line breaks.
+        @param size: Font size.
+        @param width: Width of the paragraph box, in the units of the font size.
+        @param leading: Distance between baselines, equal to the font size if not provided.
+        @return: Height in the units of the font size.
+        """
+        lines = len(self.wrap_text(text, size, width))
+        body = (self.ascender - self.descender) / self.units_per_em * size
+        return (lines - 1) * (leading or size) + body
+
+    def fit_text_size(
+        self, text: str, size: float, width: float, height: float, precision: float = 0.05
+    ) -> Optional[float]:
+        """
+        Find the largest font size, at most the given size, which wraps the text within a given height.
+        Font and lead sizes are kept equal, like the text scaling helpers do.
+        @param text: Text to fit, paragraphs separated by line breaks.
+        @param size: Largest font size to consider.
+        @param width: Width of the paragraph box at the given font size, the box doesn't scale with the text.
+        @param height: Height the text must fit within.
+        @param precision: Smallest difference in font size worth resolving.
+        @return: Font size which fits, None if no size fits.
+        """
+        if self.get_text_height(text, size, width) <= height:
+            return size
+        low, high = precision, size
+        if self.get_text_height(text, low, width) > height:
+            return
+        while high - low > precision:
+            mid = (low + high) / 2
+            if self.get_text_height(text, mid, width) <= height:
+                low = mid
+            else:
+                high = mid
+        return low
+
+
+"""
+FONT FILE PARSING
+"""
+
+
+def get_font_tables(data: bytes) -> dict[str, int]:
+    """
+    Read the table directory of a TrueType or OpenType font.
+    @param data: Font file contents.
+    @return: Dict mapping table tags to their offsets.
+    """
+    count = struct.unpack_from('>H', data, 4)[0]
+    tables = {}
+    for i in range(count):
+        tag, _, offset, _ = struct.unpack_from('>4sLLL', data, 12 + i * 16)
+        tables[tag.decode('latin-1')] = offset
+    return tables
+
+
+def get_character_map(data: bytes, offset: int) -> dict[int, int]:
+    """
+    Read the best Unicode or symbol subtable from a font's cmap table.
+    Format 12 (full Unicode) is preferred over format 4 (Basic Multilingual Plane).
+    @param data: Font file contents.
+    @param offset: Offset of the cmap table.
+    @return: Dict mapping code points to glyph IDs.
+    """
+    count = struct.unpack_from('>H', data, offset + 2)[0]
+    subtables = {}
+    for i in range(count):
+        platform, encoding, sub = struct.unpack_from('>HHL', data, offset + 4 + i * 8)
+        subtables[(platform, encoding)] = offset + sub
+    for key in [(3, 10), (0, 4), (3, 1), (0, 3), (0, 1), (0, 0), (3, 0)]:
+        if key not in subtables:
+            continue
+        start = subtables[key]
+        fmt = struct.unpack_from('>H', data, start)[0]
+        if fmt == 12:
+            return get_cmap_format_12(data, start)
+        if fmt == 4:
+            return get_cmap_format_4(data, start)
+    return {}
+
+
+def get_cmap_format_4(data: bytes, start: int) -> dict[int, int]:
+    """
+    Read a segment mapping cmap subtable.
+    @param data: Font file contents.
+    @param start: Offset of the subtable.
+    @return: Dict mapping code points to glyph IDs.
+    """
+    segments = struct.unpack_from('>H', data, start + 6)[0] // 2
+    ends = struct.unpack_from(f'>{segments}H', data, start + 14)
+    starts = struct.unpack_from(f'>{segments}H', data, start + 16 + segments * 2)
+    deltas = struct.unpack_from(f'>{segments}h', data, start + 16 + segments * 4)
+    range_start = start + 16 + segments * 6
+    ranges = struct.unpack_from(f'>{segments}H', data, range_start)
+    cmap = {}
+    for i in range(segments):
+        for code in range(starts[i], ends[i] + 1):
+            if code == 0xFFFF:
+                break
+            if ranges[i] == 0:
+                glyph = (code + deltas[i]) & 0xFFFF
+            else:
+                index = range_start + i * 2 + ranges[i] + (code - starts[i]) * 2
+                glyph = struct.unpack_from('>H', data, index)[0]
+                glyph = (glyph + deltas[i]) & 0xFFFF if glyph else 0
+            if glyph:
+                cmap[code] = glyph
+    return cmap
+
+
+def get_cmap_format_12(data: bytes, start: int) -> dict[int, int]:
+    """
+    Read a segmented coverage cmap subtable.
+    @param data: Font file contents.
+    @param start: Offset of the subtable.
+    @return: Dict mapping code points to glyph IDs.
+    """
+    groups = struct.unpack_from('>L', data, start + 12)[0]
+    cmap = {}
+    for i in range(groups):
+        first, last, glyph = struct.unpack_from('>LLL', data, start + 16 + i * 12)
+        for code in range(first, last + 1):
+            cmap[code] = glyph + code - first
+    return cmap
+
+
+def get_font_names(path: str) -> set[str]:
+    """
+    Read the family, full and PostScript names of a font.
+    @param path: Path to the font file.
+    @return: Set of names the font can be referred to by.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = get_font_tables(data).get('name')
+    if offset is None:
+        return set()
+    _, count, strings = struct.unpack_from('>HHH', data, offset)
+    names = set()
+    for i in range(count):
+        platform, _, _, name_id, length, start = struct.unpack_from('>HHHHHH', data, offset + 6 + i * 12)
+        if name_id not in NAME_IDS:
+            continue
+        raw = data[offset + strings + start:offset + strings + start + length]
+        names.add(raw.decode('utf-16-be' if platform in (0, 3) else 'latin-1', errors='ignore'))
+    return names
+
+
+"""
+UTILITIES
+"""
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """
+    Split text at every kind of line break Photoshop recognizes.
+    @param text: Text to split.
+    @return: List of paragraphs.
+    """
+    for br in LINE_BREAKS[1:]:
+        text = text.replace(br, LINE_BREAKS[0])
+    return text.split(LINE_BREAKS[0])
+
+
+@cache
+def get_font_index() -> dict[str, str]:
+    """
+    Index the fonts shipped with the app by every name they can be referred to by.
+    @return: Dict mapping font names to font file paths.
+    """
+    index = {}
+    if not osp.isdir(con.path_fonts):
+        return index
+    for name in sorted(os.listdir(con.path_fonts)):
+        if not name.lower().endswith(('.ttf', '.otf')):
+            continue
+        path = osp.join(con.path_fonts, name)
+        try:
+            for font_name in get_font_names(path):
+                index.setdefault(font_name, path)
+        except (OSError, struct.error):
+            continue
+    return index
+
+
+@cache
+def get_font_metrics(font_name: str) -> Optional[FontMetrics]:
+    """
+    Load the metrics of a shipped font.
+    @param font_name: PostScript, full or family name of the font, ex: PlantinMTPro-Regular
+    @return: Font metrics, None if the font isn't shipped with the app or can't be read.
+    """
+    if not (path := get_font_index().get(font_name)):
+        return
+    try:
+        return FontMetrics(path)
+    except (OSError, struct.error, KeyError, IndexError):
+        return
@@ -0,0 +1,117 @@
+"""
+Shared HTTP Transport
+"""
+import time
+import threading
+from dataclasses import dataclass
+from typing import Union, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.constants import con
+from src.utils.replay import Fixtures
+
+
+@dataclass
+class HostMetrics:
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0
+
+
+class Transport:
+    """
+    Process wide HTTP transport which keeps one pooled keep-alive session per host,
+    so repeated requests to the same host reuse open connections instead of a new handshake each time.
+    @param pool_size: Maximum connections kept open to each host.
+    @param timeout: Default (connect, read) timeout in seconds.
+    """
+    def __init__(self, pool_size: int, timeout: Union[float, tuple[float, float]]):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.sessions: dict[str, requests.Session] = {}
+        self.metrics: dict[str, HostMetrics] = {}
+        self.fixtures: Optional[Fixtures] = None
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> requests.Session:
+        """
+        Get the pooled session for the host of a URL, creating it on first use.
+        @param url: Request URL.
+        @return: Session object.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.sessions:
+                sess = requests.Session()
+                sess.headers.update(con.http_header)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                sess.mount('https://', adapter)
+                sess.mount('http://', adapter)
+                self.sessions[host] = sess
+                self.metrics[host] = HostMetrics()
+            return self.sessions[host]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Make a request using the pooled session for its host.
+        @param method: HTTP method, ex: GET
+        @param url: Request URL.
+        @param kwargs: Passed on to requests, a default timeout is applied if none is given.
+        @return: Response object.
+        """
+        sess = self.session(url)
+        metrics = self.metrics[urlsplit(url).netloc]
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            # Serve from recorded fixtures
+            if self.fixtures and self.fixtures.replaying:
+                return self.fixtures.replay(method, url, **kwargs)
+            res = sess.request(method, url, **kwargs)
+            if self.fixtures:
+                self.fixtures.record(method, url, res, **kwargs)
+            return res
+        except requests.RequestException:
+            with self._lock:
+                metrics.errors += 1
+            raise
+        finally:
+            # Requests finish on many threads at once
+            with self._lock:
+                metrics.requests += 1
+                metrics.elapsed += time.perf_counter() - start
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def connections(self, host: str) -> int:
+        """
+        Get the number of connections opened to a host, each one costing a TCP and TLS handshake.
+        @param host: Host name, ex: api.scryfall.com
+        @return: Number of connections opened.
+        """
+        if host not in self.sessions:
+            return 0
+        count = 0
+        for adapter in set(self.sessions[host].adapters.values()):
+            pools = adapter.poolmanager.pools
+            count += sum(pools[key].num_connections for key in pools.keys())
+        return count
+
+    @property
+    def stats(self) -> str:
+        return "\n".join([
+            f"{host}: {m.requests} requests over {self.connections(host)} connections, "
+            f"{m.errors} errors, {m.elapsed / max(m.requests, 1) * 1000:.0f} ms average"
+            for host, m in self.metrics.items()
+        ])
+
+
+# Global transport
+transport = Transport(con.http_pool_size, con.http_timeout)
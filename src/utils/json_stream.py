@@ -0,0 +1,189 @@
+"""
+Streaming JSON Utilities
+"""
+import re
+import json
+import codecs
+from typing import Iterable, Iterator, Optional, Any
+
+# Characters that matter when skipping over a value
+reg_structure = re.compile(r'["\[\]{}]')
+reg_string_end = re.compile(r'["\\]')
+reg_whitespace = re.compile(r'\s*')
+reg_scalar = re.compile(r'[^\s,:\]}]*')
+
+
+class JsonStream:
+    """
+    Reads JSON incrementally from chunks of bytes, allowing large values to be skipped without decoding them.
+    @param chunks: Iterable of UTF-8 encoded chunks, ex: Response.iter_content()
+    """
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.decoder_json = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Read the next chunk, discarding everything already consumed.
+        @return: True if more data was read, False at the end of the stream.
+        """
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        self.eof = chunk is None
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk or b'', final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it.
+        @return: Next character, or an empty string at the end of the stream.
+        """
+        while True:
+            self.pos = reg_whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        """
+        Consume the next character, which must match the one given.
+        @param char: Expected character.
+        """
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at position {self.pos}, found '{self.peek()}'")
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        """
+        Decode the next value. Only use this for values small enough to hold in memory.
+        @return: Decoded value.
+        """
+        char = self.peek()
+        while True:
+            # A number or literal could continue into the next chunk, ex: 1.|25 would decode as 1
+            if char not in '"[{' and not self.eof and \
+                    reg_scalar.match(self.buffer, self.pos).end() >= len(self.buffer):
+                self.fill()
+                continue
+            try:
+                value, self.pos = self.decoder_json.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def skip_value(self) -> None:
+        """
+        Move past the next value without decoding it.
+        """
+        char = self.peek()
+        if char == '"':
+            self.pos += 1
+            self._skip_string()
+            return
+        if char not in '[{':
+            # Numbers, booleans and null are small
+            self.read_value()
+            return
+
+        # Track nesting until the container closes
+        depth = 0
+        while True:
+            match = reg_structure.search(self.buffer, self.pos)
+            if not match:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError("Unexpected end of stream")
+                continue
+            self.pos = match.end()
+            if match.group() == '"':
+                self._skip_string()
+            elif match.group() in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _skip_string(self) -> None:
+        # Position is just past the opening quote
+        while True:
+            match = reg_string_end.search(self.buffer, self.pos)
+            if not match or (match.group() == '\\' and match.end() >= len(self.buffer)):
+                # Keep an unfinished escape sequence for the next chunk
+                self.pos = match.start() if match else len(self.buffer)
+                if not self.fill():
+                    raise ValueError("Unexpected end of stream")
+                continue
+            if match.group() == '\\':
+                self.pos = match.end() + 1
+                continue
+            self.pos = match.end()
+            return
+
+    def keys(self) -> Iterator[str]:
+        """
+        Iterate over the keys of the next object. The value of each key must be read or skipped before continuing.
+        @return: Iterator of object keys.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or '}}' at position {self.pos - 1}, found '{char}'")
+
+
+"""
+UTILITIES
+"""
+
+
+def extract_fields(
+    chunks: Iterable[bytes],
+    fields: Iterable[str],
+    path: Iterable[str] = ()
+) -> Optional[dict]:
+    """
+    Pull selected fields out of a JSON object, skipping every other value and
+    stopping as soon as all the fields have been found.
+    @param chunks: Iterable of UTF-8 encoded chunks, ex: Response.iter_content()
+    @param fields: Keys to collect from the object.
+    @param path: Keys leading to a nested object, ex: ['data']
+    @return: Dict of the fields found, or None if the path doesn't exist.
+    """
+    stream, fields = JsonStream(chunks), set(fields)
+
+    # Find the nested object
+    for step in path:
+        for key in stream.keys():
+            if key == step:
+                break
+            stream.skip_value()
+        else:
+            return
+
+    # Collect the fields
+    found = {}
+    for key in stream.keys():
+        if key not in fields:
+            stream.skip_value()
+            continue
+        found[key] = stream.read_value()
+        if len(found) == len(fields):
+            break
+    return found
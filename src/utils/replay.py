@@ -0,0 +1,191 @@
+"""
+HTTP Record and Replay
+"""
+import io
+import os
+import gzip
+import json
+import time
+import base64
+import random
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers worth keeping in a fixture
+KEEP_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class FixtureArchive:
+    """
+    Gzip compressed JSON archive of recorded HTTP responses, keyed by method, URL and JSON payload.
+    @param path: Path to the archive file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.responses: dict[str, dict] = {}
+        self.meta: dict = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        """
+        Read the archive from disk.
+        """
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        self.meta = data.get('meta', {})
+        self.responses = data.get('responses', {})
+
+    def save(self) -> None:
+        """
+        Write the archive to disk, replacing the previous copy at once.
+        """
+        Path(os.path.dirname(os.path.abspath(self.path))).mkdir(mode=511, parents=True, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with self._lock, os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump({'meta': self.meta, 'responses': self.responses}, f, separators=(',', ':'))
+        os.replace(temp, self.path)
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.responses.get(key)
+
+    def put(self, key: str, res: requests.Response) -> None:
+        """
+        Store a response, text bodies are kept as is and anything else is base64 encoded.
+        @param key: Request key.
+        @param res: Response object, its content is read.
+        """
+        try:
+            body, encoding = res.content.decode('utf-8'), 'text'
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(res.content).decode('ascii'), 'base64'
+        with self._lock:
+            self.responses[key] = {
+                'status': res.status_code,
+                'headers': {k: res.headers[k] for k in KEEP_HEADERS if k in res.headers},
+                'encoding': encoding,
+                'body': body
+            }
+
+
+class Fixtures:
+    """
+    Record or replay layer for the HTTP transport. In record mode every real response is captured into the archive,
+    in replay mode responses are served from the archive after a simulated round trip, with optional injected errors.
+    @param archive: Fixture archive to record into or replay from.
+    @param replay: Serve responses from the archive instead of the network.
+    @param latency: Simulated round trip time of each replayed request in seconds.
+    @param error_rate: Fraction of replayed requests answered with a 503 error.
+    @param seed: Random seed, so injected errors are the same every run.
+    """
+    def __init__(
+        self,
+        archive: FixtureArchive,
+        replay: bool = True,
+        latency: float = 0,
+        error_rate: float = 0,
+        seed: int = 0
+    ):
+        self.archive = archive
+        self.replaying = replay
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # Counters for the current run
+        self.served = 0
+        self.missing = 0
+        self.injected = 0
+
+    def record(self, method: str, url: str, res: requests.Response, **kwargs) -> None:
+        """
+        Capture a response made over the network.
+        @param method: HTTP method, ex: GET
+        @param url: Request URL.
+        @param res: Response object.
+        @param kwargs: Request keyword arguments, used to find the JSON payload.
+        """
+        self.archive.put(get_fixture_key(method, url, kwargs.get('json')), res)
+
+    def replay(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Serve a recorded response. Requests never recorded get a Scryfall style not found error.
+        @param method: HTTP method, ex: GET
+        @param url: Request URL.
+        @param kwargs: Request keyword arguments, used to find the JSON payload.
+        @return: Response object.
+        """
+        time.sleep(self.latency)
+        with self._lock:
+            inject = self.error_rate and self.random.random() < self.error_rate
+            self.injected += bool(inject)
+        if inject:
+            return build_response(url, {
+                'status': 503, 'headers': {'Content-Type': 'application/json', 'Retry-After': '0'},
+                'encoding': 'text', 'body': '{"object":"error","status":503,"details":"Injected error"}'
+            })
+
+        # Find the recorded response
+        fixture = self.archive.get(get_fixture_key(method, url, kwargs.get('json')))
+        with self._lock:
+            if fixture:
+                self.served += 1
+            else:
+                self.missing += 1
+        return build_response(url, fixture or {
+            'status': 404, 'headers': {'Content-Type': 'application/json'}, 'encoding': 'text',
+            'body': json.dumps({
+                'object': 'error', 'status': 404, 'code': 'not_found',
+                'details': f"No fixture recorded for: {method} {url}"
+            })
+        })
+
+    def reset_stats(self) -> None:
+        """
+        Reset the replay counters.
+        """
+        self.served, self.missing, self.injected = 0, 0, 0
+
+
+"""
+UTILITIES
+"""
+
+
+def get_fixture_key(method: str, url: str, payload: Optional[dict] = None) -> str:
+    """
+    Get the archive key of a request.
+    @param method: HTTP method, ex: GET
+    @param url: Request URL.
+    @param payload: JSON body of a POST request.
+    @return: Key identifying the request, ex: GET https://api.scryfall.com/sets
+    """
+    key = f"{method.upper()} {url}"
+    if payload is not None:
+        key += " " + hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+    return key
+
+
+def build_response(url: str, fixture: dict) -> requests.Response:
+    """
+    Build a response object from a fixture, which can be read whole or streamed.
+    @param url: Request URL.
+    @param fixture: Recorded response.
+    @return: Response object.
+    """
+    body = fixture['body'].encode('utf-8') if fixture['encoding'] == 'text' else base64.b64decode(fixture['body'])
+    res = requests.Response()
+    res.status_code = fixture['status']
+    res.headers = CaseInsensitiveDict(fixture['headers'])
+    res.raw = io.BytesIO(body)
+    res.url = url
+    res.encoding = 'utf-8' if fixture['encoding'] == 'text' else None
+    return res